@@ -0,0 +1,60 @@
+"""Cached lists of the staff who hold a given permission.
+
+The reassign and followers forms offer every active user who can be assigned
+to, or follow, a case. Who that is only changes when users, groups or
+permissions are edited, so each list is built once, with its labels already
+rendered, and cached until the signals in accounts.signals clear it.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .models import User
+
+CODENAMES = ("get_assigned", "follow")
+
+
+def cache_key(codename):
+    return f"staff-directory:{codename}"
+
+
+def build_staff_with_permission(codename):
+    users = User.objects.filter(
+        Q(is_active=True)
+        & (
+            Q(user_permissions__codename=codename)
+            | Q(groups__permissions__codename=codename)
+        )
+    ).distinct()
+    return [
+        {"id": user.id, "name": str(user), "wards": user.get_wards_display()}
+        for user in users
+    ]
+
+
+def staff_with_permission(codename):
+    """Return the id, name and wards display of each active user with the
+    permission, directly or through a group, ordered by name."""
+    key = cache_key(codename)
+    staff = cache.get(key)
+    if staff is None:
+        staff = build_staff_with_permission(codename)
+        cache.set(key, staff, settings.STAFF_DIRECTORY_CACHE_TIMEOUT)
+    return staff
+
+
+def listed_user_ids():
+    """The ids of everyone in whichever lists are currently cached."""
+    ids = set()
+    for staff in cache.get_many([cache_key(c) for c in CODENAMES]).values():
+        ids.update(entry["id"] for entry in staff)
+    return ids
+
+
+def invalidate_staff_directory():
+    keys = [cache_key(c) for c in CODENAMES]
+    cache.delete_many(keys)
+    # And again once committed, in case it was re-cached from before
+    transaction.on_commit(lambda: cache.delete_many(keys))
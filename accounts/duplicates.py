@@ -0,0 +1,160 @@
+"""Finding and merging users who are probably the same person.
+
+Complainants and perpetrators are often entered more than once, unverified,
+by staff reporting on someone's behalf. Rather than compare every user with
+every other, users are grouped into blocks sharing a normalised email, phone
+number, name or UPRN, and only pairs within a block are scored: the more
+they share, the likelier they are the same. Pairs scoring at least
+DUPLICATE_THRESHOLD are linked, and each connected group reported.
+"""
+
+from itertools import combinations
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import transaction
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Concat, Lower, Trim
+
+from cases.models import Case, Complaint
+
+from .models import User
+
+# What each block is keyed on, which users it leaves out, and how much
+# sharing that key counts towards two users being the same person
+BLOCKS = {
+    "email": (Lower(Trim("email")), Q(email="") | Q(email__isnull=True), 3),
+    "phone": (F("phone"), Q(phone="") | Q(phone__isnull=True), 3),
+    "name": (
+        Concat(Lower(Trim("first_name")), Value(" "), Lower(Trim("last_name"))),
+        Q(first_name="") | Q(last_name=""),
+        2,
+    ),
+    "uprn": (F("uprn"), Q(uprn=""), 1),
+}
+DUPLICATE_THRESHOLD = 3
+
+# Blocks bigger than this are too common a key (a shared office phone, a
+# block of flats) to say anything about their members
+MAX_BLOCK_SIZE = 50
+
+# Fields copied to the user kept from a merged duplicate, if blank, with any
+# that go along with them
+MERGE_FILL_FIELDS = {
+    "first_name": (),
+    "last_name": (),
+    "email": ("email_verified",),
+    "phone": ("phone_verified",),
+    "uprn": (),
+    "address": (),
+}
+
+# Fields recording who created or changed something, moved to the user kept
+# rather than cleared (or, on historical records, left pointing nowhere)
+AUDIT_FIELDS = ("created_by", "modified_by", "history_user")
+
+
+def audit_relations():
+    """Yield (model, field name) for every audit field referring to users."""
+    for relation in User._meta.get_fields(include_hidden=True):
+        if relation.one_to_many and relation.field.name in AUDIT_FIELDS:
+            yield relation.related_model, relation.field.name
+
+
+def blocks(users):
+    """Yield (block name, [user ids]) for every block with more than one of
+    the users in it."""
+    for name, (key, blank, _) in BLOCKS.items():
+        groups = (
+            users.exclude(blank)
+            .annotate(key=key)
+            .order_by()
+            .values("key")
+            .annotate(n=Count("id"), ids=ArrayAgg("id"))
+            .filter(n__gt=1, n__lte=MAX_BLOCK_SIZE)
+        )
+        for group in groups:
+            yield name, sorted(group["ids"])
+
+
+def find_duplicates(users=None):
+    """Return groups of probable duplicates among the users (by default all
+    non-staff users) as lists of (user id, [reasons]), lowest id first."""
+    if users is None:
+        users = User.objects.filter(is_staff=False)
+
+    scores = {}
+    reasons = {}
+    for name, ids in blocks(users):
+        for pair in combinations(ids, 2):
+            scores[pair] = scores.get(pair, 0) + BLOCKS[name][2]
+            reasons.setdefault(pair, []).append(name)
+
+    # Union-find over the pairs that score highly enough
+    parent = {}
+
+    def root(id):
+        while parent.get(id, id) != id:
+            id = parent[id]
+        return id
+
+    matched = {}
+    for (a, b), score in scores.items():
+        if score < DUPLICATE_THRESHOLD:
+            continue
+        parent[max(root(a), root(b))] = min(root(a), root(b))
+        for id in (a, b):
+            matched.setdefault(id, set()).update(reasons[(a, b)])
+
+    groups = {}
+    for id in sorted(matched):
+        groups.setdefault(root(id), []).append((id, sorted(matched[id])))
+    return list(groups.values())
+
+
+@transaction.atomic
+def merge_users(keep, duplicates):
+    """Move the duplicates' complaints, perpetrations and audit trail to keep,
+    fill in any details keep is missing from them, and delete them. Returns
+    the number of complaints and perpetrations moved."""
+    duplicate_ids = [user.id for user in duplicates if user.id != keep.id]
+
+    complaints = Complaint.objects.filter(complainant__in=duplicate_ids)
+    case_ids = set(complaints.values_list("case_id", flat=True))
+    moved_complaints = complaints.update(complainant=keep)
+
+    # A case can only have each perpetrator once, so drop any links that
+    # would repeat one keep already has, or another duplicate's
+    Perpetrator = Case.perpetrators.through
+    seen = set(keep.cases_perpetrated.values_list("id", flat=True))
+    repeated = []
+    links = Perpetrator.objects.filter(user__in=duplicate_ids).order_by("id")
+    for link_id, case_id in links.values_list("id", "case_id"):
+        case_ids.add(case_id)
+        if case_id in seen:
+            repeated.append(link_id)
+        seen.add(case_id)
+    Perpetrator.objects.filter(id__in=repeated).delete()
+    moved_perpetrations = Perpetrator.objects.filter(user__in=duplicate_ids).update(
+        user=keep
+    )
+
+    for model, field in audit_relations():
+        model._base_manager.filter(**{f"{field}__in": duplicate_ids}).update(
+            **{field: keep}
+        )
+
+    fill = {}
+    for user in sorted(duplicates, key=lambda u: u.id):
+        for field, along_with in MERGE_FILL_FIELDS.items():
+            if not getattr(keep, field) and field not in fill and getattr(user, field):
+                for name in (field, *along_with):
+                    fill[name] = getattr(user, name)
+    User.objects.filter(id__in=duplicate_ids).delete()
+    if fill:
+        for field, value in fill.items():
+            setattr(keep, field, value)
+        keep.save()
+
+    for case_id in case_ids:
+        Case(id=case_id).invalidate_timeline()
+    return moved_complaints, moved_perpetrations
@@ -274,8 +274,11 @@ class StaffSettingsForm(GDSForm, forms.ModelForm):
         fields = (
             "staff_email_notifications",
             "staff_web_notifications",
+            "staff_email_digest",
         )
         labels = {
             "staff_email_notifications": "Receive email notifications.",
             "staff_web_notifications": "Receive web notifications.",
+            "staff_email_digest": "Send case assignment and new report emails",
         }
+        widgets = {"staff_email_digest": forms.RadioSelect}
@@ -5,6 +5,7 @@ from django.core.management.base import BaseCommand, CommandError
 
 from accounts.models import User
 from noiseworks import cobrand
+from noiseworks.profiling import ProfilingMixin
 
 
 def ward_name_to_id(ward):
@@ -16,7 +17,7 @@ def ward_name_to_id(ward):
         raise CommandError(f"Could not find ward {ward}")
 
 
-class Command(BaseCommand):
+class Command(ProfilingMixin, BaseCommand):
     help = "Add staff users from CSV file"
     ward_mapping = {}
 
@@ -38,6 +39,7 @@ class Command(BaseCommand):
 
         for line in csv.DictReader(open(options["csv_file"])):
             self.add_staff_user(line, group)
+            self.advance()
 
     def read_mapping(self, filename):
         for line in csv.DictReader(open(filename)):
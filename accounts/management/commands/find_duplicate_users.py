@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from accounts.duplicates import find_duplicates
+from accounts.models import User
+from noiseworks.profiling import ProfilingMixin
+
+
+class Command(ProfilingMixin, BaseCommand):
+    help = "List groups of non-staff users who are probably the same person"
+
+    def handle(self, *args, **options):
+        with self.phase("find"):
+            groups = find_duplicates()
+            self.advance(len(groups))
+        users = User.objects.in_bulk(id for group in groups for id, _ in group)
+        for group in groups:
+            self.stdout.write("Probable duplicates:")
+            for id, reasons in group:
+                self.stdout.write(f"  {id}: {users[id]} (same {', '.join(reasons)})")
+            ids = " ".join(str(id) for id, _ in group[1:])
+            self.stdout.write(f"  To merge: merge_users --into {group[0][0]} {ids}")
+        if options["verbosity"] > 1:
+            self.stdout.write(f"Found {len(groups)} groups of probable duplicates")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.duplicates import merge_users
+from accounts.models import User
+from noiseworks.profiling import ProfilingMixin
+
+
+class Command(ProfilingMixin, BaseCommand):
+    help = "Merge duplicate users into one, moving their complaints and perpetrations"
+
+    def add_arguments(self, parser):
+        parser.add_argument("duplicates", nargs="+", type=int)
+        parser.add_argument("--into", type=int, help="ID of the user to keep")
+        parser.add_argument("--commit", action="store_true")
+
+    def handle(self, *args, **options):
+        if not options["into"]:
+            raise CommandError("Please specify the user to keep with --into")
+        users = User.objects.in_bulk([options["into"]] + options["duplicates"])
+        missing = set([options["into"]] + options["duplicates"]) - set(users)
+        if missing:
+            raise CommandError(f"No such user: {', '.join(map(str, sorted(missing)))}")
+        keep = users[options["into"]]
+        duplicates = [users[id] for id in options["duplicates"] if id != keep.id]
+        if any(user.is_staff for user in duplicates):
+            raise CommandError("Staff users cannot be merged")
+
+        for user in duplicates:
+            self.stdout.write(f"Merging {user.id}: {user} into {keep.id}: {keep}")
+        if not options["commit"]:
+            self.stdout.write("Dry run; use --commit to merge")
+            return
+        complaints, perpetrations = merge_users(keep, duplicates)
+        self.advance(len(duplicates))
+        self.stdout.write(
+            f"Moved {complaints} complaints and {perpetrations} perpetrations"
+        )
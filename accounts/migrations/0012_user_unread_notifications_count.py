@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0011_user_principal_wards"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="unread_notifications_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Most users are complainants, so the table can be large; build the
+    # indexes without locking out writes, which can't be done in a transaction.
+    atomic = False
+
+    dependencies = [
+        ("accounts", "0012_user_unread_notifications_count"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="user",
+            index=GinIndex(fields=["wards"], name="accounts_user_wards_gin"),
+        ),
+        AddIndexConcurrently(
+            model_name="user",
+            index=GinIndex(
+                fields=["principal_wards"], name="accounts_user_principal_wards_gin"
+            ),
+        ),
+    ]
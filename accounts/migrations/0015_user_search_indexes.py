@@ -0,0 +1,26 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+from django.db.models.functions import Upper
+
+
+class Migration(migrations.Migration):
+    # As with the ward indexes, build these without locking out writes
+    atomic = False
+
+    dependencies = [
+        ("accounts", "0014_user_open_cases_count"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+    ] + [
+        AddIndexConcurrently(
+            model_name="user",
+            index=GinIndex(
+                OpClass(Upper(field), name="gin_trgm_ops"),
+                name=f"accounts_user_{field}_trgm",
+            ),
+        )
+        for field in ("first_name", "last_name", "address", "email", "phone")
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0015_user_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="staff_email_digest",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("", "Immediately"),
+                    ("hourly", "In an hourly digest"),
+                    ("daily", "In a daily digest"),
+                ],
+                default="",
+                max_length=6,
+            ),
+        ),
+    ]
@@ -1,10 +1,13 @@
 import uuid
+from functools import lru_cache
 
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import UserManager as BaseManager
 from django.contrib.gis.geos import Point
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils.functional import cached_property
 from phonenumber_field.modelfields import PhoneNumberField
 from phonenumber_field.phonenumber import to_python
@@ -13,6 +16,12 @@ from noiseworks import cobrand
 from noiseworks.message import send_email
 
 
+@lru_cache(maxsize=None)
+def ward_names():
+    """A map of ward code to name; the cobrand's wards are fixed."""
+    return {w["gss"]: w["name"] for w in cobrand.api.wards()}
+
+
 class UserManager(BaseManager):
     def create_user(self, username=None, **extra_fields):
         username = username or str(uuid.uuid4())
@@ -72,6 +81,11 @@ class User(AbstractUser):
         ("n", "No"),
         ("?", "Don’t know"),
     ]
+    EMAIL_DIGEST_CHOICES = [
+        ("", "Immediately"),
+        ("hourly", "In an hourly digest"),
+        ("daily", "In a daily digest"),
+    ]
 
     phone = PhoneNumberField(blank=True)
     email_verified = models.BooleanField(default=False)
@@ -100,11 +114,37 @@ class User(AbstractUser):
     principal_wards = ArrayField(models.CharField(max_length=9), default=list)
     staff_email_notifications = models.BooleanField(default=True)
     staff_web_notifications = models.BooleanField(default=True)
+    staff_email_digest = models.CharField(
+        max_length=6, choices=EMAIL_DIGEST_CHOICES, blank=True, default=""
+    )
+    # Kept in step by cases.models.Notification, for the header badge
+    unread_notifications_count = models.PositiveIntegerField(
+        default=0, editable=False
+    )
+    # Kept in step by cases.models.Case, for workload-based auto-assignment
+    open_cases_count = models.PositiveIntegerField(default=0, editable=False)
+    open_priority_cases_count = models.PositiveIntegerField(
+        default=0, editable=False
+    )
 
     objects = UserManager()
 
     class Meta:
         ordering = ("first_name", "last_name")
+        indexes = [
+            GinIndex(fields=["wards"], name="accounts_user_wards_gin"),
+            GinIndex(
+                fields=["principal_wards"], name="accounts_user_principal_wards_gin"
+            ),
+            # For person search, which matches with icontains, i.e. UPPER() LIKE
+            *(
+                GinIndex(
+                    OpClass(Upper(field), name="gin_trgm_ops"),
+                    name=f"accounts_user_{field}_trgm",
+                )
+                for field in ("first_name", "last_name", "address", "email", "phone")
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 name="unique_email",
@@ -158,10 +198,6 @@ class User(AbstractUser):
         reporting = self.complaints.aggregate(models.Count("case", distinct=True))
         return perpetrated + reporting["case__count"]
 
-    @cached_property
-    def unread_notifications_count(self):
-        return self.notifications.filter(read=False).count()
-
     def get_wards_display(self):
         principal_wards = self.principal_wards if self.principal_wards else []
         wards = self.wards if self.wards else []
@@ -169,8 +205,7 @@ class User(AbstractUser):
         if not wards and not principal_wards:
             return "No wards"
 
-        ward_mappings = cobrand.api.wards()
-        ward_gss_to_name = {w["gss"]: w["name"] for w in ward_mappings}
+        ward_gss_to_name = ward_names()
 
         ward_principal_names = [
             ward_gss_to_name.get(w) + " (principal)" for w in principal_wards
@@ -0,0 +1,58 @@
+"""Which staff look after which wards.
+
+Auto-assignment and the reassign and followers forms all need to know a
+ward's principal and its staff. That only changes when staff are edited, so
+it is looked up once, cached, and cleared by the signals in accounts.signals.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from noiseworks import cobrand
+
+from .models import User
+
+CACHE_KEY = "ward-routing"
+
+
+def build_ward_routing():
+    """Return a map of ward code to the id of its principal, and of ward code
+    to the ids of the staff assigned to it."""
+    codes = [ward["gss"] for ward in cobrand.api.wards()]
+    principal = {}
+    staff = {}
+    users = User.objects.filter(
+        Q(wards__overlap=codes) | Q(principal_wards__overlap=codes)
+    ).values_list("id", "wards", "principal_wards")
+    for user_id, wards, principal_wards in users:
+        for ward in principal_wards:
+            # Only one principal is allowed per ward; if there are somehow
+            # more, keep the first by name as the lookup used to
+            principal.setdefault(ward, user_id)
+        for ward in wards or []:
+            staff.setdefault(ward, []).append(user_id)
+    return {"principal": principal, "staff": staff}
+
+
+def ward_routing():
+    routing = cache.get(CACHE_KEY)
+    if routing is None:
+        routing = build_ward_routing()
+        cache.set(CACHE_KEY, routing, settings.WARD_ROUTING_CACHE_TIMEOUT)
+    return routing
+
+
+def ward_principal_id(ward):
+    return ward_routing()["principal"].get(ward)
+
+
+def ward_staff_ids(ward):
+    return set(ward_routing()["staff"].get(ward, ()))
+
+
+def invalidate_ward_routing():
+    cache.delete(CACHE_KEY)
+    # And again once committed, in case it was re-cached from before
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
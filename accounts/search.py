@@ -0,0 +1,58 @@
+"""Finding people to report on behalf of, or to add as perpetrators.
+
+Matching is by case-insensitive substring on name, address, email and phone,
+which the trigram indexes on those columns serve without scanning every user.
+Matches are ranked by how similar they are to the search, then by how
+recently the person was involved in a case, and only the best few returned.
+"""
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import Max, Q
+from django.db.models.functions import Greatest
+from phonenumber_field.phonenumber import to_python
+
+from .models import User
+
+SEARCH_FIELDS = ("first_name", "last_name", "address", "email", "phone")
+
+
+def normalise_search(search):
+    """Strip the search and, as the case search does, put a phone number into
+    the form phone numbers are stored in."""
+    search = search.strip()
+    phone = to_python(search)
+    if phone and phone.is_valid():
+        return str(phone)
+    return search
+
+
+def search_people(search, limit=None):
+    """Return up to limit users matching the search, best first, and whether
+    there were more matches than that."""
+    limit = limit or settings.PERSON_SEARCH_LIMIT
+    search = normalise_search(search)
+    if not search:
+        return [], False
+
+    queries = Q()
+    for field in SEARCH_FIELDS:
+        queries |= Q(**{f"{field}__icontains": search})
+    if " " in search:
+        first, last = search.split(maxsplit=1)
+        queries |= Q(first_name__icontains=first) & Q(last_name__icontains=last)
+
+    people = (
+        User.objects.filter(queries)
+        .annotate(
+            similarity=Greatest(
+                *(TrigramSimilarity(field, search) for field in SEARCH_FIELDS)
+            ),
+            last_active=Greatest(
+                Max("complaints__created"), "last_login", "date_joined"
+            ),
+        )
+        .order_by("-similarity", "-last_active", "id")
+    )
+    people = list(people[: limit + 1])
+    return people[:limit], len(people) > limit
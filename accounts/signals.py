@@ -0,0 +1,50 @@
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .directory import invalidate_staff_directory, listed_user_ids
+from .models import User
+from .routing import invalidate_ward_routing
+
+# Saves that never change who looks after which ward
+ROUTING_IRRELEVANT_FIELDS = {"last_login", "unread_notifications_count"}
+
+
+def affects_routing(user):
+    return user.is_staff or user.wards or user.principal_wards
+
+
+def affects_directory(user):
+    return affects_routing(user) or user.id in listed_user_ids()
+
+
+@receiver(post_save, sender=User)
+def invalidate_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= ROUTING_IRRELEVANT_FIELDS:
+        return
+    if affects_routing(instance):
+        invalidate_ward_routing()
+    if affects_directory(instance):
+        invalidate_staff_directory()
+
+
+@receiver(post_delete, sender=User)
+def invalidate_on_delete(sender, instance, **kwargs):
+    if affects_routing(instance):
+        invalidate_ward_routing()
+    if affects_directory(instance):
+        invalidate_staff_directory()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_directory_on_permissions_change(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_staff_directory()
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def invalidate_directory_on_delete(sender, **kwargs):
+    invalidate_staff_directory()
@@ -10,10 +10,14 @@ from django.core.management import CommandError, call_command
 from pytest_django.asserts import assertContains, assertNotContains
 from sesame.tokens import create_token
 
-from cases.models import Case
+from cases.models import Case, Complaint
+from core.models import OutboxEmail, OutboxSMS
+from core.sms import send_waiting
 
+from .duplicates import find_duplicates, merge_users
 from .forms import CodeForm
 from .models import User
+from .search import search_people
 
 
 pytestmark = pytest.mark.django_db
@@ -106,11 +110,14 @@ def test_staff_logging_in_by_token(client, staff_user, non_staff_access):
     assert response.status_code == 403
 
 
-def test_log_in_by_link_email(client, non_staff_access):
+def test_log_in_by_link_email(client, settings, non_staff_access):
+    # Sign-in emails are sent straight away, not left in the outbox
+    settings.EMAIL_OUTBOX = True
     response = client.post("/a", {"username": "foo"})
     assertContains(response, "Enter a valid email address")
     response = client.post("/a", {"username": "foo@example.org"})
     assertContains(response, "Please check your")
+    assert not OutboxEmail.objects.exists()
     m = re.search(r"(http[^\s]*)", mail.outbox[0].body)
     url = m.group(1)
     response = client.get(url)
@@ -137,6 +144,22 @@ def test_log_in_by_link_phone(
     assert response.status_code == 302
 
 
+@patch("phonenumber_field.phonenumber.PhoneNumber.is_mobile")
+@patch("phonenumber_field.phonenumber.PhoneNumber.is_valid")
+def test_log_in_by_phone_queued(
+    is_valid, is_mobile, client, fake_notify, settings, non_staff_access
+):
+    # Signing in never waits on Notify; the text is sent from the queue
+    is_valid.return_value = is_mobile.return_value = True
+    settings.SMS_QUEUE = True
+    response = client.post("/a", {"username": "07700 900000"})
+    assertContains(response, "Please check your")
+    assert fake_notify.sent == []
+    assert OutboxSMS.objects.count() == 1
+    send_waiting()
+    assert "sign in token is" in fake_notify.sent[0]["personalisation"]["text"]
+
+
 def test_log_in_by_code_errors(client):
     form = CodeForm({"user_id": "123", "code": "bad"})
     assert form.errors == {
@@ -450,6 +473,16 @@ def test_staff_settings(staff_user, client):
     staff_user.refresh_from_db()
     assert staff_user.staff_email_notifications
     assert not staff_user.staff_web_notifications
+    assert staff_user.staff_email_digest == ""
+
+    resp = client.post(
+        "/a/staff-settings",
+        {"staff_email_notifications": "on", "staff_email_digest": "daily"},
+        follow=True,
+    )
+    assert resp.status_code == HTTPStatus.OK
+    staff_user.refresh_from_db()
+    assert staff_user.staff_email_digest == "daily"
 
 
 def test_set_staff_as_ward_principal(admin_client, staff_user, staff_user_2):
@@ -520,3 +553,102 @@ def test_staff_email_settings(staff_user, case):
         },
     )
     assert len(mail.outbox) == 1
+
+
+def test_person_search_ranking_and_limit():
+    exact = User.objects.create(username="a", first_name="Sam", last_name="Smith")
+    User.objects.create(username="b", first_name="Samuel", last_name="Smithson")
+    User.objects.create(username="c", first_name="Jo", address="1 Smith Street")
+    User.objects.create(username="d", first_name="Jo", last_name="Bloggs")
+
+    people, more = search_people("Sam Smith")
+    assert people[0] == exact
+    assert len(people) == 2
+    assert not more
+
+    people, more = search_people("smith", limit=2)
+    assert len(people) == 2
+    assert more
+
+
+def test_person_search_phone_normalised():
+    user = User.objects.create(username="a", phone="+447700900123")
+    assert search_people("07700 900123") == ([user], False)
+    assert search_people("   ") == ([], False)
+
+
+def test_find_duplicate_users(staff_user, capsys):
+    a = User.objects.create(username="a", email="jo@example.org", first_name="Jo")
+    b = User.objects.create(username="b", email="jo@example.org", phone="+447700900123")
+    c = User.objects.create(username="c", phone="+447700900123")
+    d = User.objects.create(
+        username="d", first_name="Jo", last_name="Bloggs", uprn="10008315925"
+    )
+    e = User.objects.create(
+        username="e", first_name=" jo", last_name="BLOGGS", uprn="10008315925"
+    )
+    # Sharing only a name isn't enough
+    User.objects.create(username="f", first_name="Jo", last_name="Bloggs")
+    staff_user.phone = "+447700900123"
+    staff_user.save()
+
+    assert find_duplicates() == [
+        [(a.id, ["email"]), (b.id, ["email", "phone"]), (c.id, ["phone"])],
+        [(d.id, ["name", "uprn"]), (e.id, ["name", "uprn"])],
+    ]
+    call_command("find_duplicate_users", verbosity=2)
+    output = capsys.readouterr().out
+    assert f"merge_users --into {a.id} {b.id} {c.id}" in output
+    assert "Found 2 groups" in output
+
+
+def test_merge_users(case, capsys):
+    keep = User.objects.create(username="a", first_name="Jo")
+    dupe = User.objects.create(username="b", phone="+447700900123")
+    dupe_2 = User.objects.create(username="c", address="1 High Street")
+    complaint = Complaint.objects.create(
+        case=case, complainant=dupe, happening_now=True
+    )
+    case.perpetrators.add(keep, dupe, dupe_2)
+
+    call_command("merge_users", dupe.id, dupe_2.id, into=keep.id)
+    assert User.objects.filter(id=dupe.id).exists()
+
+    call_command("merge_users", dupe.id, dupe_2.id, into=keep.id, commit=True)
+    assert "Moved 1 complaints and 0 perpetrations" in capsys.readouterr().out
+    assert not User.objects.filter(id__in=[dupe.id, dupe_2.id]).exists()
+    complaint.refresh_from_db()
+    assert complaint.complainant == keep
+    assert list(case.perpetrators.all()) == [keep]
+    keep.refresh_from_db()
+    assert (keep.phone, keep.address) == ("+447700900123", "1 High Street")
+
+
+def test_merge_users_keeps_audit_trail(case):
+    keep = User.objects.create(username="a")
+    dupe = User.objects.create(username="b", email="b@example.org", email_verified=True)
+    case.created_by = case.modified_by = dupe
+    case.save()
+    case.history.update(history_user=dupe, created_by=dupe)
+    complaint = Complaint.objects.create(
+        case=case, happening_now=True, created_by=dupe, modified_by=dupe
+    )
+
+    merge_users(keep, [dupe])
+    case.refresh_from_db()
+    complaint.refresh_from_db()
+    assert (case.created_by, case.modified_by) == (keep, keep)
+    assert (complaint.created_by, complaint.modified_by) == (keep, keep)
+    assert {h.history_user_id for h in case.history.all()} == {keep.id}
+    assert {h.created_by_id for h in case.history.all()} == {keep.id}
+    keep.refresh_from_db()
+    assert (keep.email, keep.email_verified) == ("b@example.org", True)
+
+
+def test_merge_users_errors(staff_user, normal_user):
+    with pytest.raises(CommandError, match="--into"):
+        call_command("merge_users", normal_user.id)
+    with pytest.raises(CommandError, match="No such user: 0"):
+        call_command("merge_users", 0, into=normal_user.id)
+    with pytest.raises(CommandError, match="Staff"):
+        call_command("merge_users", staff_user.id, into=normal_user.id)
@@ -80,6 +80,7 @@ def show_form(request):
                 "Access your noise cases",
                 "accounts/email_signin",
                 {"url": url, "signature": signature},
+                immediate=True,
             )
         else:  # username_type will be "phone"
             send_sms(
@@ -0,0 +1,133 @@
+"""Choosing who a newly reported case is automatically assigned to.
+
+Strategies are registered by name with @strategy, along with the reason to
+give whoever they choose, and the one used is picked by the
+AUTO_ASSIGN_STRATEGY setting. Each is given the case and the staff of
+its ward who can be assigned cases, and returns the user to assign, or None
+to leave the case unassigned. Workloads are read from the open case counts
+kept on each user, rather than counted from the cases.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F, Q
+
+from accounts.models import User
+from accounts.routing import ward_principal_id, ward_staff_ids
+
+from .models import Case
+
+logger = logging.getLogger("noiseworks")
+
+STRATEGIES = {}
+
+
+def strategy(name, reason):
+    """Register a strategy. Its reason completes "You were automatically
+    assigned, ...", with {ward} standing for the ward's name."""
+
+    def register(fn):
+        fn.reason = reason
+        STRATEGIES[name] = fn
+        return fn
+
+    return register
+
+
+def ward_candidates(case):
+    """The active staff of the case's ward who can be assigned cases."""
+    return User.objects.filter(
+        Q(id__in=ward_staff_ids(case.ward))
+        & Q(is_active=True)
+        & (
+            Q(user_permissions__codename="get_assigned")
+            | Q(groups__permissions__codename="get_assigned")
+        )
+    ).distinct()
+
+
+@strategy("principal", "as you are the principal for {ward}")
+def principal(case, candidates):
+    """The ward's principal, whoever else is in the ward."""
+    principal_id = ward_principal_id(case.ward)
+    if not principal_id:
+        return None
+    return User.objects.filter(id=principal_id).first()
+
+
+@strategy("round_robin", "as it was your turn among the staff for {ward}")
+def round_robin(case, candidates):
+    """Each of the ward's staff in turn, starting after whoever was assigned
+    the ward's most recent case. The turn is read from the cases, so every
+    process agrees on it."""
+    ids = list(candidates.order_by("id").values_list("id", flat=True))
+    if not ids:
+        return None
+    last = (
+        Case.objects.filter(ward=case.ward, assigned__in=ids)
+        .exclude(id=case.id)
+        .order_by("-id")
+        .values_list("assigned", flat=True)
+        .first()
+    )
+    after = [id for id in ids if last is not None and id > last]
+    return User.objects.get(id=(after or ids)[0])
+
+
+@strategy("least_open", "as you have the fewest open cases among the staff for {ward}")
+def least_open(case, candidates):
+    """Whoever in the ward has the fewest open cases."""
+    return candidates.order_by("open_cases_count", "id").first()
+
+
+@strategy(
+    "weighted_priority", "as you have the lightest workload among the staff for {ward}"
+)
+def weighted_priority(case, candidates):
+    """Whoever in the ward has the lightest workload, counting each open
+    priority case as AUTO_ASSIGN_PRIORITY_WEIGHT ordinary ones."""
+    extra = settings.AUTO_ASSIGN_PRIORITY_WEIGHT - 1
+    load = F("open_cases_count") + F("open_priority_cases_count") * extra
+    return candidates.order_by(load, "id").first()
+
+
+def current_strategy():
+    name = settings.AUTO_ASSIGN_STRATEGY
+    try:
+        return STRATEGIES[name]
+    except KeyError:
+        raise ImproperlyConfigured(f"Unknown AUTO_ASSIGN_STRATEGY {name!r}")
+
+
+def assignment_reason(ward_name):
+    """Why the current strategy chose whoever it did, to tell them."""
+    return current_strategy().reason.format(ward=ward_name)
+
+
+def choose_assignee(case):
+    name = settings.AUTO_ASSIGN_STRATEGY
+    choose = current_strategy()
+
+    candidates = ward_candidates(case)
+    assignee = choose(case, candidates)
+    if assignee:
+        logger.info(
+            "Auto-assigned case %s in ward %s to user %s (%s open, %s priority) "
+            "by %s strategy",
+            case.id,
+            case.ward,
+            assignee.id,
+            assignee.open_cases_count,
+            assignee.open_priority_cases_count,
+            name,
+        )
+    else:
+        logger.info(
+            "Did not auto-assign case %s in ward %s: no one chosen by %s strategy",
+            case.id,
+            case.ward,
+            name,
+        )
+    return assignee
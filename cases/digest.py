@@ -0,0 +1,95 @@
+"""Digest emails, for staff who would rather not be emailed about each case
+assigned to them, or reported to their team, as it happens.
+
+Those events are kept as DigestEvents instead, and the send_email_digests
+command, run hourly and daily, sends each recipient one email listing what
+has happened since their last, case by case.
+"""
+
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from accounts.models import User
+from noiseworks.message import send_email, send_emails
+
+from .models import DigestEvent
+
+DIGEST_SUBJECT = "Your NoiseWorks digest"
+
+
+def takes_digest(user):
+    return user.is_staff and user.staff_email_notifications and user.staff_email_digest
+
+
+def email_staff(user, case, message, subject, template, data):
+    """Email a staff user about something that has happened to a case, or
+    save it, summed up as message, for their digest."""
+    if takes_digest(user):
+        DigestEvent.objects.create(
+            recipient=user, case=case, message=message, url=data["url"]
+        )
+    else:
+        user.send_email(subject, template, data)
+
+
+def email_destination(to, case, message, subject, template, data):
+    """As email_staff, for a staff destination's addresses, any of which may
+    be those of a staff user who takes digests."""
+    to = [to] if isinstance(to, str) else list(to)
+    digest_users = (
+        User.objects.alias(email_lower=Lower("email"))
+        .filter(
+            email_lower__in=[address.strip().lower() for address in to],
+            is_staff=True,
+            is_active=True,
+            staff_email_notifications=True,
+        )
+        .exclude(staff_email_digest="")
+    )
+    digest_users = list(digest_users)
+    DigestEvent.objects.bulk_create(
+        DigestEvent(recipient=user, case=case, message=message, url=data["url"])
+        for user in digest_users
+    )
+    digested = {user.email.lower() for user in digest_users}
+    to = [address for address in to if address.strip().lower() not in digested]
+    if to:
+        send_email(to, subject, template, data)
+
+
+def send_digests(frequency):
+    """Send a digest to everyone taking digests at this frequency (and to
+    anyone who has switched back to immediate emails since events were saved
+    for them) of their waiting events, grouped by case. Returns the number
+    of digests sent."""
+    with transaction.atomic():
+        events = list(
+            DigestEvent.objects.filter(
+                recipient__staff_email_digest__in=(frequency, "")
+            )
+            .select_related("recipient", "case")
+            .order_by("recipient_id", "case_id", "time", "id")
+            .select_for_update(skip_locked=True, of=("self",))
+        )
+        digests = []
+        for _, user_events in groupby(events, key=lambda event: event.recipient_id):
+            user_events = list(user_events)
+            user = user_events[0].recipient
+            if not (user.is_active and user.staff_email_notifications):
+                continue
+            cases = []
+            for _, case_events in groupby(user_events, key=lambda e: e.case_id):
+                case_events = list(case_events)
+                cases.append(
+                    {
+                        "case": case_events[0].case,
+                        "url": case_events[-1].url,
+                        "events": case_events,
+                    }
+                )
+            digests.append((user.email, {"user": user, "cases": cases}))
+        send_emails(DIGEST_SUBJECT, "cases/email/digest", digests)
+        DigestEvent.objects.filter(id__in=[event.id for event in events]).delete()
+    return len(digests)
@@ -101,23 +101,12 @@ class CaseFilter(django_filters.FilterSet):
         self.filters["where"].label = "Noise location type"
         self.filters["estate"].label = "Hackney Estates property?"
 
-        assignees = (
-            Case.objects.filter(assigned__isnull=False)
-            .values("assigned__first_name", "assigned__last_name", "assigned")
-            .distinct()
-            .order_by("assigned__first_name", "assigned__last_name")
-        )
-        ids = set()
-        for assignee in assignees:
-            id = assignee["assigned"]
-            name = (
-                f"{assignee['assigned__first_name']} {assignee['assigned__last_name']}"
-            )
-            self.filters["assigned"].extra["choices"].append((id, name))
-            ids.add(id)
+        choices = Case.objects.assignee_choices()
+        self.filters["assigned"].extra["choices"].extend(choices)
         try:
-            user = User.objects.get(id=data.get("assigned", ""))
-            if user.id not in ids:
+            assigned = int(data.get("assigned", ""))
+            if assigned not in dict(choices):
+                user = User.objects.get(id=assigned)
                 self.filters["assigned"].extra["choices"].append((user.id, user))
         except (User.DoesNotExist, ValueError):
             pass
@@ -5,12 +5,13 @@ from crispy_forms_gds.choices import Choice
 from crispy_forms_gds.fields import DateInputField
 from crispy_forms_gds.layout import Fieldset, Layout, HTML
 from django import forms
-from django.db.models import Q
 from django.utils.timezone import make_aware, now
 from django.core.exceptions import ValidationError
 from humanize import naturalsize
 
 from accounts.models import User
+from accounts.directory import staff_with_permission
+from accounts.routing import ward_staff_ids
 from noiseworks import cobrand
 from noiseworks.forms import GDSForm
 
@@ -37,21 +38,15 @@ class ReassignForm(GDSForm, forms.ModelForm):
         super().__init__(*args, **kwargs)
 
         self.current_assigned = self.instance.assigned
-        assignable_staff = User.objects.filter(
-            Q(is_active=True)
-            & (
-                Q(user_permissions__codename="get_assigned")
-                | Q(groups__permissions__codename="get_assigned")
-            )
-        )
+        in_ward = ward_staff_ids(self.instance.ward)
         ward_staff = []
         other_staff = []
-        for user in assignable_staff:
-            user_str = f"{user} ({user.get_wards_display()})"
-            if user.wards and self.instance.ward in user.wards:
-                ward_staff.append(Choice(user.id, user_str))
+        for user in staff_with_permission("get_assigned"):
+            user_str = f"{user['name']} ({user['wards']})"
+            if user["id"] in in_ward:
+                ward_staff.append(Choice(user["id"], user_str))
             else:
-                other_staff.append(Choice(user.id, user_str))
+                other_staff.append(Choice(user["id"], user_str))
         if ward_staff:
             ward_staff[-1].divider = "or"
         self.fields["assigned"].choices = ward_staff + other_staff
@@ -78,20 +73,14 @@ class FollowersForm(GDSForm, forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        staff_that_can_follow = User.objects.filter(
-            Q(is_active=True)
-            & (
-                Q(user_permissions__codename="follow")
-                | Q(groups__permissions__codename="follow")
-            )
-        )
+        in_ward = ward_staff_ids(self.instance.ward)
         ward_staff = []
         other_staff = []
-        for user in staff_that_can_follow:
-            if user.wards and self.instance.ward in user.wards:
-                ward_staff.append(Choice(user.id, user))
+        for user in staff_with_permission("follow"):
+            if user["id"] in in_ward:
+                ward_staff.append(Choice(user["id"], user["name"]))
             else:
-                other_staff.append(Choice(user.id, user))
+                other_staff.append(Choice(user["id"], user["name"]))
         self.fields["followers"].choices = ward_staff + other_staff
         self.fields["followers"].required = False
 
@@ -1,10 +1,10 @@
 from crispy_forms_gds.choices import Choice
 from django import forms
-from django.db.models import Q
 from django.utils.html import format_html, mark_safe
 from phonenumber_field.formfields import PhoneNumberField
 
 from accounts.models import User
+from accounts.search import search_people
 from noiseworks import cobrand
 from noiseworks.forms import StepForm
 
@@ -23,19 +23,13 @@ class PersonPickForm(StepForm):
         super().__init__(*args, **kwargs)
         search = self.initial.get("search")
         if search:
-            search = search.lower()
-            queries = (
-                Q(first_name__icontains=search)
-                | Q(last_name__icontains=search)
-                | Q(address__icontains=search)
-                | Q(email__icontains=search)
-                | Q(phone__icontains=search)
-            )
-            if " " in search:
-                first, last = search.split(maxsplit=1)
-                queries |= Q(first_name__icontains=first) & Q(last_name__icontains=last)
-            choices = User.objects.filter(queries)
-            choices = list(map(lambda x: (x.id, str(x)), choices))
+            people, more = search_people(search)
+            choices = list(map(lambda x: (x.id, str(x)), people))
+            if more:
+                self.fields["user"].help_text = (
+                    f"Only the {len(people)} closest matches are shown;"
+                    " go back and refine your search if the person is not listed."
+                )
         else:
             choices = []
 
@@ -0,0 +1,105 @@
+import gzip
+import json
+import posixpath
+import time
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ActionFile
+
+
+class Archive:
+    """Appends rows to a gzipped file of JSON lines, one object per row."""
+
+    def __init__(self, path, fields):
+        self.path = path
+        self.fields = fields
+        self.rows = 0
+
+    def __enter__(self):
+        self.fp = gzip.open(self.path, "at", encoding="utf-8")
+        return self
+
+    def __exit__(self, *exc):
+        self.fp.close()
+
+    def write(self, queryset):
+        for row in queryset.values(*self.fields).order_by("pk"):
+            self.fp.write(json.dumps(row, cls=DjangoJSONEncoder))
+            self.fp.write("\n")
+            self.rows += 1
+        self.fp.flush()
+
+
+def delete_in_batches(
+    queryset, batch_size=1000, sleep=0, archive=None, progress=None
+):
+    """Delete everything matched by queryset, walking it in primary key order
+    batch_size rows at a time so that no single statement holds locks on (or
+    Django collects into memory) the whole set. Each batch is archived first,
+    if an Archive is given, and deleted in its own transaction. progress, if
+    given, is called with the running total after each batch."""
+
+    model = queryset.model
+    last_pk = None
+    total = 0
+    while True:
+        batch = queryset.order_by("pk")
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        pks = list(batch.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            break
+        last_pk = pks[-1]
+
+        with transaction.atomic():
+            batch = model.objects.filter(pk__in=pks)
+            if archive:
+                archive.write(batch)
+            deleted, _ = batch.delete()
+        total += deleted
+
+        if progress:
+            progress(total)
+        if len(pks) < batch_size:
+            break
+        if sleep:
+            time.sleep(sleep)
+    return total
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def walk_storage(storage, path=""):
+    """Yield the name of every file in storage at or below path, one directory
+    at a time, so a large tree is never listed in full."""
+    dirs, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for name in dirs:
+        yield from walk_storage(storage, posixpath.join(path, name))
+
+
+def orphaned_files(storage, names, chunk_size=1000, grace=None):
+    """Given an iterable of file names in storage, yield those that no
+    ActionFile refers to, looking them up chunk_size names at a time. Files
+    modified within the grace period are skipped, as they may belong to an
+    upload whose ActionFile has not yet been saved."""
+    cutoff = timezone.now() - grace if grace else None
+    for chunk in chunked(names, chunk_size):
+        known = set(
+            ActionFile.objects.filter(file__in=chunk).values_list("file", flat=True)
+        )
+        for name in chunk:
+            if name in known:
+                continue
+            if cutoff and storage.get_modified_time(name) > cutoff:
+                continue
+            yield name
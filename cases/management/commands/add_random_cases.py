@@ -10,9 +10,10 @@ from django.utils import timezone
 from accounts.models import User
 from cases.models import Action, ActionType, Case, Complaint
 from noiseworks import cobrand
+from noiseworks.profiling import ProfilingMixin
 
 
-class Command(BaseCommand):
+class Command(ProfilingMixin, BaseCommand):
     help = "Create a number of random cases in the database"
     _uprns = None
 
@@ -39,7 +40,8 @@ class Command(BaseCommand):
             field = model._meta.get_field("modified")
             field.auto_now = False
 
-        self.set_up_staff_users()
+        with self.phase("staff"):
+            self.set_up_staff_users()
 
         dates = []
         date = self.now = timezone.now()
@@ -136,6 +138,8 @@ class Command(BaseCommand):
                 if options["commit"]:
                     complaint.save()
 
+            self.advance()
+
         # Reinstate auto fields (in case called with call_command)
         for model in (Case, Complaint, Action):
             field = model._meta.get_field("created")
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from cases.models import HistoricalCase, history_diff
+from noiseworks.profiling import ProfilingMixin
+
+
+class Command(ProfilingMixin, BaseCommand):
+    help = "Store the change list on historical case records that lack one."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute every record, e.g. after changing the excluded fields",
+        )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of records to update in each batch",
+            type=int,
+            default=1000,
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("Please specify a positive batch size")
+        self.verbosity = options["verbosity"]
+
+        # Each case's records are walked oldest first, comparing each one with
+        # the one before; only the current and previous record are held.
+        records = HistoricalCase.objects.order_by(
+            "id", "history_date", "history_id"
+        ).iterator(chunk_size=options["batch_size"])
+        batch = []
+        total = 0
+        previous = None
+        for record in records:
+            if previous and previous.id != record.id:
+                previous = None
+            if options["all"] or record.diff is None:
+                record.diff = history_diff(record, previous)
+                batch.append(record)
+                if len(batch) >= options["batch_size"]:
+                    total += self.save(batch)
+                    batch = []
+            previous = record
+        total += self.save(batch)
+
+        if options["verbosity"]:
+            self.stdout.write(f"Stored changes for {total} historical records")
+
+    def save(self, batch):
+        with transaction.atomic():
+            HistoricalCase.objects.bulk_update(batch, ["diff"])
+        self.advance(len(batch))
+        if batch and self.verbosity > 1:
+            self.stdout.write(f"Updated {len(batch)} records")
+        return len(batch)
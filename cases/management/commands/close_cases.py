@@ -6,9 +6,10 @@ from django.db.models import Count
 from django.utils import timezone
 
 from cases.models import Action, ActionType, Case
+from noiseworks.profiling import ProfilingMixin
 
 
-class Command(BaseCommand):
+class Command(ProfilingMixin, BaseCommand):
     help = "Close cases that have had no recurrences after a period of time"
 
     def add_arguments(self, parser):
@@ -40,3 +41,4 @@ class Command(BaseCommand):
                     transaction.set_rollback(True)
                 if options["verbosity"]:
                     self.stdout.write(f"Automatically closing case #{case.id}")
+            self.advance()
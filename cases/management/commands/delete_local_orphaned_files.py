@@ -1,23 +1,63 @@
+import datetime
+from itertools import islice
+
 from django.core.files.storage import FileSystemStorage
 from django.core.management.base import BaseCommand, CommandError
 
-from cases.models import ActionFile
+from cases.housekeeping import orphaned_files, walk_storage
+from noiseworks.profiling import ProfilingMixin
 
 
-class Command(BaseCommand):
+class Command(ProfilingMixin, BaseCommand):
     help = "Delete all files in local storage that don't correspond to an object in the database"
 
     def add_arguments(self, parser):
         parser.add_argument("--path", type=str)
+        parser.add_argument(
+            "--grace-hours",
+            help="Leave files modified within this many hours alone",
+            type=float,
+            default=24,
+        )
+        parser.add_argument(
+            "--limit", help="Maximum number of files to delete", type=int
+        )
+        parser.add_argument(
+            "--chunk-size",
+            help="Number of file names to check against the database at once",
+            type=int,
+            default=1000,
+        )
+        parser.add_argument(
+            "--dry-run",
+            help="Only list the files that would be deleted",
+            action="store_true",
+        )
 
     def handle(self, *args, **options):
         if not options["path"]:
             raise CommandError("Please specify a path")
 
         storage = FileSystemStorage(location=options["path"])
-        _, storage_filenames = storage.listdir("")
-        action_filenames = [af.file.name for af in ActionFile.objects.all()]
+        grace = datetime.timedelta(hours=options["grace_hours"])
+        orphans = orphaned_files(
+            storage,
+            walk_storage(storage),
+            chunk_size=options["chunk_size"],
+            grace=grace,
+        )
+        if options["limit"] is not None:
+            orphans = islice(orphans, options["limit"])
 
-        for fn in storage_filenames:
-            if fn not in action_filenames:
+        count = 0
+        for fn in orphans:
+            if options["dry_run"] or options["verbosity"] > 1:
+                self.stdout.write(f"Orphaned file {fn}")
+            if not options["dry_run"]:
                 storage.delete(fn)
+            count += 1
+            self.advance()
+
+        if options["dry_run"] or options["verbosity"] > 1:
+            action = "Found" if options["dry_run"] else "Deleted"
+            self.stdout.write(f"{action} {count} orphaned files")
@@ -3,21 +3,70 @@ import datetime
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 
+from cases.housekeeping import Archive, delete_in_batches
 from cases.models import Notification
+from noiseworks.profiling import ProfilingMixin
 
 
-class Command(BaseCommand):
+class Command(ProfilingMixin, BaseCommand):
     help = "Delete all notifications that are older than a given number of days."
 
+    archive_fields = [
+        "id",
+        "case_id",
+        "recipient_id",
+        "triggered_by_id",
+        "time",
+        "message",
+        "read",
+    ]
+
     def add_arguments(self, parser):
         parser.add_argument(
             "--days",
             help="Number of days after which to delete a notification",
             type=int,
         )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of notifications to delete in each batch",
+            type=int,
+            default=1000,
+        )
+        parser.add_argument(
+            "--sleep",
+            help="Seconds to pause between batches",
+            type=float,
+            default=0.1,
+        )
+        parser.add_argument(
+            "--archive",
+            help="Append deleted notifications to this gzipped JSON lines file first",
+        )
 
     def handle(self, *args, **options):
         if not options["days"]:
             raise CommandError("Please specify a number of days")
+        if options["batch_size"] < 1:
+            raise CommandError("Please specify a positive batch size")
         cutoff = timezone.now() - datetime.timedelta(days=options["days"])
-        Notification.objects.filter(time__lt=cutoff).delete()
+        notifications = Notification.objects.filter(time__lt=cutoff)
+
+        def progress(total):
+            self.advance(total - self.total.rows)
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Deleted {total} notifications")
+
+        kwargs = {
+            "batch_size": options["batch_size"],
+            "sleep": options["sleep"],
+            "progress": progress,
+        }
+        if options["archive"]:
+            with Archive(options["archive"], self.archive_fields) as archive:
+                total = delete_in_batches(notifications, archive=archive, **kwargs)
+        else:
+            total = delete_in_batches(notifications, **kwargs)
+
+        if options["verbosity"] > 1:
+            self.stdout.write(f"Deleted {total} notifications older than {cutoff}")
@@ -9,6 +9,7 @@ from smart_open import open
 
 from accounts.models import User
 from cases.models import Action, Case, Complaint, HistoricalCase, MergeRecord
+from noiseworks.profiling import ProfilingMixin
 
 Case_perpetrators = Case.perpetrators.through
 
@@ -21,7 +22,7 @@ session = boto3.Session(
 client = session.client("s3")
 
 
-class Command(BaseCommand):
+class Command(ProfilingMixin, BaseCommand):
     help = "Export the data as CSV files to an S3 bucket (locally for now)"
 
     fields = {
@@ -162,18 +163,20 @@ class Command(BaseCommand):
             path = self.dir / basename
             path_kwargs = dict(mode="w")
 
-        fp = open(path, **path_kwargs)
-        writer = csv.writer(fp)
-        writer.writerow(field_names)
-        for row in queryset:
-            values = []
-            for field in field_names:
-                if field in self.special:
-                    value = self.special[field](row)
-                else:
-                    value = getattr(row, field)
-                if value is None:
-                    value = ""
-                values.append(value)
-            writer.writerow(values)
-        fp.close()
+        with self.phase(model.__name__):
+            fp = open(path, **path_kwargs)
+            writer = csv.writer(fp)
+            writer.writerow(field_names)
+            for row in queryset:
+                values = []
+                for field in field_names:
+                    if field in self.special:
+                        value = self.special[field](row)
+                    else:
+                        value = getattr(row, field)
+                    if value is None:
+                        value = ""
+                    values.append(value)
+                writer.writerow(values)
+                self.advance()
+            fp.close()
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cases.models import ActionType
+from cases.synthetic import Generator
+from noiseworks.profiling import ProfilingMixin
+
+
+class Command(ProfilingMixin, BaseCommand):
+    help = (
+        "Quickly create a large number of made-up cases, with complaints,"
+        " actions, merges, history and notifications, for load testing"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, help="Number of cases to create")
+        parser.add_argument(
+            "--batch-size",
+            help="Number of cases to create in each transaction",
+            type=int,
+            default=5000,
+        )
+        parser.add_argument(
+            "--days",
+            help="Spread the cases over this many days up to now",
+            type=int,
+            default=730,
+        )
+        parser.add_argument("--seed", type=int, help="Seed for repeatable data")
+
+    def handle(self, *args, **options):
+        if not options["number"] or options["number"] < 1:
+            raise CommandError("Please specify a number of cases to create")
+        if options["batch_size"] < 1:
+            raise CommandError("Please specify a positive batch size")
+        if not ActionType.objects.exists():
+            raise CommandError(
+                "Please load the action types first, e.g. loaddata action_types_hackney"
+            )
+
+        generator = Generator(
+            options["number"],
+            span=timedelta(days=options["days"]),
+            seed=options["seed"],
+        )
+        remaining = options["number"]
+        while remaining > 0:
+            number = min(remaining, options["batch_size"])
+            generator.batch(number, phase=self.phase)
+            remaining -= number
+            self.advance(number)
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Created {generator.created['cases']} cases")
+        with self.phase("finish"):
+            generator.finish()
+
+        if options["verbosity"]:
+            created = ", ".join(
+                f"{count} {name}" for name, count in generator.created.items()
+            )
+            self.stdout.write(f"Created {created}")
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from accounts.models import User
+from cases.models import Notification
+from noiseworks.profiling import ProfilingMixin
+
+
+class Command(ProfilingMixin, BaseCommand):
+    help = (
+        "Check each user's stored unread notification count against their"
+        " notifications, and with --commit correct any that are wrong"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--commit", action="store_true")
+
+    def handle(self, *args, **options):
+        unread = (
+            Notification.objects.filter(recipient=OuterRef("pk"), read=False)
+            .order_by()
+            .values("recipient")
+            .annotate(n=Count("id"))
+            .values("n")
+        )
+        with transaction.atomic():
+            wrong = (
+                User.objects.select_for_update()
+                .annotate(actual=Coalesce(Subquery(unread), 0))
+                .exclude(unread_notifications_count=F("actual"))
+                .order_by("id")
+            )
+            for user in wrong:
+                if options["verbosity"]:
+                    self.stdout.write(
+                        f"User {user.id} has {user.actual} unread notifications,"
+                        f" not {user.unread_notifications_count}"
+                    )
+                if options["commit"]:
+                    User.objects.filter(id=user.id).update(
+                        unread_notifications_count=Coalesce(Subquery(unread), 0)
+                    )
+                self.advance()
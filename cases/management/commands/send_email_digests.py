@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from cases.digest import send_digests
+from noiseworks.profiling import ProfilingMixin
+
+
+class Command(ProfilingMixin, BaseCommand):
+    help = "Send digest emails to staff who take them at the given frequency"
+
+    def add_arguments(self, parser):
+        parser.add_argument("frequency", choices=("hourly", "daily"))
+
+    def handle(self, *args, **options):
+        sent = send_digests(options["frequency"])
+        self.advance(sent)
+        if options["verbosity"] > 1:
+            self.stdout.write(f"Sent {sent} digests")
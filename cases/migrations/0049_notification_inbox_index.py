@@ -0,0 +1,22 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The notifications table can be large, so build the index without
+    # locking out writes; that can't be done inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ("cases", "0048_alter_action_created_by_alter_action_modified_by_and_more"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="notification",
+            index=models.Index(
+                fields=["recipient", "read", "time"],
+                name="cases_notification_inbox_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def forwards_func(apps, schema_editor):
+    User = apps.get_model("accounts", "User")
+    Notification = apps.get_model("cases", "Notification")
+    unread = (
+        Notification.objects.filter(recipient=OuterRef("pk"), read=False)
+        .order_by()
+        .values("recipient")
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    recipients = Notification.objects.filter(read=False).values("recipient")
+    User.objects.filter(id__in=recipients).update(
+        unread_notifications_count=Coalesce(Subquery(unread), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0012_user_unread_notifications_count"),
+        ("cases", "0049_notification_inbox_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards_func, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cases", "0050_populate_unread_notifications_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicalcase",
+            name="diff",
+            field=models.JSONField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+def forwards_func(apps, schema_editor):
+    ActionFile = apps.get_model("cases", "ActionFile")
+    files = ActionFile.objects.filter(size__isnull=True).exclude(file="")
+    batch = []
+    for action_file in files.iterator(chunk_size=1000):
+        try:
+            action_file.size = action_file.file.size
+        except (OSError, ValueError):
+            # Missing from storage; leave it to be looked up if ever shown
+            continue
+        batch.append(action_file)
+        if len(batch) >= 1000:
+            ActionFile.objects.bulk_update(batch, ["size"])
+            batch = []
+    ActionFile.objects.bulk_update(batch, ["size"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cases", "0051_historicalcase_diff"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="actionfile",
+            name="size",
+            field=models.PositiveBigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(forwards_func, reverse_code=migrations.RunPython.noop),
+    ]
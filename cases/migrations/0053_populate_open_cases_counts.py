@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def forwards_func(apps, schema_editor):
+    User = apps.get_model("accounts", "User")
+    Case = apps.get_model("cases", "Case")
+    open_cases = Case.objects.filter(
+        assigned__isnull=False, closed=False, merged_into__isnull=True
+    )
+    counts = (
+        open_cases.filter(assigned=OuterRef("pk"))
+        .order_by()
+        .values("assigned")
+        .annotate(
+            n=Count("id"),
+            priority=Count("id", filter=Q(priority=True)),
+        )
+    )
+    User.objects.filter(id__in=open_cases.values("assigned")).update(
+        open_cases_count=Coalesce(Subquery(counts.values("n")), 0),
+        open_priority_cases_count=Coalesce(Subquery(counts.values("priority")), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0014_user_open_cases_count"),
+        ("cases", "0052_actionfile_size"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards_func, reverse_code=migrations.RunPython.noop),
+    ]
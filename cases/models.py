@@ -1,20 +1,30 @@
+import datetime
+import heapq
 import requests
 import math
+from collections import Counter
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.gis.db import models
 from django.contrib.gis.geos import Point
-from django.db.models import Count, Q
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Greatest
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.functional import cached_property, classproperty
 from django.utils.html import format_html, mark_safe
 from functools import lru_cache
+from itertools import islice
 from humanize import naturalsize
-from simple_history.models import HistoricalRecords
+from simple_history.models import HistoricalRecords, ModelChange, ModelDelta
 
 from accounts.models import User
 from noiseworks import cobrand
 from noiseworks.current_user import get_current_user
+from noiseworks.metrics import record_http_response
+
+from . import realtime
 
 
 def ward_name_to_id(ward):
@@ -79,6 +89,67 @@ class CaseManager(models.Manager):
             reoccurrences=Count("complaints") - 1
         )
 
+    def assignee_choices(self):
+        """(ID, name) of everyone who has ever been assigned a case, ordered
+        by name. Cached until someone new is assigned or one is edited (or
+        for at most ASSIGNEE_CHOICES_CACHE_TIMEOUT)."""
+        choices = cache.get(ASSIGNEE_CHOICES_CACHE_KEY)
+        if choices is None:
+            assignees = (
+                self.filter(assigned__isnull=False)
+                .values("assigned__first_name", "assigned__last_name", "assigned")
+                .distinct()
+                .order_by("assigned__first_name", "assigned__last_name")
+            )
+            choices = [
+                (
+                    a["assigned"],
+                    f"{a['assigned__first_name']} {a['assigned__last_name']}",
+                )
+                for a in assignees
+            ]
+            cache.set(
+                ASSIGNEE_CHOICES_CACHE_KEY,
+                choices,
+                settings.ASSIGNEE_CHOICES_CACHE_TIMEOUT,
+            )
+        return choices
+
+    def _cached_assignee_ids(self):
+        choices = cache.get(ASSIGNEE_CHOICES_CACHE_KEY)
+        return None if choices is None else {id for id, _ in choices}
+
+    def assignee_added(self, user_id):
+        """Clear the cached assignee choices if they are missing this user."""
+        ids = self._cached_assignee_ids()
+        if ids is not None and user_id not in ids:
+            cache.delete(ASSIGNEE_CHOICES_CACHE_KEY)
+
+    def assignee_changed(self, user_id):
+        """Clear the cached assignee choices if they include this user."""
+        ids = self._cached_assignee_ids()
+        if ids is not None and user_id in ids:
+            cache.delete(ASSIGNEE_CHOICES_CACHE_KEY)
+
+    def original_entries(self, cases):
+        """Given cases, return the first recorded version of each, in the same
+        order, with their reoccurrences count, from one query using DISTINCT
+        ON over the case history. A case with no history, e.g. one bulk
+        created, is its own original."""
+        cases = list(cases)
+        earliest = (
+            self.model.history.model.objects.filter(id__in=[case.id for case in cases])
+            .order_by("id", "history_date", "history_id")
+            .distinct("id")
+        )
+        earliest = {h.id: h.instance for h in earliest}
+        originals = []
+        for case in cases:
+            original = earliest.get(case.id, case)
+            original.reoccurrences = case.reoccurrences
+            originals.append(original)
+        return originals
+
     def prefetch_timeline_part(self, merge_map, qs, id_field):
         by_case = {}
         for obj in qs:
@@ -125,6 +196,9 @@ class CaseManager(models.Manager):
 
     @staticmethod
     def attach_diffs(histories):
+        """Given newest-first historical records, attach to each the changes
+        made by the record after it, using the stored change list if there is
+        one and only comparing the records if not."""
         histories_by_case = {}
         for history in histories:
             histories_by_case.setdefault(history.id, []).append(history)
@@ -132,9 +206,16 @@ class CaseManager(models.Manager):
             edit = edits[0]
             edit._cached_diff = None
             for prev in edits[1:]:
-                prev._cached_diff = edit.diff_against(
-                    prev, excluded_fields=["last_update_type"]
-                )
+                if edit.diff is None:
+                    prev._cached_diff = edit.diff_against(
+                        prev,
+                        excluded_fields=settings.CASE_HISTORY_DIFF_EXCLUDED_FIELDS,
+                    )
+                else:
+                    changes = [ModelChange(**change) for change in edit.diff]
+                    prev._cached_diff = ModelDelta(
+                        changes, [c.field for c in changes], prev, edit
+                    )
                 edit = prev
 
     def get_merged_cases(self, cases):
@@ -247,6 +328,44 @@ class CaseManager(models.Manager):
         return qs.annotate(total_complaints=Count("complaints"))
 
 
+ASSIGNEE_CHOICES_CACHE_KEY = "case-assignee-choices"
+
+
+def timeline_cache_key(case_id):
+    return f"case-timeline:{case_id}"
+
+
+def _history_json(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def history_diff(new, old):
+    """Return the changes from one historical case record to the next, as a
+    list of dicts that can be stored on the newer record. Values are stored
+    as they are displayed, so anything not native to JSON becomes a
+    string."""
+    if old is None:
+        return []
+    delta = new.diff_against(
+        old, excluded_fields=settings.CASE_HISTORY_DIFF_EXCLUDED_FIELDS
+    )
+    return [
+        {"field": c.field, "old": _history_json(c.old), "new": _history_json(c.new)}
+        for c in delta.changes
+    ]
+
+
+class HistoricalCaseDiff(models.Model):
+    """Base for historical case records, storing what each one changed."""
+
+    diff = models.JSONField(null=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+
 class Case(AbstractModel):
     class LastUpdateTypes(models.TextChoices):
         ACTION = "AC", "Action"
@@ -329,7 +448,8 @@ class Case(AbstractModel):
     )
 
     history = HistoricalRecords(
-        excluded_fields=["modified", "modified_by", "last_update_type"]
+        excluded_fields=["modified", "modified_by", "last_update_type"],
+        bases=[HistoricalCaseDiff],
     )
     objects = CaseManager()
 
@@ -359,9 +479,45 @@ class Case(AbstractModel):
     def get_absolute_url(self):
         return reverse("case-view", args=[self.pk])
 
+    # Fields that decide whether a case counts towards its assignee's workload
+    WORKLOAD_FIELDS = ("assigned_id", "closed", "merged_into_id", "priority")
+    _loaded_workload = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(f in instance.__dict__ for f in cls.WORKLOAD_FIELDS):
+            instance._loaded_workload = instance.workload
+        else:
+            instance._loaded_workload = WORKLOAD_UNKNOWN
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using, fields, **kwargs)
+        if fields is None:
+            self._loaded_workload = self.workload
+
+    @property
+    def workload(self):
+        """The (assignee ID, priority) that this case adds to its assignee's
+        open case counts, or None if it is not an open assigned case."""
+        if self.assigned_id and not self.closed and not self.merged_into_id:
+            return (self.assigned_id, self.priority)
+        return None
+
     def save(self, *args, **kwargs):
         self.update_location_cache()
-        return super().save(*args, **kwargs)
+        old = self._loaded_workload
+        if old is WORKLOAD_UNKNOWN:
+            old = Case.objects.get(pk=self.pk).workload
+        with transaction.atomic():
+            ret = super().save(*args, **kwargs)
+            new = self.workload
+            if old != new:
+                adjust_open_cases_count(old, -1)
+                adjust_open_cases_count(new, 1)
+        self._loaded_workload = new
+        return ret
 
     def original_entry(self):
         r = self.reoccurrences
@@ -381,7 +537,8 @@ class Case(AbstractModel):
         elif self.point:
             key = settings.MAPIT_API_KEY
             data = requests.get(
-                f"https://mapit.mysociety.org/point/27700/{self.point.x},{self.point.y}?api_key={key}"
+                f"https://mapit.mysociety.org/point/27700/{self.point.x},{self.point.y}?api_key={key}",
+                hooks={"response": record_http_response},
             ).json()
             if "2508" in data.keys():
                 ward = ""
@@ -472,19 +629,11 @@ class Case(AbstractModel):
             )
         downstream_records = MergeRecord.objects.filter(downstream_records_query).all()
 
-        return direct_and_upstream_records | downstream_records
+        records = direct_and_upstream_records | downstream_records
+        return records.select_related("created_by").order_by("-time", "-id")
 
     def notify_followers(self, message, triggered_by=None):
-        for follower in self.followers.all():
-            if follower == triggered_by or not follower.staff_web_notifications:
-                continue
-
-            Notification.objects.create(
-                case=self,
-                message=message,
-                recipient=follower,
-                triggered_by=triggered_by,
-            )
+        Notification.objects.notify_followers([(self, message)], triggered_by)
 
     def assign(self, assignee, triggered_by=None):
         self.assigned = assignee
@@ -533,16 +682,7 @@ class Case(AbstractModel):
         Case.objects.attach_diffs(histories)
         return histories
 
-    def _timeline(
-        self,
-        actions,
-        action_fn,
-        complaints,
-        timeline_merge_records,
-        history_to_show,
-        user=None,
-    ):
-        data = []
+    def _timeline_action_rows(self, actions, action_fn, history_to_show):
         for action in actions:
             row = {
                 "time": action.time,
@@ -550,63 +690,138 @@ class Case(AbstractModel):
                 "action": action,
             }
             if history_to_show == "all":
-                row["files"] = []
-                for _file in action.files.all():
-                    entry = {
-                        "file": _file,
-                    }
-                    if user:
-                        entry["can_delete"] = _file.can_delete(user)
-                    row["files"].append(entry)
-
-            if user:
-                row["can_edit_action"] = action.can_edit(user)
-
-            data.append(row)
-        for complaint in complaints:
-            row = {
-                "complaint": complaint,
-                "time": complaint.created,
-            }
-            data.append(row)
+                row["files"] = []  # Filled in by _attach_timeline_files
+            yield row
 
-        for mr in timeline_merge_records:
-            row = {
-                "merge_record": mr,
-                "time": mr.time,
-            }
-            data.append(row)
-
-        edits = self.historical_entries
-        if len(edits) > 1:
-            edit = edits[0]
-            for prev in edits[1:]:
-                diff = prev._cached_diff  # Must always be available by here
-                if not diff:
+    @staticmethod
+    def _attach_timeline_files(rows):
+        """Give the action rows their files, all loaded in one query, with
+        what is needed to link to them."""
+        rows = [row for row in rows if "files" in row]
+        if not rows:
+            return
+        files = (
+            ActionFile.objects.filter(action__in=[row["action"].id for row in rows])
+            .annotate(action_case_id=F("action__case_id"))
+            .order_by("id")
+        )
+        files_by_action = {}
+        for _file in files:
+            files_by_action.setdefault(_file.action_id, []).append({"file": _file})
+        for row in rows:
+            row["files"] = files_by_action.get(row["action"].id, [])
+
+    def _timeline_edit_rows(self, edits, history_to_show):
+        edits = iter(edits)
+        edit = next(edits, None)
+        for prev in edits:
+            diff = prev._cached_diff  # Must always be available by here
+            if not diff:
+                continue
+            changes = []
+            entries = []
+            for d in diff.changes:
+                if d.field == "assigned":
+                    entries.append(
+                        self._timeline_edit_assign_entry(edit, prev, history_to_show)
+                    )
+                elif d.field == "closed":
                     continue
-                changes = []
-                for d in diff.changes:
-                    if d.field == "assigned":
-                        data.append(
-                            self._timeline_edit_assign_entry(
-                                edit, prev, history_to_show
-                            )
-                        )
-                    elif d.field == "closed":
-                        continue
-                    elif d.field == "merged_into":
-                        continue
-                    else:
-                        changes.append(d)
+                elif d.field == "merged_into":
+                    continue
+                else:
+                    changes.append(d)
 
-                if changes and history_to_show == "all":
-                    data.append(self._timeline_edit_entry(edit, changes))
+            if changes and history_to_show == "all":
+                entries.append(self._timeline_edit_entry(edit, changes))
+            yield from entries
 
-                edit = prev
+            edit = prev
+
+    def _timeline_events(
+        self,
+        actions,
+        action_fn,
+        complaints,
+        timeline_merge_records,
+        edits,
+        history_to_show,
+    ):
+        """Each source is already newest first, so rather than gathering and
+        sorting everything, merge them lazily; only as many rows are built as
+        are consumed."""
+        return heapq.merge(
+            self._timeline_action_rows(actions, action_fn, history_to_show),
+            ({"complaint": c, "time": c.created} for c in complaints),
+            ({"merge_record": mr, "time": mr.time} for mr in timeline_merge_records),
+            self._timeline_edit_rows(edits, history_to_show),
+            key=lambda row: row["time"],
+            reverse=True,
+        )
 
-        data = sorted(data, reverse=True, key=lambda x: x["time"])
+    def _timeline(
+        self,
+        actions,
+        action_fn,
+        complaints,
+        timeline_merge_records,
+        history_to_show,
+    ):
+        data = list(
+            self._timeline_events(
+                actions,
+                action_fn,
+                complaints,
+                timeline_merge_records,
+                self.historical_entries,
+                history_to_show,
+            )
+        )
+        self._attach_timeline_files(data)
         return data
 
+    def timeline_staff_page(self, before=None, skip=0, size=None):
+        """Return a page of the staff timeline, newest first, and the cursor
+        for the page after it (or None if there are no more events). A page
+        starts with the events at or before the time before, less the first
+        skip events at exactly that time, which were on the previous page.
+        Each source is only queried for as many rows as the page could use."""
+        size = size or settings.CASE_TIMELINE_PAGE_SIZE
+        limit = size + skip + 1
+        actions = self.actions_reversed.order_by("-time", "-id")
+        complaints = self.all_complaints.order_by("-created", "-id")
+        merge_records = self.timeline_merge_records
+        edits = self.history.select_related("history_user", "assigned")
+        if before:
+            actions = actions.filter(time__lte=before)
+            complaints = complaints.filter(created__lte=before)
+            merge_records = merge_records.filter(time__lte=before)
+            edits = edits.filter(history_date__lte=before)
+        # One more edit than events, as each edit is compared with the one before
+        edits = list(edits[: limit + 1])
+        Case.objects.attach_diffs(edits)
+
+        events = self._timeline_events(
+            actions[:limit],
+            str,
+            complaints[:limit],
+            merge_records[:limit],
+            edits,
+            "all",
+        )
+        page = list(islice(events, skip, skip + size + 1))
+        if len(page) <= size:
+            self._attach_timeline_files(page)
+            return page, None
+
+        page = page[:size]
+        self._attach_timeline_files(page)
+        last = page[-1]["time"]
+        shown = sum(1 for row in page if row["time"] == last)
+        if before and last == before:
+            shown += skip
+        return page, {"before": time_to_micros(last), "skip": shown}
+
     @cached_property
     def timeline_user(self):
         """User timeline shows all manual actions, and only their own complaints"""
@@ -633,16 +848,58 @@ class Case(AbstractModel):
             "all",
         )
 
-    def timeline_staff_with_operation_flags(self, staff):
-        """Staff timeline but including flags for what operations the staff member can do"""
-        return self._timeline(
-            self.actions_reversed,
-            str,
-            self.all_complaints_reversed,
-            self.timeline_merge_records,
-            "all",
-            user=staff,
-        )
+    @property
+    def timeline_cache_key(self):
+        return timeline_cache_key(self.id)
+
+    @cached_property
+    def cached_timeline_staff(self):
+        """The first page of the staff timeline, from the cache if possible.
+        It holds nothing specific to the viewer, so one copy serves every
+        member of staff."""
+        page = cache.get(self.timeline_cache_key)
+        if page is None:
+            page = self.timeline_staff_page()
+            cache.set(
+                self.timeline_cache_key,
+                page,
+                settings.CASE_TIMELINE_CACHE_TIMEOUT,
+            )
+        return page
+
+    def timeline_staff_with_operation_flags(
+        self, staff, before=None, skip=0, everything=False
+    ):
+        """A page of the staff timeline (or with everything, all of it, as for
+        printing), including flags for what operations the staff member can
+        do, and the cursor for the next page"""
+        if everything:
+            rows, cursor = self.timeline_staff, None
+        elif before:
+            rows, cursor = self.timeline_staff_page(before, skip)
+        else:
+            rows, cursor = self.cached_timeline_staff
+        timeline = []
+        for row in rows:
+            if isinstance(row.get("action"), Action):
+                row = dict(row, can_edit_action=row["action"].can_edit(staff))
+                row["files"] = [
+                    dict(entry, can_delete=entry["file"].can_delete(staff))
+                    for entry in row["files"]
+                ]
+            timeline.append(row)
+        return timeline, cursor
+
+    def invalidate_timeline(self):
+        """Forget the cached timeline of this case and of every case whose
+        timeline includes its events, through merging either way."""
+        ids = set(Case.objects.get_merged_cases([self]))
+        merged_into = Case.objects.get_merged_into_cases([self])
+        ids.update(merged["id"] for merged in merged_into[self.id])
+        keys = [timeline_cache_key(id) for id in ids]
+        cache.delete_many(keys)
+        # And again once committed, in case it was re-cached from before
+        transaction.on_commit(lambda: cache.delete_many(keys))
 
     @cached_property
     def merge_map(self):
@@ -662,7 +919,6 @@ class Case(AbstractModel):
             query |= Q(time__gte=merged["at"], case=merged["id"])
 
         actions = Action.objects.filter(query)
-        actions = actions.prefetch_related("files")
         actions = actions.order_by("-time")
         return actions
 
@@ -699,9 +955,15 @@ class Case(AbstractModel):
 
     @property
     def last_update(self):
-        for event in self.timeline_staff:
-            return event
-        return None
+        events = self._timeline_events(
+            self.actions_reversed,
+            str,
+            self.all_complaints_reversed,
+            self.timeline_merge_records,
+            self.historical_entries,
+            "all",
+        )
+        return next(events, None)
 
     @property
     def had_abatement_notice(self):
@@ -727,11 +989,8 @@ class Case(AbstractModel):
 
     @property
     def file_storage_used_bytes(self):
-        bytes_used = 0
-        for action in self.actions.prefetch_related("files").all():
-            for af in action.files.all():
-                bytes_used += af.file.size
-        return bytes_used
+        files = ActionFile.objects.filter(action__case=self)
+        return files.aggregate(used=Sum("size"))["used"] or 0
 
     @property
     def file_storage_remaining_bytes(self):
@@ -856,18 +1115,26 @@ class ActionFile(AbstractModel):
     action = models.ForeignKey(Action, on_delete=models.CASCADE, related_name="files")
     file = models.FileField()
     original_name = models.CharField(max_length=128)
+    # Stored on upload, so that listing files never needs to stat them
+    size = models.PositiveBigIntegerField(null=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        if self.size is None and self.file:
+            self.size = self.file.size
+        super().save(*args, **kwargs)
 
     @property
     def human_readable_size(self):
-        return naturalsize(self.file.size)
+        size = self.file.size if self.size is None else self.size
+        return naturalsize(size)
 
     def can_delete(self, user):
-        return user == self.created_by
+        return self.created_by_id is not None and self.created_by_id == user.pk
 
     def get_absolute_url(self):
-        return reverse(
-            "action-file", args=[self.action.case.pk, self.action.pk, self.pk]
-        )
+        # The timeline annotates the case ID when it loads files
+        case_id = getattr(self, "action_case_id", None) or self.action.case_id
+        return reverse("action-file", args=[case_id, self.action_id, self.pk])
 
 
 class MergeRecord(AbstractModel):
@@ -881,6 +1148,133 @@ class MergeRecord(AbstractModel):
     time = models.DateTimeField(default=timezone.now)
 
 
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def time_to_micros(time):
+    """A time as a whole number of microseconds, for use in URLs."""
+    return (time - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def micros_to_time(micros):
+    return EPOCH + datetime.timedelta(microseconds=int(micros))
+
+
+WORKLOAD_UNKNOWN = object()
+
+
+def adjust_open_cases_count(workload, sign):
+    """Add (or with a negative sign, subtract) a case with the given
+    Case.workload to its assignee's open case counts."""
+    if not workload:
+        return
+    user_id, priority = workload
+    updates = {}
+    fields = ["open_cases_count"]
+    if priority:
+        fields.append("open_priority_cases_count")
+    for field in fields:
+        count = F(field)
+        updates[field] = count + 1 if sign > 0 else Greatest(count - 1, 0)
+    User.objects.filter(id=user_id).update(**updates)
+
+
+def adjust_unread_notifications_counts(counts, sign=1):
+    """Given a dict of user ID to a number of notifications, add (or with a
+    negative sign, subtract) that many from each user's unread count, in one
+    query per distinct number."""
+    by_number = {}
+    for user_id, number in counts.items():
+        by_number.setdefault(number, []).append(user_id)
+    count = F("unread_notifications_count")
+    for number, user_ids in by_number.items():
+        new = count + number if sign > 0 else Greatest(count - number, 0)
+        User.objects.filter(id__in=user_ids).update(unread_notifications_count=new)
+
+
+class NotificationQuerySet(models.QuerySet):
+    def lock(self, *fields):
+        """Lock the notifications' rows until the end of the transaction,
+        returning the given fields of each, so that what is counted cannot
+        change before it is acted on."""
+        locked = self.order_by("pk").select_for_update(of=("self",))
+        return list(locked.values_list("pk", *fields))
+
+    def inbox(self, after=None):
+        """Order unread first, then newest first, continuing after the
+        (read, time, id) of the last notification seen, if given."""
+        qs = self.order_by("read", "-time", "-id")
+        if after:
+            read, time, pk = after
+            qs = qs.filter(
+                Q(read__gt=read)
+                | Q(read=read, time__lt=time)
+                | Q(read=read, time=time, pk__lt=pk)
+            )
+        return qs
+
+    def mark_read(self):
+        """Mark the notifications as read, keeping unread counts in step."""
+        with transaction.atomic():
+            rows = self.filter(read=False).lock("recipient")
+            self.model.objects.filter(pk__in=[pk for pk, _ in rows]).update(read=True)
+            unread = Counter(recipient for _, recipient in rows)
+            adjust_unread_notifications_counts(unread, -1)
+        realtime.publish(unread)
+
+    def delete(self):
+        with transaction.atomic():
+            rows = self.lock("recipient", "read")
+            unread = Counter(recipient for _, recipient, read in rows if not read)
+            locked = self.model.objects.filter(pk__in=[pk for pk, _, _ in rows])
+            deleted = super(NotificationQuerySet, locked).delete()
+            adjust_unread_notifications_counts(unread, -1)
+        realtime.publish(unread)
+        return deleted
+
+
+class NotificationManager(models.Manager.from_queryset(NotificationQuerySet)):
+    def notify_followers(self, events, triggered_by=None):
+        """Given a list of (case, message) events, notify each case's
+        followers of its message, bar the user who triggered the events and
+        anyone who has turned off web notifications. All the events share one
+        query for followers and one bulk insert."""
+        events = list(events)
+        if not events:
+            return []
+
+        followers = Case.followers.through.objects.filter(
+            case__in={case.id for case, _ in events},
+            user__staff_web_notifications=True,
+        )
+        if triggered_by:
+            followers = followers.exclude(user=triggered_by)
+        followers_by_case = {}
+        for case_id, user_id in followers.values_list("case_id", "user_id"):
+            followers_by_case.setdefault(case_id, []).append(user_id)
+
+        # bulk_create skips AbstractModel.save, so fill in the audit fields
+        user = get_current_user()
+        notifications = [
+            self.model(
+                case=case,
+                message=message,
+                recipient_id=recipient_id,
+                triggered_by=triggered_by,
+                created_by=user,
+                modified_by=user,
+            )
+            for case, message in events
+            for recipient_id in followers_by_case.get(case.id, [])
+        ]
+        with transaction.atomic():
+            notifications = self.bulk_create(notifications)
+            counts = Counter(n.recipient_id for n in notifications)
+            adjust_unread_notifications_counts(counts)
+        realtime.publish(counts)
+        return notifications
+
+
 class Notification(AbstractModel):
     case = models.ForeignKey(
         Case, on_delete=models.CASCADE, related_name="notifications"
@@ -900,3 +1294,73 @@ class Notification(AbstractModel):
     time = models.DateTimeField(default=timezone.now)
     message = models.TextField()
     read = models.BooleanField(default=False)
+
+    objects = NotificationManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["recipient", "read", "time"],
+                name="cases_notification_inbox_idx",
+            ),
+        ]
+
+    @property
+    def inbox_cursor(self):
+        """Where this notification sits in the inbox ordering, for the URL."""
+        return f"{int(self.read)}.{time_to_micros(self.time)}.{self.id}"
+
+    @staticmethod
+    def parse_inbox_cursor(cursor):
+        try:
+            read, micros, pk = map(int, cursor.split("."))
+            time = micros_to_time(micros)
+        except (AttributeError, ValueError, OverflowError):
+            return None
+        return bool(read), time, pk
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not {"read", "recipient"} & set(update_fields):
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Whatever this notification counted towards before, which may
+            # be for another recipient, or nothing if it was read or is new
+            before = Counter()
+            if not self._state.adding:
+                rows = Notification.objects.filter(pk=self.pk).lock("recipient", "read")
+                before.update(recipient for _, recipient, read in rows if not read)
+            super().save(*args, **kwargs)
+            after = Counter() if self.read else Counter([self.recipient_id])
+            added, removed = after - before, before - after
+            adjust_unread_notifications_counts(added)
+            adjust_unread_notifications_counts(removed, -1)
+        realtime.publish(added + removed)
+
+    def delete(self, *args, **kwargs):
+        # Lock the row, rather than trusting read as it was loaded
+        deleted = Notification.objects.filter(pk=self.pk).delete()
+        self.pk = None
+        return deleted
+
+
+class DigestEvent(models.Model):
+    """Something a staff user would have been emailed about straight away,
+    kept to be sent to them in their next digest email instead."""
+
+    recipient = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="digest_events"
+    )
+    case = models.ForeignKey(
+        Case, on_delete=models.CASCADE, related_name="digest_events"
+    )
+    time = models.DateTimeField(default=timezone.now)
+    message = models.TextField()
+    url = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["recipient", "time"], name="cases_digestevent_recip_idx"
+            ),
+        ]
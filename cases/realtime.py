@@ -0,0 +1,207 @@
+"""Real-time delivery of staff notifications.
+
+Whenever notifications are created, read or deleted, the affected recipients'
+ids are sent on a PostgreSQL NOTIFY channel once the transaction commits.
+Each ASGI process holds one LISTEN connection, on its event loop, shared by
+all of its open event streams, and wakes only the streams belonging to those
+recipients, which then fetch what has changed for their user.
+
+Under WSGI, a long-lived stream would hold a worker for its whole life, and
+deliver nothing until it ended, so there the view answers at once with what
+has changed (see poll()) and tells the browser when to ask again.
+"""
+
+import asyncio
+import json
+import logging
+
+import psycopg2
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "noiseworks_notifications"
+RECONNECT_DELAY = 5
+
+
+def publish(recipient_ids):
+    """Tell listening processes that these users' notifications have changed,
+    once the current transaction (if any) has committed."""
+    ids = sorted(set(recipient_ids))
+    if not ids:
+        return
+
+    def send():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, json.dumps(ids)])
+
+    transaction.on_commit(send)
+
+
+class Listener:
+    """A per-process LISTEN connection, fanning out to subscribed streams."""
+
+    def __init__(self):
+        self.subscribers = {}
+        self.conn = None
+        self.connecting = None
+        self.loop = None
+
+    async def subscribe(self, user_id):
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            # An ASGI server runs one loop for the life of the process, so
+            # this only happens on first use, but anything waiting on an
+            # earlier loop can never be woken from this one
+            self.close()
+            self.subscribers = {}
+            self.connecting = None
+            self.loop = loop
+        event = asyncio.Event()
+        self.subscribers.setdefault(user_id, set()).add(event)
+        await self.connect()
+        return event
+
+    def unsubscribe(self, user_id, event):
+        events = self.subscribers.get(user_id, set())
+        events.discard(event)
+        if not events:
+            self.subscribers.pop(user_id, None)
+        if not self.subscribers:
+            self.close()
+
+    async def connect(self):
+        if self.conn:
+            return
+        if not self.connecting:
+            self.connecting = asyncio.ensure_future(self._connect())
+        try:
+            await asyncio.shield(self.connecting)
+        finally:
+            self.connecting = None
+
+    async def _connect(self):  # pragma: no cover
+        loop = self.loop
+        params = connections["default"].get_connection_params()
+        conn = await loop.run_in_executor(None, lambda: psycopg2.connect(**params))
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        loop.add_reader(conn.fileno(), self._on_readable)
+        self.conn = conn
+
+    def _on_readable(self):  # pragma: no cover
+        try:
+            self.conn.poll()
+        except psycopg2.Error:
+            logger.exception("Lost notification listener connection")
+            self.close()
+            # Streams re-check on waking, so nothing missed while down is lost
+            self.wake_all()
+            if self.subscribers:
+                self.loop.call_later(
+                    RECONNECT_DELAY, asyncio.ensure_future, self.connect()
+                )
+            return
+        while self.conn.notifies:
+            self.dispatch(self.conn.notifies.pop(0).payload)
+
+    def dispatch(self, payload):
+        for user_id in json.loads(payload):
+            for event in self.subscribers.get(user_id, ()):
+                event.set()
+
+    def wake_all(self):
+        for events in self.subscribers.values():
+            for event in events:
+                event.set()
+
+    def close(self):
+        if not self.conn:
+            return
+        try:  # pragma: no cover
+            if not self.loop.is_closed():
+                self.loop.remove_reader(self.conn.fileno())
+            self.conn.close()
+        finally:
+            self.conn = None
+
+
+listener = Listener()
+
+
+def changes(user, last_id=None):
+    """Return the user's notifications newer than last_id, their unread
+    count, and the new last id. With no last_id, only the count is wanted
+    and the last id is the user's most recent notification."""
+    data = []
+    if last_id is None:
+        last_id = user.notifications.aggregate(last_id=Max("id"))["last_id"] or 0
+    else:
+        for n in user.notifications.filter(id__gt=last_id).order_by("id"):
+            data.append(
+                {
+                    "id": n.id,
+                    "case": n.case_id,
+                    "message": n.message,
+                    "time": n.time.isoformat(),
+                    "url": reverse("consume-notification", args=[n.id]),
+                }
+            )
+            last_id = n.id
+    user.refresh_from_db(fields=["unread_notifications_count"])
+    return data, user.unread_notifications_count, last_id
+
+
+def event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+def changed(user, last_id=None):
+    """The events for what has changed since last_id, ending with the
+    unread count and the id to carry on from if the browser reconnects."""
+    data, unread, last_id = changes(user, last_id)
+    events = [event("notification", notification) for notification in data]
+    events.append(f"id: {last_id}\n" + event("count", {"unread": unread}))
+    return "".join(events), last_id
+
+
+def last_event_id(request):
+    last_id = request.headers.get("Last-Event-ID", "")
+    return int(last_id) if last_id.isdigit() else None
+
+
+def poll(user, last_id=None):
+    """A single response of what has changed since last_id, asking the
+    browser to reconnect after NOTIFICATIONS_POLL_INTERVAL seconds."""
+    events, _ = changed(user, last_id)
+    return f"retry: {settings.NOTIFICATIONS_POLL_INTERVAL * 1000}\n\n" + events
+
+
+async def stream(user, last_id=None, keepalive=15, lifetime=300):
+    """Yield server-sent events for the user: their unread count on
+    connection (and anything new since last_id), then any new notifications
+    and the updated count whenever they change. The stream ends after
+    lifetime seconds, and the browser reconnects, so that abandoned
+    connections do not linger."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + lifetime
+    wake = await listener.subscribe(user.id)
+    try:
+        events, last_id = await sync_to_async(changed)(user, last_id)
+        yield f"retry: {RECONNECT_DELAY * 1000}\n\n" + events
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                await asyncio.wait_for(wake.wait(), min(keepalive, remaining))
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            wake.clear()
+            events, last_id = await sync_to_async(changed)(user, last_id)
+            yield events
+    finally:
+        listener.unsubscribe(user.id, wake)
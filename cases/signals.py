@@ -1,38 +1,64 @@
-from django.db.models.signals import post_save
+from collections import Counter
+
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver, Signal
+from simple_history.signals import pre_create_historical_record
 
 from accounts.models import User
 from noiseworks import cobrand
 from noiseworks.message import send_email
 
-from .models import Action, Case, Complaint, MergeRecord
+from . import realtime
+from .assignment import assignment_reason, choose_assignee
+from .digest import email_staff
+from .models import (
+    Action,
+    ActionFile,
+    Case,
+    Complaint,
+    HistoricalCase,
+    MergeRecord,
+    adjust_open_cases_count,
+    adjust_unread_notifications_counts,
+    history_diff,
+)
 
 new_case_reported = Signal()
 
+# Case fields never shown on a timeline (nor kept in its history)
+TIMELINE_IRRELEVANT_FIELDS = {"modified", "modified_by", "last_update_type"}
+
+# Saves that can change how someone appears among the assignee choices
+ASSIGNEE_CHOICE_FIELDS = {"first_name", "last_name", "is_staff", "is_active", "wards"}
+
 
 @receiver(new_case_reported)
 def auto_assign_new_case(sender, case, case_absolute_url, **kwargs):
     if case.assigned or case.estate == "y" or not case.ward:
         return
-    ward_principal = User.objects.filter(principal_wards__contains=[case.ward]).first()
-
-    if not ward_principal:
+    assignee = choose_assignee(case)
+    if not assignee:
         return
 
-    case.assign(ward_principal, None)
+    case.assign(assignee, None)
     case.save()
 
     wards = cobrand.api.wards()
     ward_gss_to_name = {ward["gss"]: ward["name"] for ward in wards}
     ward_name = ward_gss_to_name.get(case.ward, case.ward)
-    ward_principal.send_email(
+    reason = assignment_reason(ward_name)
+    email_staff(
+        assignee,
+        case,
+        f"You were automatically assigned, {reason}",
         "You have been assigned",
         "cases/email/auto_assigned",
         {
             "case": case,
             "url": case_absolute_url,
-            "user": ward_principal,
+            "user": assignee,
             "ward_name": ward_name,
+            "reason": reason,
         },
     )
 
@@ -51,6 +77,7 @@ def update_case_for_action(sender, instance, **kwargs):
     # Action took place before the case was last
     # modified so don't update it
     if instance.time < instance.case.modified:
+        instance.case.invalidate_timeline()
         return
 
     instance.case.last_update_type = Case.LastUpdateTypes.ACTION
@@ -67,3 +94,62 @@ def update_case_for_merge_record(sender, instance, created, **kwargs):
     # Update the case last modified
     instance.mergee.save()
     instance.merged_into.save()
+
+
+@receiver(post_save, sender=Case)
+def invalidate_case_timeline(sender, instance, update_fields=None, **kwargs):
+    # Everything that changes a timeline saves the case, bar what is below
+    if update_fields and set(update_fields) <= TIMELINE_IRRELEVANT_FIELDS:
+        return
+    instance.invalidate_timeline()
+
+
+@receiver(post_save, sender=Case)
+def update_assignee_choices(sender, instance, **kwargs):
+    if instance.assigned_id:
+        Case.objects.assignee_added(instance.assigned_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def update_assignee_choices_for_user(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not ASSIGNEE_CHOICE_FIELDS & set(update_fields):
+        return
+    Case.objects.assignee_changed(instance.id)
+
+
+@receiver(post_delete, sender=Case)
+def update_open_cases_count_for_deletion(sender, instance, **kwargs):
+    adjust_open_cases_count(instance.workload, -1)
+
+
+@receiver(pre_delete, sender=Case)
+def update_unread_counts_for_case_deletion(sender, instance, **kwargs):
+    # A case's notifications are deleted along with it in one query, without
+    # Notification's own counting, so take the unread ones off here
+    rows = instance.notifications.filter(read=False).lock("recipient")
+    unread = Counter(recipient for _, recipient in rows)
+    adjust_unread_notifications_counts(unread, -1)
+    realtime.publish(unread)
+
+
+@receiver(post_delete, sender=Action)
+@receiver(post_delete, sender=Complaint)
+def invalidate_case_timeline_for_deletion(sender, instance, **kwargs):
+    Case(id=instance.case_id).invalidate_timeline()
+
+
+@receiver(post_save, sender=ActionFile)
+@receiver(post_delete, sender=ActionFile)
+def invalidate_case_timeline_for_file(sender, instance, **kwargs):
+    Case(id=instance.action.case_id).invalidate_timeline()
+
+
+@receiver(pre_create_historical_record, sender=HistoricalCase)
+def store_case_history_diff(sender, instance, history_instance, **kwargs):
+    previous = (
+        sender.objects.filter(id=instance.id)
+        .order_by("-history_date", "-history_id")
+        .first()
+    )
+    history_instance.diff = history_diff(history_instance, previous)
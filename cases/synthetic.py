@@ -0,0 +1,476 @@
+"""Generating a large, plausible set of cases for load testing.
+
+Unlike the add_random_cases command, nothing here looks anything up:
+locations are made-up points scattered around the middle of each ward, and
+addresses are made up too. Everything is built in memory and inserted with bulk_create,
+one batch of cases at a time, along with their complainants, perpetrators,
+complaints, actions, merges, history and notifications. Bulk inserts skip
+save() and signals, so the counts kept on users are brought up to date, and
+the caches signals would have cleared are cleared, by finish().
+"""
+
+import random
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+
+from django.contrib.auth.models import Group
+from django.contrib.gis.geos import Point
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.directory import invalidate_staff_directory
+from accounts.models import User
+from accounts.routing import invalidate_ward_routing
+from noiseworks import cobrand
+
+from .models import (
+    Action,
+    ActionType,
+    Case,
+    Complaint,
+    HistoricalCase,
+    MergeRecord,
+    Notification,
+    adjust_unread_notifications_counts,
+    history_diff,
+)
+
+# The area Hackney covers, in British National Grid metres
+BOUNDS = (531480, 181839, 537642, 188327)
+
+# Roughly the middle of each ward, also in British National Grid metres. The
+# wards are about a kilometre across, so the nearest of these to a point is
+# (near enough) the ward the point is in.
+WARD_CENTRES = {
+    "E05009367": (532070, 186790),  # Brownswood
+    "E05009368": (534150, 186790),  # Cazenove
+    "E05009369": (532710, 186140),  # Clissold
+    "E05009370": (533920, 185050),  # Dalston
+    "E05009371": (533180, 184030),  # De Beauvoir
+    "E05009372": (534900, 184800),  # Hackney Central
+    "E05009373": (534590, 185850),  # Hackney Downs
+    "E05009374": (536780, 184630),  # Hackney Wick
+    "E05009375": (533960, 183550),  # Haggerston
+    "E05009376": (536000, 185170),  # Homerton
+    "E05009377": (533430, 182590),  # Hoxton East & Shoreditch
+    "E05009378": (532720, 183190),  # Hoxton West
+    "E05009379": (536050, 185890),  # King's Park
+    "E05009380": (535200, 186370),  # Lea Bridge
+    "E05009381": (534640, 184020),  # London Fields
+    "E05009382": (533620, 185710),  # Shacklewell
+    "E05009383": (534690, 187470),  # Springfield
+    "E05009384": (533230, 187540),  # Stamford Hill West
+    "E05009385": (533260, 186540),  # Stoke Newington
+    "E05009386": (535750, 183880),  # Victoria
+    "E05009387": (532330, 187520),  # Woodberry Down
+}
+
+FIRST_NAMES = ("Alex", "Sam", "Jo", "Priya", "Tomasz", "Aisha", "Chen", "Maria")
+LAST_NAMES = ("Smith", "Jones", "Patel", "Nowak", "Okafor", "Wong", "Garcia")
+STREETS = ("Mare Street", "Amhurst Road", "Dalston Lane", "Church Street")
+
+KIND_WEIGHTS = {"music": 10, "other": 5, "shouting": 2}
+SPECIAL_ACTION_TYPES = ("Case closed", "Case reopened", "Edit case")
+
+# Fields whose initial value differs from the case's final one, as they are
+# changed by the history steps
+INITIAL_STATE = {
+    "assigned_id": None,
+    "priority": False,
+    "closed": False,
+    "merged_into_id": None,
+}
+
+
+def nearest_ward(x, y):
+    return min(
+        WARD_CENTRES,
+        key=lambda ward: (WARD_CENTRES[ward][0] - x) ** 2
+        + (WARD_CENTRES[ward][1] - y) ** 2,
+    )
+
+
+@contextmanager
+def historic_timestamps(models):
+    """Let created and modified be set by hand, rather than to now."""
+    fields = [
+        (model._meta.get_field("created"), model._meta.get_field("modified"))
+        for model in models
+    ]
+    for created, modified in fields:
+        created.auto_now_add = modified.auto_now = False
+    try:
+        yield
+    finally:
+        for created, modified in fields:
+            created.auto_now_add = modified.auto_now = True
+
+
+class Generator:
+    def __init__(self, number, span=timedelta(days=730), seed=None, now=None):
+        self.random = random.Random(seed)
+        self.now = now or timezone.now()
+        self.start = self.now - span
+        self.interval = span / number
+        self.index = 0
+        self.users = 0
+        self.token = f"{self.random.getrandbits(32):08x}"
+        self.created = Counter()
+        self.open_cases = Counter()
+        self.open_priority_cases = Counter()
+        self.unread = Counter()
+        self.recent_case_ids = deque(maxlen=1000)
+        self.tracked = [f.attname for f in HistoricalCase.tracked_fields]
+
+        self.ward_names = {w["gss"]: w["name"] for w in cobrand.api.wards()}
+        self.wards = list(self.ward_names)
+        self.kinds = [kind for kind, _ in Case.KIND_CHOICES]
+        self.kind_weights = [KIND_WEIGHTS.get(kind, 1) for kind in self.kinds]
+        self.action_types = list(
+            ActionType.objects.exclude(name__in=SPECIAL_ACTION_TYPES)
+        )
+        self.case_closed = ActionType.case_closed
+        self.set_up_staff()
+
+    def set_up_staff(self):
+        """One staff user for each pair of wards, principal for the first."""
+        self.staff_for_ward = {}
+        group = Group.objects.filter(name="case_workers").first()
+        for pair in zip(self.wards[::2], self.wards[1::2] + [None]):
+            pair = [ward for ward in pair if ward]
+            user, _ = User.objects.get_or_create(
+                username=f"synthetic-staff-{pair[0]}",
+                defaults={
+                    "email": f"synthetic-staff-{pair[0]}@example.org",
+                    "email_verified": True,
+                    "first_name": "Staff",
+                    "last_name": " & ".join(self.ward_names[w] for w in pair),
+                    "is_staff": True,
+                    "wards": pair,
+                    "principal_wards": pair[:1],
+                },
+            )
+            if group:
+                group.user_set.add(user)
+            for ward in pair:
+                self.staff_for_ward[ward] = user
+        staff = {user.id: user for user in self.staff_for_ward.values()}
+        self.staff = list(staff.values())
+
+    # Users
+
+    def new_user(self, **kwargs):
+        self.users += 1
+        return User(
+            username=f"synthetic-{self.token}-{self.users}",
+            password="!",
+            first_name=self.random.choice(FIRST_NAMES),
+            last_name=self.random.choice(LAST_NAMES),
+            address=self.address(),
+            uprn=str(10008000000 + self.random.randrange(1000000)),
+            **kwargs,
+        )
+
+    def new_complainant(self):
+        user = self.new_user(email_verified=True, best_method="email")
+        user.email = f"{user.username}@example.org"
+        user.best_time = self.random.sample(["weekday", "weekend", "evening"], 2)
+        return user
+
+    def address(self):
+        return f"{self.random.randint(1, 250)} {self.random.choice(STREETS)}, London"
+
+    # Cases
+
+    def point_in(self, ward):
+        """A point scattered around the middle of ward, but nearer that than
+        any other ward's middle, so it lies in the ward, and within Hackney."""
+        centre_x, centre_y = WARD_CENTRES[ward]
+        while True:
+            x = self.random.gauss(centre_x, 250)
+            y = self.random.gauss(centre_y, 250)
+            if not (BOUNDS[0] <= x <= BOUNDS[2] and BOUNDS[1] <= y <= BOUNDS[3]):
+                continue
+            if nearest_ward(x, y) == ward:
+                return Point(x, y, srid=27700)
+
+    def plan_case(self, complainant):
+        """Build a case and everything that happens to it, in order, as
+        unsaved objects; the caller saves them once the case has an id."""
+        r = self.random
+        created = self.start + self.interval * (self.index + r.random())
+        self.index += 1
+        ward = r.choice(self.wards)
+        point = self.point_in(ward)
+        case = Case(
+            kind=r.choices(self.kinds, self.kind_weights)[0],
+            where="business" if r.randint(1, 6) == 1 else "residence",
+            ward=ward,
+            point=point,
+            created=created,
+            modified=created,
+            created_by=complainant,
+            modified_by=complainant,
+            last_update_type=Case.LastUpdateTypes.COMPLAINT,
+        )
+        if case.kind == "other":
+            case.kind_other = "Other type of noise"
+        if case.where == "residence":
+            case.estate = r.choice("yn?")
+        if r.randint(1, 3) == 1:
+            case.radius = r.choice((30, 180, 800))
+            case.location_cache = (
+                f"{case.radius}m around a point in {self.ward_names[ward]}"
+            )
+        else:
+            case.uprn = str(10008000000 + r.randrange(1000000))
+            case.location_cache = self.address()
+
+        plan = {
+            "case": case,
+            "complaints": [self.complaint(case, complainant, created)],
+            "actions": [],
+            "merge": None,
+            "perpetrator": None,
+            "followers": [],
+            "steps": [(created, complainant, "+", {})],
+            "notifications": [],
+        }
+        if r.randint(1, 5) == 1:
+            plan["perpetrator"] = self.new_user()
+
+        time = created
+        # Most cases are assigned, but not all of the newest
+        time += timedelta(minutes=r.randint(10, 240))
+        if time > self.now or (
+            time > self.now - timedelta(days=2) and r.random() < 0.5
+        ):
+            return plan
+        self.assign(plan, time)
+
+        assignee = case.assigned
+        for _ in range(r.randint(0, 4)):
+            next_time = time + timedelta(hours=r.randint(1, 168))
+            if next_time > self.now:
+                break
+            time = next_time
+            if r.randint(1, 3) == 1 or not self.action_types:
+                plan["complaints"].append(self.complaint(case, complainant, time))
+                case.last_update_type = Case.LastUpdateTypes.COMPLAINT
+                self.notify(plan, time, "Recurrence added.", complainant)
+            else:
+                action_type = r.choice(self.action_types)
+                self.action(plan, time, action_type, assignee)
+                self.notify(plan, time, f"Added '{action_type}'.", assignee)
+
+        if r.random() < 0.02 and self.recent_case_ids:
+            time = min(time + timedelta(hours=r.randint(1, 48)), self.now)
+            case.merged_into_id = r.choice(self.recent_case_ids)
+            case.last_update_type = Case.LastUpdateTypes.MERGE
+            plan["merge"] = MergeRecord(
+                mergee=case,
+                merged_into_id=case.merged_into_id,
+                time=time,
+                created=time,
+                modified=time,
+                created_by=assignee,
+                modified_by=assignee,
+            )
+            plan["steps"].append(
+                (time, assignee, "~", {"merged_into_id": case.merged_into_id})
+            )
+        elif created < self.now - timedelta(days=30) and r.random() < 0.6:
+            time = min(time + timedelta(days=r.randint(1, 30)), self.now)
+            case.closed = True
+            self.action(plan, time, self.case_closed, assignee, "Case closed")
+            self.notify(plan, time, "Closed case.", assignee)
+            plan["steps"].append((time, assignee, "~", {"closed": True}))
+        case.modified = time
+        case.modified_by = assignee
+        return plan
+
+    def assign(self, plan, time):
+        r = self.random
+        case = plan["case"]
+        case.assigned = self.staff_for_ward[case.ward]
+        case.priority = r.randint(1, 10) == 1
+        case.modified = time
+        plan["followers"].append(case.assigned)
+        if r.randint(1, 4) == 1:
+            other = r.choice(self.staff)
+            if other != case.assigned:
+                plan["followers"].append(other)
+        plan["steps"].append(
+            (
+                time,
+                case.assigned,
+                "~",
+                {"assigned_id": case.assigned.id, "priority": case.priority},
+            )
+        )
+        self.notify(plan, time, f"Assigned {case.assigned}.", None)
+
+    def complaint(self, case, complainant, time):
+        happening_now = self.random.randint(1, 10) != 1
+        return Complaint(
+            case=case,
+            complainant=complainant,
+            happening_now=happening_now,
+            start=time - timedelta(minutes=self.random.randint(30, 120)),
+            end=time,
+            rooms="[rooms affected]",
+            description="[description of noise]",
+            effect="[effect of noise]",
+            created=time,
+            modified=time,
+            created_by=complainant,
+            modified_by=complainant,
+        )
+
+    def action(self, plan, time, action_type, user, notes=None):
+        plan["case"].last_update_type = Case.LastUpdateTypes.ACTION
+        plan["actions"].append(
+            Action(
+                case=plan["case"],
+                type=action_type,
+                notes=notes or "Internal notes about this action would be here",
+                time=time,
+                created=time,
+                modified=time,
+                created_by=user,
+                modified_by=user,
+            )
+        )
+
+    def notify(self, plan, time, message, triggered_by):
+        """Notify the case's followers, bar whoever triggered it."""
+        for follower in plan["followers"]:
+            if follower == triggered_by:
+                continue
+            read = time < self.now - timedelta(days=7) or self.random.random() < 0.5
+            plan["notifications"].append(
+                Notification(
+                    case=plan["case"],
+                    recipient=follower,
+                    triggered_by=triggered_by,
+                    message=message,
+                    time=time,
+                    read=read,
+                    created=time,
+                    modified=time,
+                )
+            )
+
+    def history(self, plan):
+        """The case's historical records, from its steps."""
+        case = plan["case"]
+        state = {attname: getattr(case, attname) for attname in self.tracked}
+        state.update(INITIAL_STATE)
+        records = []
+        previous = None
+        for time, user, history_type, changes in plan["steps"]:
+            state.update(changes)
+            record = HistoricalCase(
+                **state,
+                history_date=time,
+                history_type=history_type,
+                history_user=user,
+            )
+            record.diff = history_diff(record, previous)
+            records.append(record)
+            previous = record
+        return records
+
+    # Saving
+
+    def batch(self, number, batch_size=1000, phase=nullcontext):
+        """Generate and insert number cases, with everything belonging to
+        them, in one transaction."""
+        r = self.random
+        with phase("build"):
+            plans = []
+            complainant = None
+            for _ in range(number):
+                if complainant is None or r.randint(1, 4) != 1:
+                    complainant = self.new_complainant()
+                plans.append(self.plan_case(complainant))
+
+        with transaction.atomic(), historic_timestamps(
+            (Case, Complaint, Action, MergeRecord, Notification)
+        ):
+            users = {}
+            for plan in plans:
+                users[id(plan["case"].created_by)] = plan["case"].created_by
+                if plan["perpetrator"]:
+                    users[id(plan["perpetrator"])] = plan["perpetrator"]
+            self.insert("users", User, list(users.values()), batch_size, phase)
+            cases = [plan["case"] for plan in plans]
+            self.insert("cases", Case, cases, batch_size, phase)
+
+            Perpetrator = Case.perpetrators.through
+            Follower = Case.followers.through
+            rows = {
+                "complaints": (Complaint, []),
+                "actions": (Action, []),
+                "merges": (MergeRecord, []),
+                "perpetrators": (Perpetrator, []),
+                "followers": (Follower, []),
+                "history": (HistoricalCase, []),
+                "notifications": (Notification, []),
+            }
+            with phase("build"):
+                for plan in plans:
+                    case = plan["case"]
+                    rows["complaints"][1].extend(plan["complaints"])
+                    rows["actions"][1].extend(plan["actions"])
+                    if plan["merge"]:
+                        rows["merges"][1].append(plan["merge"])
+                    if plan["perpetrator"]:
+                        rows["perpetrators"][1].append(
+                            Perpetrator(case_id=case.id, user=plan["perpetrator"])
+                        )
+                    rows["followers"][1].extend(
+                        Follower(case_id=case.id, user=user)
+                        for user in plan["followers"]
+                    )
+                    rows["history"][1].extend(self.history(plan))
+                    rows["notifications"][1].extend(plan["notifications"])
+            for name, (model, objs) in rows.items():
+                self.insert(name, model, objs, batch_size, phase)
+
+        for plan in plans:
+            case = plan["case"]
+            self.recent_case_ids.append(case.id)
+            if case.assigned_id and not case.closed and not case.merged_into_id:
+                self.open_cases[case.assigned_id] += 1
+                if case.priority:
+                    self.open_priority_cases[case.assigned_id] += 1
+            for notification in plan["notifications"]:
+                if not notification.read:
+                    self.unread[notification.recipient_id] += 1
+
+    def insert(self, name, model, objs, batch_size, phase):
+        with phase(name):
+            model.objects.bulk_create(objs, batch_size=batch_size)
+        self.created[name] += len(objs)
+
+    def finish(self):
+        """Bring the counts kept on users up to date, and clear the caches
+        that editing users would have cleared."""
+        with transaction.atomic():
+            for user_id, n in self.open_cases.items():
+                User.objects.filter(id=user_id).update(
+                    open_cases_count=F("open_cases_count") + n,
+                    open_priority_cases_count=F("open_priority_cases_count")
+                    + self.open_priority_cases[user_id],
+                )
+            adjust_unread_notifications_counts(self.unread)
+        for user in self.staff:
+            Case.objects.assignee_added(user.id)
+        invalidate_ward_routing()
+        invalidate_staff_directory()
+        self.open_cases.clear()
+        self.open_priority_cases.clear()
+        self.unread.clear()
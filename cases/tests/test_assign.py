@@ -2,7 +2,7 @@ import re
 from http import HTTPStatus
 
 import pytest
-from django.contrib.auth.models import Permission
+from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from django.core import mail
 from django.contrib.auth.models import Permission
@@ -132,6 +132,33 @@ def test_reassign_does_not_include_unassignable_staff(
     assertNotContains(response, no_perms_staff_user.username)
 
 
+def test_reassign_staff_list_cached(
+    case_1,
+    staff_user_1,
+    no_perms_staff_user,
+    get_assigned_perm,
+    django_assert_num_queries,
+):
+    ReassignForm(instance=case_1)
+    with django_assert_num_queries(0):
+        form = ReassignForm(instance=case_1)
+    choices = [c.value for c in form.fields["assigned"].choices]
+    assert choices == [staff_user_1.id]
+
+    # Giving the permission, through a group or directly, clears the cache
+    group = Group.objects.create(name="assignable")
+    group.permissions.add(get_assigned_perm)
+    no_perms_staff_user.groups.add(group)
+    form = ReassignForm(instance=case_1)
+    choices = {c.value for c in form.fields["assigned"].choices}
+    assert choices == {staff_user_1.id, no_perms_staff_user.id}
+
+    staff_user_1.first_name = "Renamed"
+    staff_user_1.save()
+    form = ReassignForm(instance=case_1)
+    assert "Renamed" in str(form.fields["assigned"].choices)
+
+
 def test_followers(admin_client, admin_user, case_1, staff_user_2):
     admin_user.wards = [case_1.ward]
     admin_user.save()
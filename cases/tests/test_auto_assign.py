@@ -1,8 +1,16 @@
+import logging
+
 import pytest
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
 from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
 
 from accounts.models import User
+from accounts.routing import ward_routing
 
+from ..assignment import choose_assignee
 from ..models import Case
 from ..signals import new_case_reported
 
@@ -37,3 +45,149 @@ def test_staff_auto_assigned_case_when_ward_principal_and_not_estate(
     sent = mail.outbox[0]
     assert sent.to == [staff_user.email]
     assert sent.subject == "You have been assigned"
+    assert "as you are the principal for Hackney Central." in sent.body
+
+
+def test_no_auto_assign_without_ward_principal(staff_user, ward_gss):
+    staff_user.principal_wards = []
+    staff_user.save()
+    c = Case.objects.create(ward=ward_gss, estate="n")
+    new_case_reported.send(sender=None, case=c, case_absolute_url="some_absolute_url")
+    c.refresh_from_db()
+    assert c.assigned is None
+    assert len(mail.outbox) == 0
+
+
+def test_ward_routing_cached_until_staff_edited(
+    staff_user, ward_gss, django_assert_num_queries
+):
+    assert ward_routing()["principal"] == {ward_gss: staff_user.id}
+    with django_assert_num_queries(0):
+        assert ward_routing()["staff"] == {ward_gss: [staff_user.id]}
+
+    other = User.objects.create(
+        is_staff=True, username="staffuser2", wards=["E05009367"]
+    )
+    assert ward_routing()["staff"] == {
+        ward_gss: [staff_user.id],
+        "E05009367": [other.id],
+    }
+
+    staff_user.principal_wards = []
+    staff_user.save()
+    assert ward_routing()["principal"] == {}
+
+
+def test_ward_routing_not_cleared_by_logins(staff_user, ward_gss):
+    ward_routing()
+    staff_user.principal_wards = []
+    User.objects.filter(id=staff_user.id).update(principal_wards=[])
+    staff_user.save(update_fields=["last_login"])
+    assert ward_routing()["principal"] == {ward_gss: staff_user.id}
+
+
+@pytest.fixture
+def ward_staff(db, ward_gss):
+    perm = Permission.objects.get(
+        codename="get_assigned", content_type=ContentType.objects.get_for_model(Case)
+    )
+    users = []
+    for n in range(3):
+        u = User.objects.create(
+            is_staff=True,
+            username=f"wardstaff{n}",
+            email=f"wardstaff{n}@example.org",
+            wards=[ward_gss],
+        )
+        u.user_permissions.add(perm)
+        users.append(u)
+    return users
+
+
+def report(ward_gss):
+    c = Case.objects.create(ward=ward_gss, estate="n")
+    new_case_reported.send(sender=None, case=c, case_absolute_url="some_absolute_url")
+    c.refresh_from_db()
+    return c
+
+
+def test_round_robin_strategy(settings, ward_staff, ward_gss):
+    settings.AUTO_ASSIGN_STRATEGY = "round_robin"
+    assigned = [report(ward_gss).assigned for _ in range(4)]
+    assert assigned == ward_staff + ward_staff[:1]
+
+
+def test_round_robin_strategy_shared_between_processes(settings, ward_staff, ward_gss):
+    settings.AUTO_ASSIGN_STRATEGY = "round_robin"
+    assert report(ward_gss).assigned == ward_staff[0]
+    # As if the next case were reported to another process, with its own cache
+    cache.clear()
+    assert report(ward_gss).assigned == ward_staff[1]
+    Case.objects.create(ward=ward_gss, assigned=ward_staff[0])
+    assert report(ward_gss).assigned == ward_staff[1]
+
+
+def test_least_open_strategy(settings, ward_staff, ward_gss, caplog):
+    settings.AUTO_ASSIGN_STRATEGY = "least_open"
+    Case.objects.create(ward=ward_gss, assigned=ward_staff[0])
+    Case.objects.create(ward=ward_gss, assigned=ward_staff[2])
+    with caplog.at_level(logging.INFO, logger="noiseworks"):
+        assert report(ward_gss).assigned == ward_staff[1]
+    assert "by least_open strategy" in caplog.text
+    assert (
+        "as you have the fewest open cases among the staff for Hackney Central."
+        in mail.outbox[0].body
+    )
+    assert report(ward_gss).assigned == ward_staff[0]
+
+
+def test_weighted_priority_strategy(settings, ward_staff, ward_gss):
+    settings.AUTO_ASSIGN_STRATEGY = "weighted_priority"
+    settings.AUTO_ASSIGN_PRIORITY_WEIGHT = 3
+    Case.objects.create(ward=ward_gss, assigned=ward_staff[0], priority=True)
+    Case.objects.create(ward=ward_gss, assigned=ward_staff[1])
+    Case.objects.create(ward=ward_gss, assigned=ward_staff[1])
+    Case.objects.create(ward=ward_gss, assigned=ward_staff[2])
+    Case.objects.create(ward=ward_gss, assigned=ward_staff[2])
+    Case.objects.create(ward=ward_gss, assigned=ward_staff[2])
+    assert report(ward_gss).assigned == ward_staff[1]
+
+
+def test_unknown_strategy(settings, ward_gss):
+    settings.AUTO_ASSIGN_STRATEGY = "dice"
+    with pytest.raises(ImproperlyConfigured):
+        choose_assignee(Case(ward=ward_gss))
+
+
+def test_open_cases_count_kept_in_step(ward_staff, ward_gss):
+    a, b, _ = ward_staff
+    c = Case.objects.create(ward=ward_gss, assigned=a, priority=True)
+    a.refresh_from_db()
+    assert (a.open_cases_count, a.open_priority_cases_count) == (1, 1)
+
+    c.priority = False
+    c.save()
+    a.refresh_from_db()
+    assert (a.open_cases_count, a.open_priority_cases_count) == (1, 0)
+
+    c = Case.objects.get(id=c.id)
+    c.assigned = b
+    c.save()
+    a.refresh_from_db()
+    b.refresh_from_db()
+    assert (a.open_cases_count, b.open_cases_count) == (0, 1)
+
+    c = Case.objects.only("id").get(id=c.id)
+    c.closed = True
+    c.save()
+    b.refresh_from_db()
+    assert b.open_cases_count == 0
+
+    c.closed = False
+    c.save()
+    b.refresh_from_db()
+    assert b.open_cases_count == 1
+
+    c.delete()
+    b.refresh_from_db()
+    assert b.open_cases_count == 0
@@ -1,5 +1,9 @@
+import gzip
+import json
+import os
 import re
 import tempfile
+import time
 from unittest.mock import mock_open
 
 import pytest
@@ -10,6 +14,7 @@ from django.core.management import CommandError, call_command
 
 
 from cases.management.commands.export_data import client
+from cases.synthetic import nearest_ward
 
 from ..models import Action, ActionFile, Case, Notification, User
 from .conftest import ADDRESS
@@ -111,12 +116,47 @@ def test_random_command_commit(mock_things, db, call_params):
     call_command("add_random_cases", number=71, commit=True, **call_params)
 
 
+def test_synthetic_command_bad_input(db):
+    with pytest.raises(CommandError):
+        call_command("generate_synthetic_data")
+    with pytest.raises(CommandError) as excinfo:
+        call_command("generate_synthetic_data", number=10)
+    assert "Please load the action types first" in str(excinfo.value)
+
+
+def test_synthetic_command(db):
+    call_command("loaddata", "action_types_hackney")
+    call_command("generate_synthetic_data", number=30, batch_size=10, seed=1)
+    assert Case.objects.count() == 30
+    assert Case.history.filter(history_type="+").count() == 30
+    for case in Case.objects.all():
+        assert nearest_ward(case.point.x, case.point.y) == case.ward
+    for user in User.objects.filter(is_staff=True):
+        assert (
+            user.open_cases_count
+            == user.assignations.filter(closed=False, merged_into=None).count()
+        )
+        assert (
+            user.unread_notifications_count
+            == user.notifications.filter(read=False).count()
+        )
+
+
 def test_export_data_file_command(case, db, tmpdir):
     with pytest.raises(CommandError):
         call_command("export_data")
     call_command("export_data", dir=tmpdir, verbosity=3)
 
 
+def test_export_data_command_stats(case, db, tmpdir, capsys):
+    profile = tmpdir / "export.prof"
+    call_command("export_data", dir=tmpdir, stats=True, profile=str(profile))
+    assert profile.exists()
+    err = capsys.readouterr().err
+    assert re.search(r"^export_data: [\d.]+s, \d+ rows .* peak RSS", err, re.M)
+    assert re.search(r"^  Case: [\d.]+s, 1 rows .*, 1 queries", err, re.M)
+
+
 def test_export_data_s3_command(case, db, s3_stub):
     for i in range(6):
         s3_stub.add_response(
@@ -160,12 +200,19 @@ def test_delete_local_orphaned_files_command_bad_input():
     assert "Please specify a path" == str(excinfo.value)
 
 
+def make_old(storage, name):
+    old = time.time() - 7 * 24 * 60 * 60
+    os.utime(storage.path(name), (old, old))
+
+
 def test_delete_local_orphaned_files_command(
     use_temp_dir_media_root, action_file_without_file, temp_dir_path
 ):
     storage = FileSystemStorage(location=temp_dir_path)
     storage.save("orphan.txt", ContentFile("content"))
+    make_old(storage, "orphan.txt")
     action_file_without_file.file.save("not_orphan.txt", ContentFile("content"))
+    make_old(storage, "not_orphan.txt")
 
     assert storage.exists("orphan.txt")
     assert storage.exists("not_orphan.txt")
@@ -176,6 +223,33 @@ def test_delete_local_orphaned_files_command(
     assert storage.exists("not_orphan.txt")
 
 
+def test_delete_local_orphaned_files_command_options(
+    use_temp_dir_media_root, temp_dir_path, capsys
+):
+    storage = FileSystemStorage(location=temp_dir_path)
+    for name in ("a/old1.txt", "a/b/old2.txt", "old3.txt", "new.txt"):
+        storage.save(name, ContentFile("content"))
+        if name != "new.txt":
+            make_old(storage, name)
+
+    call_command("delete_local_orphaned_files", path=temp_dir_path, dry_run=True)
+    output = capsys.readouterr().out
+    assert "Orphaned file a/b/old2.txt" in output
+    assert "new.txt" not in output
+    assert "Found 3 orphaned files" in output
+    assert storage.exists("a/b/old2.txt")
+
+    call_command(
+        "delete_local_orphaned_files", path=temp_dir_path, limit=2, verbosity=2
+    )
+    assert "Deleted 2 orphaned files" in capsys.readouterr().out
+    call_command("delete_local_orphaned_files", path=temp_dir_path, chunk_size=1)
+    assert capsys.readouterr().out == ""
+    for name in ("a/old1.txt", "a/b/old2.txt", "old3.txt"):
+        assert not storage.exists(name)
+    assert storage.exists("new.txt")
+
+
 def test_delete_old_notifications_command_bad_input(case):
     with pytest.raises(CommandError) as excinfo:
         call_command("delete_old_notifications")
@@ -198,3 +272,58 @@ def test_delete_old_notifications_command(case, staff_user):
     all_ = Notification.objects.all()
     assert recent in all_
     assert old not in all_
+    staff_user.refresh_from_db()
+    assert staff_user.unread_notifications_count == 1
+
+
+def test_delete_old_notifications_command_batches_and_archives(
+    case, staff_user, tmpdir
+):
+    for i in range(5):
+        Notification.objects.create(
+            case=case,
+            recipient=staff_user,
+            message=f"old {i}",
+            time="2021-01-01T12:00:00Z",
+        )
+    recent = Notification.objects.create(
+        case=case, recipient=staff_user, message="recent"
+    )
+    archive = tmpdir / "notifications.jsonl.gz"
+    call_command(
+        "delete_old_notifications",
+        days=28,
+        batch_size=2,
+        sleep=0,
+        archive=str(archive),
+        verbosity=2,
+    )
+    assert list(Notification.objects.all()) == [recent]
+    with gzip.open(archive, "rt") as fp:
+        rows = [json.loads(line) for line in fp]
+    assert [row["message"] for row in rows] == [f"old {i}" for i in range(5)]
+
+
+def test_delete_old_notifications_command_bad_batch_size(case):
+    with pytest.raises(CommandError) as excinfo:
+        call_command("delete_old_notifications", days=28, batch_size=0)
+    assert "Please specify a positive batch size" == str(excinfo.value)
+
+
+def test_backfill_case_history_diffs(case, capsys):
+    case.kind = "music"
+    case.save()
+    case.history.update(diff=None)
+    call_command("backfill_case_history_diffs", batch_size=1)
+    first, second = case.history.order_by("history_date", "history_id")
+    assert first.diff == []
+    assert second.diff == [{"field": "kind", "old": "diy", "new": "music"}]
+    assert "Stored changes for 2 historical records" in capsys.readouterr().out
+
+    call_command("backfill_case_history_diffs")
+    assert "Stored changes for 0 historical records" in capsys.readouterr().out
+    call_command("backfill_case_history_diffs", all=True)
+    assert "Stored changes for 2 historical records" in capsys.readouterr().out
+
+    with pytest.raises(CommandError):
+        call_command("backfill_case_history_diffs", batch_size=0)
@@ -0,0 +1,111 @@
+import pytest
+from django.core import mail
+from django.core.management import call_command
+
+from accounts.models import User
+
+from ..digest import email_destination, email_staff, send_digests
+from ..models import Case, DigestEvent
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def hourly_user(db):
+    return User.objects.create(
+        is_staff=True,
+        username="hourly",
+        email="hourly@example.org",
+        first_name="Hourly",
+        staff_email_digest="hourly",
+    )
+
+
+@pytest.fixture
+def daily_user(db):
+    return User.objects.create(
+        is_staff=True,
+        username="daily",
+        email="daily@example.org",
+        staff_email_digest="daily",
+    )
+
+
+@pytest.fixture
+def case_1(db):
+    return Case.objects.create(kind="diy", ward="E05009373")
+
+
+@pytest.fixture
+def case_2(db):
+    return Case.objects.create(kind="music", ward="E05009373")
+
+
+def assign(user, case):
+    email_staff(
+        user,
+        case,
+        "You were assigned",
+        "You have been assigned",
+        "cases/email/assigned",
+        {"case": case, "url": f"http://x/cases/{case.id}", "user": user},
+    )
+
+
+def test_immediate_by_default(staff_user_1, case_1):
+    staff_user_1.email = "staff@example.org"
+    assign(staff_user_1, case_1)
+    assert len(mail.outbox) == 1
+    assert not DigestEvent.objects.exists()
+
+
+def test_digest_grouped_by_recipient_and_case(
+    hourly_user, daily_user, case_1, case_2, django_assert_num_queries
+):
+    assign(hourly_user, case_1)
+    assign(hourly_user, case_2)
+    assign(hourly_user, case_1)
+    assign(daily_user, case_1)
+    assert len(mail.outbox) == 0
+    assert DigestEvent.objects.count() == 4
+
+    with django_assert_num_queries(4):  # savepoint, events, delete, release
+        assert send_digests("hourly") == 1
+    assert len(mail.outbox) == 1
+    digest = mail.outbox[0]
+    assert digest.to == ["hourly@example.org"]
+    assert digest.body.count("You were assigned") == 3
+    assert digest.body.count(f"Case #{case_1.id}") == 1
+    assert digest.body.count(f"Case #{case_2.id}") == 1
+    assert list(DigestEvent.objects.values_list("recipient", flat=True)) == [
+        daily_user.id
+    ]
+
+    assert send_digests("hourly") == 0
+    call_command("send_email_digests", "daily")
+    assert len(mail.outbox) == 2
+    assert not DigestEvent.objects.exists()
+
+
+def test_waiting_events_sent_after_switching_back(hourly_user, case_1):
+    assign(hourly_user, case_1)
+    hourly_user.staff_email_digest = ""
+    hourly_user.save()
+    assert send_digests("daily") == 1
+    assert len(mail.outbox) == 1
+
+
+def test_destination_addresses_of_digest_users(hourly_user, case_1):
+    email_destination(
+        ["team@example.org", "Hourly@example.org"],
+        case_1,
+        "Reported",
+        "Noise report",
+        "cases/email/assigned",
+        {"case": case_1, "url": "http://x/"},
+    )
+    assert len(mail.outbox) == 1
+    assert mail.outbox[0].to == ["team@example.org"]
+    event = DigestEvent.objects.get()
+    assert event.recipient == hourly_user
+    assert event.message == "Reported"
@@ -1,13 +1,14 @@
 import pytest
 from datetime import timedelta
 from django.contrib.gis.geos import Point
+from django.core.cache import cache
 from functools import partial
 from http import HTTPStatus
 from pytest_django.asserts import assertContains, assertNotContains
 
 from accounts.models import User
 
-from ..models import Action, ActionType, Case, Complaint
+from ..models import ASSIGNEE_CHOICES_CACHE_KEY, Action, ActionType, Case, Complaint
 
 pytestmark = pytest.mark.django_db
 
@@ -113,6 +114,31 @@ def test_assigned_filter_not_assigned_anything(
     assertNotContains(response, f"/cases/{case_1.id}")
 
 
+def test_assignee_choices_cached(staff_user, normal_user, case_1):
+    staff_user.first_name = "Staff"
+    staff_user.save()
+    assert Case.objects.assignee_choices() == [(staff_user.id, "Staff ")]
+
+    # Assigning someone already listed keeps the cache
+    Case.objects.create(assigned=staff_user, created_by=normal_user)
+    assert cache.get(ASSIGNEE_CHOICES_CACHE_KEY)
+
+    # Assigning someone new, or editing someone listed, clears it
+    case_1.assigned = normal_user
+    case_1.save()
+    assert Case.objects.assignee_choices() == [
+        (normal_user.id, "Normal User"),
+        (staff_user.id, "Staff "),
+    ]
+    staff_user.last_name = "Member"
+    staff_user.save()
+    assert (staff_user.id, "Staff Member") in Case.objects.assignee_choices()
+
+    # Signing in does not
+    staff_user.save(update_fields=["last_login"])
+    assert cache.get(ASSIGNEE_CHOICES_CACHE_KEY)
+
+
 def test_ward_filter(admin_client, admin_user, case_1):
     admin_user.wards = ["E05009374"]
     admin_user.save()
@@ -1,5 +1,6 @@
 from http import HTTPStatus
 import tempfile
+from unittest.mock import PropertyMock, patch
 
 import pytest
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -204,3 +205,28 @@ def test_cant_log_files_bigger_than_remaining_space(admin_client, case_1, action
     _attempt_file_upload_and_check(
         file_size * 4, [_file("just right single post delete")], True
     )
+
+
+def test_timeline_files_use_stored_metadata(
+    admin_client, logged_action_1, staff_user_1
+):
+    for name in ("one.txt", "two.txt"):
+        ActionFile.objects.create(
+            action=logged_action_1,
+            created_by=staff_user_1,
+            original_name=name,
+            file=SimpleUploadedFile(name, b"12345", content_type="text/plain"),
+        )
+    case = logged_action_1.case
+    assert case.file_storage_used_bytes == 10
+
+    size = PropertyMock()
+    with patch("django.db.models.fields.files.FieldFile.size", size):
+        response = admin_client.get(f"/cases/{case.id}")
+        timeline, _ = case.timeline_staff_with_operation_flags(staff_user_1)
+        urls = [f["file"].get_absolute_url() for f in timeline[0]["files"]]
+    assert not size.called
+    assertContains(response, "one.txt (5 Bytes)")
+    assertContains(response, "two.txt (5 Bytes)")
+    assert [f["can_delete"] for f in timeline[0]["files"]] == [True, True]
+    assert urls[0].startswith(f"/cases/{case.id}/actions/{logged_action_1.id}/files/")
@@ -1,10 +1,15 @@
+import asyncio
 import pytest
 from http import HTTPStatus
 
 from accounts.models import User
 from django.contrib.auth.models import Permission
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from pytest_django.asserts import assertContains
 
+from .. import realtime
 from ..models import ActionType, Case, Notification
 
 pytestmark = pytest.mark.django_db
@@ -88,6 +93,8 @@ def test_delete_notifications(staff_user, case, db, client):
     for n in notifications:
         with pytest.raises(Notification.DoesNotExist):
             Notification.objects.get(pk=n.id)
+    staff_user.refresh_from_db()
+    assert staff_user.unread_notifications_count == 0
 
 
 def test_mark_notification_as_read(staff_user, case, db, client):
@@ -108,6 +115,8 @@ def test_mark_notification_as_read(staff_user, case, db, client):
     for n in notifications:
         n.refresh_from_db()
         assert n.read
+    staff_user.refresh_from_db()
+    assert staff_user.unread_notifications_count == 0
 
 
 def test_consume_notification(staff_user, staff_user_2, case, db, client):
@@ -125,6 +134,8 @@ def test_consume_notification(staff_user, staff_user_2, case, db, client):
     assert response["Location"] == case.get_absolute_url()
     notification.refresh_from_db()
     assert notification.read
+    staff_user.refresh_from_db()
+    assert staff_user.unread_notifications_count == 0
 
 
 def test_notification_list(staff_user, case, db, client):
@@ -151,6 +162,26 @@ def test_notify_case_followers(case, staff_user, staff_user_2):
     assert len(staff_user_2.notifications.all()) == 1
 
 
+def test_notify_followers_of_several_events(
+    case, case_2, staff_user, staff_user_2, django_assert_num_queries
+):
+    staff_user_2.staff_web_notifications = False
+    staff_user_2.save()
+    case.followers.set([staff_user, staff_user_2])
+    case_2.followers.set([staff_user])
+    with django_assert_num_queries(2):
+        notifications = Notification.objects.notify_followers(
+            [(case, "one"), (case_2, "two")]
+        )
+    assert len(notifications) == 2
+    assert {(n.case_id, n.message) for n in staff_user.notifications.all()} == {
+        (case.id, "one"),
+        (case_2.id, "two"),
+    }
+    assert staff_user_2.notifications.count() == 0
+    assert Notification.objects.notify_followers([]) == []
+
+
 def test_logged_action_notifications(
     case, staff_user, staff_user_2, action_type, client
 ):
@@ -539,3 +570,245 @@ def test_case_recurrence_notifications(
         case=case,
     )
     assert len(matching) == 1
+
+
+def test_notifications_stream_requires_follow_permission(normal_user, client):
+    client.force_login(normal_user)
+    response = client.get("/cases/notifications/stream")
+    assert response.status_code == HTTPStatus.FORBIDDEN
+
+
+def test_notifications_publish_on_commit(
+    case, staff_user, staff_user_2, django_capture_on_commit_callbacks
+):
+    case.followers.set([staff_user, staff_user_2])
+    with CaptureQueriesContext(connection) as queries:
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            case.notify_followers("test", triggered_by=staff_user)
+            assert not any("pg_notify" in q["sql"] for q in queries)
+    assert len(callbacks) == 1
+    assert "pg_notify" in queries[-1]["sql"]
+    assert f"[{staff_user_2.id}]" in queries[-1]["sql"]
+
+
+def test_notifications_listener_dispatch():
+    listener = realtime.Listener()
+    mine, theirs = asyncio.Event(), asyncio.Event()
+    listener.subscribers = {1: {mine}, 2: {theirs}}
+    listener.dispatch("[1, 3]")
+    assert mine.is_set()
+    assert not theirs.is_set()
+    listener.unsubscribe(1, mine)
+    listener.unsubscribe(2, theirs)
+    assert listener.subscribers == {}
+
+
+def test_notifications_listener_follows_event_loop():
+    listener = realtime.Listener()
+    listener.connect = lambda: asyncio.sleep(0)
+
+    async def subscribe():
+        return await listener.subscribe(1)
+
+    first = asyncio.run(subscribe())
+    first_loop = listener.loop
+    second = asyncio.run(subscribe())
+    assert listener.loop is not first_loop
+    assert listener.subscribers == {1: {second}}
+    assert first is not second
+
+
+def test_notifications_stream_polls_under_wsgi(case, staff_user, client, settings):
+    settings.NOTIFICATIONS_POLL_INTERVAL = 30
+    old = Notification.objects.create(recipient=staff_user, case=case, message="1")
+    client.force_login(staff_user)
+    response = client.get("/cases/notifications/stream")
+    assert response["Content-Type"] == "text/event-stream"
+    content = response.content.decode()
+    assert content.startswith("retry: 30000\n\n")
+    assert f"id: {old.id}\nevent: count" in content
+    assert "event: notification" not in content
+
+    new = Notification.objects.create(recipient=staff_user, case=case, message="2")
+    response = client.get("/cases/notifications/stream", HTTP_LAST_EVENT_ID=str(old.id))
+    content = response.content.decode()
+    assert content.count("event: notification") == 1
+    assert f"id: {new.id}\n" + realtime.event("count", {"unread": 2}) in content
+
+
+def test_notifications_stream_changes(case, staff_user):
+    old = Notification.objects.create(recipient=staff_user, case=case, message="1")
+    data, unread, last_id = realtime.changes(staff_user)
+    assert (data, unread, last_id) == ([], 1, old.id)
+
+    new = Notification.objects.create(recipient=staff_user, case=case, message="2")
+    data, unread, last_id = realtime.changes(staff_user, last_id)
+    assert [n["message"] for n in data] == ["2"]
+    assert data[0]["url"] == f"/cases/notifications/{new.id}"
+    assert (unread, last_id) == (2, new.id)
+    assert realtime.event("count", {"unread": 2}) == (
+        'event: count\ndata: {"unread": 2}\n\n'
+    )
+
+
+def test_unread_notifications_count(
+    case, case_2, staff_user, staff_user_2, client, django_assert_num_queries
+):
+    case.followers.set([staff_user])
+    case_2.followers.set([staff_user])
+    Notification.objects.notify_followers([(case, "1"), (case_2, "2")])
+    read = Notification.objects.create(
+        recipient=staff_user, case=case, message="3", read=True
+    )
+    staff_user.refresh_from_db()
+    assert staff_user.unread_notifications_count == 2
+
+    read.delete()
+    Notification.objects.filter(message="1").delete()
+    staff_user.refresh_from_db()
+    assert staff_user.unread_notifications_count == 1
+
+    # The badge comes from the user row loaded for the request
+    client.force_login(staff_user)
+    response = client.get("/cases/notifications")
+    assertContains(response, 'alt="1 notifications"')
+
+    # Counts never go negative, even if they have drifted
+    User.objects.filter(pk=staff_user.pk).update(unread_notifications_count=0)
+    staff_user.notifications.mark_read()
+    staff_user.refresh_from_db()
+    assert staff_user.unread_notifications_count == 0
+
+
+def test_unread_notifications_count_instance_changes(case, staff_user, staff_user_2):
+    notification = Notification.objects.create(
+        recipient=staff_user, case=case, message="1"
+    )
+    stale = Notification.objects.get(pk=notification.pk)
+    notification.read = True
+    notification.save()
+    staff_user.refresh_from_db()
+    assert staff_user.unread_notifications_count == 0
+
+    notification.read = False
+    notification.recipient = staff_user_2
+    notification.save()
+    staff_user.refresh_from_db()
+    staff_user_2.refresh_from_db()
+    assert staff_user.unread_notifications_count == 0
+    assert staff_user_2.unread_notifications_count == 1
+
+    notification.message = "changed"
+    notification.save(update_fields=["message"])
+    staff_user_2.refresh_from_db()
+    assert staff_user_2.unread_notifications_count == 1
+
+    # Marked read elsewhere, so deleting a copy loaded as unread does not count
+    Notification.objects.filter(pk=notification.pk).mark_read()
+    stale.delete()
+    staff_user_2.refresh_from_db()
+    assert staff_user_2.unread_notifications_count == 0
+    assert not Notification.objects.exists()
+
+
+def test_unread_notifications_count_cascades(case, case_2, staff_user, staff_user_2):
+    Notification.objects.create(recipient=staff_user, case=case, message="1")
+    Notification.objects.create(recipient=staff_user, case=case_2, message="2")
+    Notification.objects.create(recipient=staff_user_2, case=case, message="3")
+    Notification.objects.create(recipient=staff_user_2, case=case, message="4")
+
+    case.delete()
+    staff_user.refresh_from_db()
+    staff_user_2.refresh_from_db()
+    assert staff_user.unread_notifications_count == 1
+    assert staff_user_2.unread_notifications_count == 0
+
+    Notification.objects.create(recipient=staff_user_2, case=case_2, message="5")
+    staff_user_2.delete()
+    staff_user.refresh_from_db()
+    assert staff_user.unread_notifications_count == 1
+    assert Notification.objects.count() == 1
+
+
+def test_case_deletion_counts_notifications_together(case, staff_user):
+    for i in range(5):
+        Notification.objects.create(recipient=staff_user, case=case, message=f"{i}")
+    with CaptureQueriesContext(connection) as queries:
+        case.delete()
+    notification_queries = [
+        q["sql"] for q in queries if '"cases_notification"' in q["sql"]
+    ]
+    # One locking SELECT of the unread notifications and one DELETE
+    assert len(notification_queries) == 2
+    staff_user.refresh_from_db()
+    assert staff_user.unread_notifications_count == 0
+
+
+def test_recount_unread_notifications_command(case, staff_user, capsys):
+    Notification.objects.create(recipient=staff_user, case=case, message="1")
+    User.objects.filter(pk=staff_user.pk).update(unread_notifications_count=5)
+
+    call_command("recount_unread_notifications")
+    staff_user.refresh_from_db()
+    assert staff_user.unread_notifications_count == 5
+    output = capsys.readouterr().out
+    assert f"User {staff_user.id} has 1 unread notifications, not 5" in output
+
+    call_command("recount_unread_notifications", commit=True, verbosity=0)
+    staff_user.refresh_from_db()
+    assert staff_user.unread_notifications_count == 1
+
+
+def test_notification_list_pages_and_filters(
+    staff_user, case, case_2, client, django_assert_max_num_queries
+):
+    for i in range(60):
+        Notification.objects.create(
+            recipient=staff_user, case=case if i % 2 else case_2, message=f"n{i}"
+        )
+    Notification.objects.filter(message="n59").update(read=True)
+
+    client.force_login(staff_user)
+    with django_assert_max_num_queries(8):
+        response = client.get("/cases/notifications")
+    page = response.context["notifications"]
+    assert len(page) == 50
+    assert page[0].message == "n58"
+    cursor = response.context["next_cursor"]
+    assert cursor == page[-1].inbox_cursor
+
+    response = client.get(f"/cases/notifications?after={cursor}")
+    page = response.context["notifications"]
+    assert [n.message for n in page[-2:]] == ["n0", "n59"]
+    assert len(page) == 10
+    assert response.context["next_cursor"] is None
+
+    response = client.get(f"/cases/notifications?case={case.id}&unread=1")
+    page = response.context["notifications"]
+    assert len(page) == 29
+    assert all(n.case_id == case.id and not n.read for n in page)
+
+    response = client.get("/cases/notifications?after=nonsense")
+    assert len(response.context["notifications"]) == 50
+
+
+def test_notification_bulk_operations(staff_user, staff_user_2, case, case_2, client):
+    mine = Notification.objects.create(recipient=staff_user, case=case, message="1")
+    Notification.objects.create(recipient=staff_user, case=case_2, message="2")
+    theirs = Notification.objects.create(
+        recipient=staff_user_2, case=case, message="3"
+    )
+
+    client.force_login(staff_user)
+    client.post("/cases/notifications/read-all", {"case": case.id})
+    assert list(staff_user.notifications.filter(read=True)) == [mine]
+    staff_user.refresh_from_db()
+    assert staff_user.unread_notifications_count == 1
+
+    client.post("/cases/notifications/read-all")
+    client.post("/cases/notifications/delete-read")
+    assert staff_user.notifications.count() == 0
+    theirs.refresh_from_db()
+    assert not theirs.read
+    staff_user.refresh_from_db()
+    assert staff_user.unread_notifications_count == 0
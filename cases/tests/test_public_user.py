@@ -96,6 +96,45 @@ def test_case_list_user_view(client, complaint, edited_case, non_staff_access):
     assertNotContains(response, "Staff edited location")
 
 
+def test_case_list_user_view_queries_and_pages(
+    client, normal_user, non_staff_access, django_assert_max_num_queries
+):
+    for i in range(25):
+        case = Case.objects.create(kind="diy", location_cache=f"Location {i}")
+        case.location_cache = "Staff edited location"
+        case.save()
+        for _ in range(2 if i == 24 else 1):
+            Complaint.objects.create(
+                case=case, complainant=normal_user, happening_now=True
+            )
+    client.force_login(normal_user)
+    with django_assert_max_num_queries(6):
+        response = client.get("/cases")
+    assert len(response.context["cases"]) == 20
+    assertContains(response, "Location 24")
+    assertContains(response, "1 reoccurrence")
+    assertNotContains(response, "Staff edited location")
+
+    response = client.get("/cases?page=2")
+    assert len(response.context["cases"]) == 5
+    assertContains(response, "Location 0")
+
+
+def test_case_list_user_view_case_without_history(
+    client, normal_user, non_staff_access
+):
+    (case,) = Case.objects.bulk_create(
+        [Case(kind="diy", location_cache="Bulk created location")]
+    )
+    Complaint.objects.bulk_create(
+        [Complaint(case=case, complainant=normal_user, happening_now=True)]
+    )
+    assert not case.history.exists()
+    client.force_login(normal_user)
+    response = client.get("/cases")
+    assertContains(response, "Bulk created location")
+
+
 def test_case_detail_user_view(client, complaint, action_types, non_staff_access):
     client.force_login(complaint.complainant)
     response = client.get(f"/cases/{complaint.case.id}")
@@ -9,7 +9,12 @@ from django.http import HttpRequest
 from django.template import Context, Template
 from django.urls import reverse
 from django.utils.timezone import make_aware, now
-from pytest_django.asserts import assertContains, assertNotContains
+from pytest_django.asserts import (
+    assertContains,
+    assertNotContains,
+    assertTemplateNotUsed,
+    assertTemplateUsed,
+)
 
 from .conftest import add_time_to_log_payload
 from ..forms import LogActionForm
@@ -19,6 +24,7 @@ from ..models import (
     Case,
     CaseSettingsSingleton,
     Complaint,
+    micros_to_time,
 )
 from ..views import compile_dates
 
@@ -381,6 +387,130 @@ def test_case_manager_get_merged_cases(case_1, case_other_uprn):
     Case.objects.prefetch_timeline([case_1])
 
 
+def test_case_history_stores_diffs(case_1, staff_user_1, staff_user_2):
+    case_1.kind = "music"
+    case_1.assigned = staff_user_2
+    case_1.save()
+    first, second = case_1.history.order_by("history_date", "history_id")
+    assert first.diff == []
+    assert second.diff == [
+        {"field": "assigned", "old": staff_user_1.id, "new": staff_user_2.id},
+        {"field": "kind", "old": "diy", "new": "music"},
+    ]
+
+    # The timeline uses the stored diffs rather than comparing records
+    with patch("simple_history.models.HistoricalChanges.diff_against") as diff:
+        timeline = case_1.timeline_staff
+    assert not diff.called
+    edits = [t["action"] for t in timeline if isinstance(t.get("action"), dict)]
+    assert sorted(e["type"] for e in edits) == ["assigned", "edit"]
+    notes = [e["notes"] for e in edits if e["type"] == "edit"]
+    assert notes == ["<strong>kind</strong> from diy to music"]
+
+
+def test_case_timeline_is_cached_and_invalidated(
+    case_1, case_other_uprn, staff_user_1, staff_user_2, action_types
+):
+    action = Action.objects.create(
+        case=case_1, type=action_types[0], created_by=staff_user_1
+    )
+    case_1 = Case.objects.get(pk=case_1.pk)
+    timeline, _ = case_1.timeline_staff_with_operation_flags(staff_user_1)
+    assert timeline[0]["action"] == action
+    assert timeline[0]["can_edit_action"]
+
+    # A second view is served from the cache, with flags for its viewer
+    case_1 = Case.objects.get(pk=case_1.pk)
+    with patch.object(Case, "timeline_staff_page") as timeline_staff_page:
+        timeline, _ = case_1.timeline_staff_with_operation_flags(staff_user_2)
+    assert not timeline_staff_page.called
+    assert timeline[0]["action"] == action
+    assert not timeline[0]["can_edit_action"]
+
+    # An action in the past doesn't update the case, but still shows
+    past = Action.objects.create(
+        case=case_1, type=action_types[1], time=now() - datetime.timedelta(days=1)
+    )
+    case_1 = Case.objects.get(pk=case_1.pk)
+    timeline, _ = case_1.timeline_staff_with_operation_flags(staff_user_1)
+    assert past in [t.get("action") for t in timeline]
+
+    # Changes to a case merged in clear the cached timeline it appears in
+    case_other_uprn.merge_into(case_1)
+    case_other_uprn.save()
+    case_1.timeline_staff_with_operation_flags(staff_user_1)
+    merged = Action.objects.create(
+        case=case_other_uprn,
+        type=action_types[1],
+        time=now() - datetime.timedelta(days=2),
+    )
+    case_1 = Case.objects.get(pk=case_1.pk)
+    timeline, _ = case_1.timeline_staff_with_operation_flags(staff_user_1)
+    assert merged in [t.get("action") for t in timeline]
+
+    merged.delete()
+    case_1 = Case.objects.get(pk=case_1.pk)
+    timeline, _ = case_1.timeline_staff_with_operation_flags(staff_user_1)
+    assert merged not in [t.get("action") for t in timeline]
+
+    # Saving only what no timeline shows leaves the cache be
+    with patch.object(Case, "invalidate_timeline") as invalidate_timeline:
+        case_1.save(update_fields=["modified", "last_update_type"])
+        case_1.save(update_fields=["kind"])
+    assert invalidate_timeline.call_count == 1
+
+
+def test_case_timeline_pages(admin_client, case_1, action_types, settings):
+    settings.CASE_TIMELINE_PAGE_SIZE = 3
+    time = now() - datetime.timedelta(days=1)
+    actions = [
+        # Two at the same time, which must not be lost between pages
+        Action.objects.create(case=case_1, type=action_types[0], time=time),
+        Action.objects.create(case=case_1, type=action_types[1], time=time),
+    ]
+    for i in range(5):
+        actions.append(
+            Action.objects.create(
+                case=case_1,
+                type=action_types[0],
+                time=time - datetime.timedelta(hours=i + 1),
+            )
+        )
+
+    case_1 = Case.objects.get(pk=case_1.pk)
+    seen = []
+    staff = case_1.assigned
+    timeline, cursor = case_1.timeline_staff_with_operation_flags(staff)
+    while True:
+        seen.extend(row.get("action") for row in timeline)
+        if not cursor:
+            break
+        timeline, cursor = case_1.timeline_staff_with_operation_flags(
+            staff, micros_to_time(cursor["before"]), cursor["skip"]
+        )
+    assert [a for a in seen if a in actions] == sorted(
+        actions, key=lambda a: a.time, reverse=True
+    )
+
+    response = admin_client.get(f"/cases/{case_1.id}")
+    cursor = response.context["next_cursor"]
+    url = f"/cases/{case_1.id}/timeline?before={cursor['before']}&skip={cursor['skip']}"
+    response = admin_client.get(url + "&ajax=1")
+    assertTemplateUsed(response, "cases/_timeline_entries.html")
+    assertTemplateNotUsed(response, "cases/case_detail_staff.html")
+    response = admin_client.get(url)
+    assertTemplateUsed(response, "cases/case_detail_staff.html")
+    response = admin_client.get(f"/cases/{case_1.id}/timeline?before=x")
+    assert response.status_code == 302
+
+    # Printing shows the whole timeline
+    response = admin_client.get(f"/cases/{case_1.id}?timeline=all&print=1")
+    assert response.context["next_cursor"] is None
+    timeline = [row.get("action") for row in response.context["timeline"]]
+    assert all(action in timeline for action in actions)
+    assertContains(response, "js-print-on-load")
+
+
 def test_complaint_view(admin_client, complaint):
     response = admin_client.get(f"/cases/{complaint.case.id}/complaint/{complaint.id}")
     assertContains(response, "Still ongoing at Tue, 9 Nov 2021, 2:29 p.m.", html=True)
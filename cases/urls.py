@@ -63,6 +63,7 @@ urlpatterns = [
         views.action_file_delete,
         name="action-file-delete",
     ),
+    path("/<int:pk>/timeline", views.case_timeline, name="case-timeline"),
     path("/<int:pk>/unmerge", views.unmerge, name="case-unmerge"),
     path("/<int:pk>/priority", views.priority, name="case-priority"),
     path(
@@ -75,6 +76,21 @@ urlpatterns = [
         views.mark_notifications_as_read,
         name="mark-notifications-as-read",
     ),
+    path(
+        "/notifications/read-all",
+        views.mark_all_notifications_as_read,
+        name="mark-all-notifications-as-read",
+    ),
+    path(
+        "/notifications/delete-read",
+        views.delete_read_notifications,
+        name="delete-read-notifications",
+    ),
+    path(
+        "/notifications/stream",
+        views.notifications_stream,
+        name="notifications-stream",
+    ),
     path(
         "/notifications/<int:pk>",
         views.consume_notification,
@@ -10,9 +10,14 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.gis.geos import Point
 from django.contrib.gis.measure import D
 from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.handlers.asgi import ASGIRequest
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.http.response import FileResponse
+from django.http.response import (
+    FileResponse,
+    HttpResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone
@@ -26,9 +31,18 @@ from noiseworks import cobrand
 from noiseworks.decorators import staff_member_required
 from noiseworks.message import send_email, send_sms
 
-from . import forms, map_utils
+from . import forms, map_utils, realtime
+from .digest import email_destination, email_staff
 from .filters import CaseFilter
-from .models import Action, ActionFile, ActionType, Case, Complaint, Notification
+from .models import (
+    Action,
+    ActionFile,
+    ActionType,
+    Case,
+    Complaint,
+    Notification,
+    micros_to_time,
+)
 from .signals import new_case_reported
 
 
@@ -57,13 +71,12 @@ def case_list(request):
 @login_required
 def case_list_user(request):
     cases = Case.objects.by_complainant(request.user)
-    out = []
-    for case in cases:
-        out.append(case.original_entry())
+    paginator = Paginator(cases, 20)
+    qs = paginator.get_page(request.GET.get("page"))
     return render(
         request,
         "cases/case_list_user.html",
-        {"cases": out},
+        {"cases": Case.objects.original_entries(qs), "qs": qs},
     )
 
 
@@ -112,12 +125,16 @@ def case_user(request, pk):
 
 
 @staff_member_required
-def case_staff(request, pk):
+def case_staff(request, pk, before=None, skip=0):
     qs = Case.objects.select_related("assigned").prefetch_related("perpetrators")
     case = get_object_or_404(qs, pk=pk)
 
     is_follower = case.followers.filter(pk=request.user.id)
-    timeline = case.timeline_staff_with_operation_flags(request.user)
+    # The whole timeline, rather than a page of it, to print
+    everything = request.GET.get("timeline") == "all"
+    timeline, next_cursor = case.timeline_staff_with_operation_flags(
+        request.user, before, skip, everything
+    )
     priority_change_form = forms.PriorityForm(initial={"priority": not case.priority})
 
     return render(
@@ -127,11 +144,36 @@ def case_staff(request, pk):
             "case": case,
             "is_follower": is_follower,
             "timeline": timeline,
+            "next_cursor": next_cursor,
+            "print": everything and "print" in request.GET,
             "priority_change_form": priority_change_form,
         },
     )
 
 
+@staff_member_required
+def case_timeline(request, pk):
+    """Older pages of a case's timeline, as a fragment for the page's
+    "Show older events" link to insert, or on a copy of the case page."""
+    try:
+        before = micros_to_time(request.GET["before"])
+        skip = int(request.GET.get("skip", 0))
+    except (KeyError, ValueError, OverflowError):
+        return redirect("case-view", pk)
+    if not request.GET.get("ajax"):
+        return case_staff(request, pk, before, skip)
+
+    case = get_object_or_404(Case, pk=pk)
+    timeline, next_cursor = case.timeline_staff_with_operation_flags(
+        request.user, before, skip
+    )
+    return render(
+        request,
+        "cases/_timeline_entries.html",
+        {"case": case, "timeline": timeline, "next_cursor": next_cursor},
+    )
+
+
 @permission_required("cases.assign")
 def reassign(request, pk):
     case = get_object_or_404(Case, pk=pk)
@@ -142,7 +184,10 @@ def reassign(request, pk):
         case.assign(user, triggered_by=request.user)
         if user.id != request.user.id:
             url = request.build_absolute_uri(case.get_absolute_url())
-            user.send_email(
+            email_staff(
+                user,
+                case,
+                f"You were assigned by {request.user}",
                 "You have been assigned",
                 "cases/email/assigned",
                 {"case": case, "url": url, "user": user, "by": request.user},
@@ -400,8 +445,9 @@ def unmerge(request, pk):
     case.unmerge()
     case.save()
     notification = f"Unmerged case #{case.id} from case #{other.id}."
-    other.notify_followers(notification, triggered_by=request.user)
-    case.notify_followers(notification, triggered_by=request.user)
+    Notification.objects.notify_followers(
+        [(other, notification), (case, notification)], triggered_by=request.user
+    )
     return redirect(case)
 
 
@@ -434,8 +480,9 @@ def merge_action(request, case):
     del request.session["merging_case"]
     messages.success(request, f"Case #{other_id} has been merged into this case.")
     notification = f"Merged case #{other.id} into case #{case.id}."
-    other.notify_followers(notification, triggered_by=request.user)
-    case.notify_followers(notification, triggered_by=request.user)
+    Notification.objects.notify_followers(
+        [(other, notification), (case, notification)], triggered_by=request.user
+    )
     return redirect(case)
 
 
@@ -921,6 +968,7 @@ class ReportingWizard(CaseWizard):
                     "Confirm your noise case",
                     "cases/add/email_confirm",
                     {"token": token},
+                    immediate=True,
                 )
             else:  # pragma: no cover # email or phone must both be present at present
                 send_sms(
@@ -1112,8 +1160,16 @@ def send_emails(request, complaint, template):
     staff_dest = cobrand.email.case_destination(case)
     url = request.build_absolute_uri(case.get_absolute_url())
     complainant = complaint.complainant
-    send_email(
+    if template == "report":
+        message = "Reported"
+    elif case.closed:
+        message = "Reoccurrence reported, reopening the case"
+    else:
+        message = "Reoccurrence reported"
+    email_destination(
         staff_dest,
+        case,
+        message,
         subject,
         f"cases/email/submit_{template}",
         {"complaint": complaint, "case": case, "complainant": complainant, "url": url},
@@ -1138,8 +1194,8 @@ def delete_notifications(request):
 def mark_notifications_as_read(request):
     notification_ids = request.POST.getlist("notification_ids")
     Notification.objects.filter(
-        id__in=notification_ids, recipient=request.user, read=False
-    ).update(read=True)
+        id__in=notification_ids, recipient=request.user
+    ).mark_read()
     return redirect("notifications")
 
 
@@ -1149,16 +1205,75 @@ def consume_notification(request, pk):
     if notification.recipient != request.user:
         raise PermissionDenied
     if not notification.read:
-        notification.read = True
-        notification.save()
+        Notification.objects.filter(pk=notification.pk).mark_read()
     return redirect(notification.case)
 
 
+def notifications_stream(request):
+    """The bell's server-sent events. Served under ASGI, this is a stream
+    kept open for a while; under WSGI, where it would hold a worker for as
+    long, it answers at once and the browser asks again later."""
+    user = request.user
+    if not (user.is_staff and user.has_perm("cases.follow")):
+        raise PermissionDenied
+    last_id = realtime.last_event_id(request)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if isinstance(request, ASGIRequest):
+        return StreamingHttpResponse(
+            realtime.stream(user, last_id),
+            content_type="text/event-stream",
+            headers=headers,
+        )
+    return HttpResponse(
+        realtime.poll(user, last_id),
+        content_type="text/event-stream",
+        headers=headers,
+    )
+
+
+def _filter_notifications(request, params):
+    notifications = request.user.notifications.all()
+    case = params.get("case", "").lstrip("#")
+    if case.isdigit():
+        notifications = notifications.filter(case_id=case)
+    if params.get("unread"):
+        notifications = notifications.filter(read=False)
+    return notifications
+
+
+@staff_member_required
+def mark_all_notifications_as_read(request):
+    if request.method == "POST":
+        _filter_notifications(request, request.POST).mark_read()
+    return redirect("notifications")
+
+
+@staff_member_required
+def delete_read_notifications(request):
+    if request.method == "POST":
+        _filter_notifications(request, request.POST).filter(read=True).delete()
+    return redirect("notifications")
+
+
 @staff_member_required
 def notifications_list(request):
-    notifications = request.user.notifications.order_by("read", "-time").all()
+    page_size = 50
+    after = Notification.parse_inbox_cursor(request.GET.get("after"))
+    notifications = _filter_notifications(request, request.GET)
+    notifications = notifications.select_related("case", "triggered_by")
+    notifications = list(notifications.inbox(after)[: page_size + 1])
+    next_cursor = None
+    if len(notifications) > page_size:
+        notifications = notifications[:page_size]
+        next_cursor = notifications[-1].inbox_cursor
     return render(
         request,
         "cases/notifications/notification_list.html",
-        {"notifications": notifications},
+        {
+            "notifications": notifications,
+            "next_cursor": next_cursor,
+            "is_first_page": not after,
+            "case_filter": request.GET.get("case", ""),
+            "unread_filter": bool(request.GET.get("unread")),
+        },
     )
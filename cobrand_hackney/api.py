@@ -7,6 +7,7 @@ import requests
 from django.conf import settings
 from requests_cache import CachedSession
 
+from noiseworks.metrics import record_http_response
 
 logger = logging.getLogger("noiseworks")
 
@@ -17,6 +18,7 @@ if "pytest" in sys.modules:
 else:  # pragma: no cover
     session = CachedSession(expire_after=86400)
 session.headers.update({"Authorization": api["key"], "User-Agent": api["user_agent"]})
+session.hooks["response"].append(record_http_response)
 
 
 def construct_address(address, include_postcode=False):
@@ -175,7 +177,7 @@ def _wfs_lookup(url, typename, cql_filter=None, bbox=None):
         params["BBOX"] = bbox
     url = f"https://map2.hackney.gov.uk/geoserver/{url}/ows"
 
-    r = requests.get(url, params)
+    r = requests.get(url, params, hooks={"response": record_http_response})
     logger.debug(
         f"Attempted WFS lookup at {url} with query parameters {params}\n Got: {r.text}\nStatus code: {r.status_code}."
     )
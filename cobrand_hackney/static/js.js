@@ -89,6 +89,9 @@ show_hide_checkbox("in_the_past", true, ["div_id_date", "div_id_action_time"]);
 construct_case_locations_dropdown();
 update_case_listing_on_change();
 expand_all_toggle();
+notification_bell();
+timeline_load_older();
+print_on_load();
 
 })();
 
@@ -291,3 +294,53 @@ function expand_all_toggle() {
         });
     });
 }
+
+/* Keep the notification bell up to date from the server-sent event stream */
+
+function notification_bell() {
+    var bell = document.querySelector('.js-notification-bell');
+    if (!bell || !window.EventSource) {
+        return;
+    }
+    var source = new EventSource(bell.dataset.stream);
+    source.addEventListener('count', function(e) {
+        var unread = JSON.parse(e.data).unread;
+        bell.src = unread ? bell.dataset.srcUnread : bell.dataset.srcRead;
+        bell.alt = unread + ' notifications';
+    });
+}
+
+/* Fetch older timeline events in place, rather than loading a new page */
+
+function timeline_load_older() {
+    if (!('fetch' in window)) {
+        return;
+    }
+    document.addEventListener('click', function(e) {
+        var link = e.target.closest('.js-timeline-older-page');
+        if (!link) {
+            return;
+        }
+        e.preventDefault();
+        fetch(link.href + '&ajax=1').then(res => {
+            if (!res.ok) {
+                throw new Error(res.statusText);
+            }
+            return res.text();
+        }).then(text => {
+            link.closest('.js-timeline-older').outerHTML = text;
+        }).catch(err => {
+            location.href = link.href;
+        });
+    });
+}
+
+/* Open the print dialog once the whole timeline has loaded, for "Print" */
+
+function print_on_load() {
+    if (document.querySelector('.js-print-on-load')) {
+        window.addEventListener('load', function() {
+            window.print();
+        });
+    }
+}
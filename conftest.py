@@ -0,0 +1,37 @@
+import pytest
+from django.core.cache import cache
+
+from core.fake_notify import API_KEY, FakeNotify
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """The local memory cache lasts the whole test run, so start each test
+    without anything another left behind."""
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def send_messages_immediately(settings):
+    """Tests check mail.outbox (or the SMS sent) straight after a request, so
+    send messages then rather than storing them in the outbox, which has its
+    own tests."""
+    settings.EMAIL_OUTBOX = False
+    settings.SMS_QUEUE = False
+
+
+@pytest.fixture(autouse=True)
+def no_query_watch(settings):
+    """Only watch queries in the tests that ask to, so logging is the same
+    each run."""
+    settings.QUERY_WATCH_SAMPLE_RATE = 0
+
+
+@pytest.fixture
+def fake_notify(settings):
+    """A fake Notify API for the duration of the test; see server.sent."""
+    server = FakeNotify().start()
+    settings.NOTIFY_BASE_URL = server.url
+    settings.NOTIFY_API_KEY = API_KEY
+    yield server
+    server.stop()
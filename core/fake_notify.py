@@ -0,0 +1,95 @@
+"""A stand-in for the GOV.UK Notify API, for tests and local development.
+
+It accepts text messages on the same URL as Notify, records them, and
+reports each as delivered (or with a status set on the server) when asked.
+Queue error codes in `failures` to have the next requests fail.
+"""
+
+import json
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A key in Notify's format of name, service ID and secret
+API_KEY = (
+    "fake-00000000-0000-0000-0000-000000000000-00000000-0000-0000-0000-000000000000"
+)
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path != "/v2/notifications/sms":
+            return self.respond(404, error("NotFound", "Not found"))
+        if self.server.failures:
+            code = self.server.failures.pop(0)
+            return self.respond(code, error("FakeError", f"Failing with {code}"))
+        length = int(self.headers.get("Content-Length", 0))
+        data = json.loads(self.rfile.read(length))
+        id = str(uuid.uuid4())
+        with self.server.lock:
+            self.server.sent.append({"id": id, **data})
+        if self.server.log:
+            self.server.log(data)
+        self.respond(
+            201,
+            {
+                "id": id,
+                "reference": None,
+                "content": {
+                    "body": data.get("personalisation", {}).get("text", ""),
+                    "from_number": "NoiseWorks",
+                },
+                "uri": f"{self.server.url}/v2/notifications/{id}",
+                "template": {"id": data.get("template_id"), "version": 1},
+            },
+        )
+
+    def do_GET(self):
+        m = re.fullmatch(r"/v2/notifications/([0-9a-f-]+)", self.path)
+        ids = [sms["id"] for sms in self.server.sent]
+        if not m or m.group(1) not in ids:
+            return self.respond(404, error("NoResultFound", "No result found"))
+        id = m.group(1)
+        status = self.server.statuses.get(id, "delivered")
+        self.respond(200, {"id": id, "type": "sms", "status": status})
+
+    def respond(self, code, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def error(name, message):
+    return {"status_code": 400, "errors": [{"error": name, "message": message}]}
+
+
+class FakeNotify(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, log=None):
+        super().__init__((host, port), Handler)
+        self.log = log
+        self.sent = []
+        self.statuses = {}
+        self.failures = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,59 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from cases.housekeeping import delete_in_batches
+from core.models import OutboxEmail, OutboxSMS
+from noiseworks.profiling import ProfilingMixin
+
+
+class Command(ProfilingMixin, BaseCommand):
+    help = (
+        "Delete text messages sent, and emails and text messages given up on,"
+        " more than a given number of days ago"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            help="Number of days after which to delete a sent or failed message",
+            type=int,
+        )
+        parser.add_argument(
+            "--batch-size",
+            help="Number of messages to delete in each batch",
+            type=int,
+            default=1000,
+        )
+        parser.add_argument(
+            "--sleep",
+            help="Seconds to pause between batches",
+            type=float,
+            default=0.1,
+        )
+
+    def handle(self, *args, **options):
+        if not options["days"]:
+            raise CommandError("Please specify a number of days")
+        if options["batch_size"] < 1:
+            raise CommandError("Please specify a positive batch size")
+        cutoff = timezone.now() - datetime.timedelta(days=options["days"])
+        querysets = {
+            "text messages": OutboxSMS.objects.filter(
+                Q(sent__lt=cutoff) | Q(failed=True, created__lt=cutoff)
+            ),
+            "emails": OutboxEmail.objects.filter(failed=True, created__lt=cutoff),
+        }
+
+        for name, queryset in querysets.items():
+            with self.phase(name) as stats:
+                total = delete_in_batches(
+                    queryset,
+                    batch_size=options["batch_size"],
+                    sleep=options["sleep"],
+                    progress=lambda total: self.advance(total - stats.rows),
+                )
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Deleted {total} {name} older than {cutoff}")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.fake_notify import API_KEY, FakeNotify
+
+
+class Command(BaseCommand):
+    help = "Run a fake GOV.UK Notify API locally, printing the messages sent to it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8025)
+
+    def handle(self, *args, **options):
+        def log(sms):
+            text = sms.get("personalisation", {}).get("text", "")
+            self.stdout.write(f"SMS to {sms.get('phone_number')}:\n{text}\n")
+
+        server = FakeNotify(port=options["port"], log=log)
+        self.stdout.write(
+            f"Set NOTIFY_BASE_URL={server.url} and NOTIFY_API_KEY={API_KEY}"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:  # pragma: no cover
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.outbox import send_waiting
+from noiseworks.profiling import ProfilingMixin
+
+
+class Command(ProfilingMixin, BaseCommand):
+    help = "Send the emails waiting in the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            help="Number of emails to send in each transaction",
+            type=int,
+            default=50,
+        )
+        parser.add_argument(
+            "--loop",
+            help="Keep running, checking for new emails every --interval seconds",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--interval",
+            help="Seconds to wait between checks when looping",
+            type=float,
+            default=5,
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("Please specify a positive batch size")
+        while True:
+            sent, failed = send_waiting(options["batch_size"])
+            self.advance(sent + failed)
+            if options["verbosity"] > 1 or (options["verbosity"] and failed):
+                self.stdout.write(f"Sent {sent} emails, {failed} failed")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sms import send_waiting, update_statuses
+from noiseworks.profiling import ProfilingMixin
+
+
+class Command(ProfilingMixin, BaseCommand):
+    help = "Send the text messages waiting to go to Notify, and check on sent ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            help="Number of messages to send in each transaction",
+            type=int,
+            default=50,
+        )
+        parser.add_argument(
+            "--loop",
+            help="Keep running, checking for new messages every --interval seconds",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--interval",
+            help="Seconds to wait between checks when looping",
+            type=float,
+            default=2,
+        )
+        parser.add_argument(
+            "--no-statuses",
+            help="Do not ask Notify for the delivery status of sent messages",
+            action="store_true",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("Please specify a positive batch size")
+        while True:
+            sent, failed = send_waiting(options["batch_size"])
+            self.advance(sent + failed)
+            if options["verbosity"] > 1 or (options["verbosity"] and failed):
+                self.stdout.write(f"Sent {sent} text messages, {failed} failed")
+            if not options["no_statuses"]:
+                changed = update_statuses()
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"Updated the status of {changed}")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,52 @@
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEmail",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created", models.DateTimeField(default=django.utils.timezone.now)),
+                ("from_email", models.CharField(max_length=254)),
+                (
+                    "recipients",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=254), size=None
+                    ),
+                ),
+                ("subject", models.TextField()),
+                ("message", models.BinaryField()),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "send_after",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("failed", models.BooleanField(default=False)),
+                ("last_error", models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="outboxemail",
+            index=models.Index(
+                condition=models.Q(("failed", False)),
+                fields=["send_after"],
+                name="core_outboxemail_pending_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxSMS",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created", models.DateTimeField(default=django.utils.timezone.now)),
+                ("to", models.CharField(max_length=32)),
+                ("text", models.TextField()),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "send_after",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("failed", models.BooleanField(default=False)),
+                ("last_error", models.TextField(blank=True)),
+                ("sent", models.DateTimeField(blank=True, null=True)),
+                ("notify_id", models.CharField(blank=True, max_length=36)),
+                ("status", models.CharField(blank=True, max_length=32)),
+            ],
+            options={
+                "verbose_name": "outbox SMS",
+                "verbose_name_plural": "outbox SMSes",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="outboxsms",
+            index=models.Index(
+                condition=models.Q(("failed", False), ("sent__isnull", True)),
+                fields=["send_after"],
+                name="core_outboxsms_pending_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="outboxsms",
+            index=models.Index(
+                condition=models.Q(("status__in", ("created", "sending", "pending"))),
+                fields=["sent"],
+                name="core_outboxsms_status_idx",
+            ),
+        ),
+    ]
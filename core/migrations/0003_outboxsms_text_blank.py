@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_outboxsms"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="outboxsms",
+            name="text",
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,68 @@
+from django.contrib.postgres.fields import ArrayField
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxEmail(models.Model):
+    """A rendered email waiting to be sent by the send_outbox command."""
+
+    created = models.DateTimeField(default=timezone.now)
+    from_email = models.CharField(max_length=254)
+    recipients = ArrayField(models.CharField(max_length=254))
+    subject = models.TextField()
+    # The whole MIME message, as it will be sent over SMTP
+    message = models.BinaryField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    send_after = models.DateTimeField(default=timezone.now)
+    failed = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["send_after"],
+                condition=models.Q(failed=False),
+                name="core_outboxemail_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.recipients)}"
+
+
+class OutboxSMS(models.Model):
+    """A text message to be sent through GOV.UK Notify by the send_sms_outbox
+    command, and then its delivery status as Notify reports it."""
+
+    PENDING_STATUSES = ("created", "sending", "pending")
+
+    created = models.DateTimeField(default=timezone.now)
+    to = models.CharField(max_length=32)
+    # Cleared once sent or given up on
+    text = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    send_after = models.DateTimeField(default=timezone.now)
+    failed = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True)
+    sent = models.DateTimeField(null=True, blank=True)
+    notify_id = models.CharField(max_length=36, blank=True)
+    status = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        verbose_name = "outbox SMS"
+        verbose_name_plural = "outbox SMSes"
+        indexes = [
+            models.Index(
+                fields=["send_after"],
+                condition=models.Q(sent__isnull=True, failed=False),
+                name="core_outboxsms_pending_idx",
+            ),
+            models.Index(
+                fields=["sent"],
+                condition=models.Q(status__in=("created", "sending", "pending")),
+                name="core_outboxsms_status_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"SMS to {self.to}"
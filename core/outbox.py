@@ -0,0 +1,150 @@
+"""A database outbox for email.
+
+Emails are rendered in the request but, rather than being sent there, are
+stored in the same transaction as whatever change prompted them. The
+send_outbox command then sends what is waiting, in batches over one
+connection, trying failed messages again later with a growing delay, so that
+a slow or unavailable mail server never holds up a request.
+
+Emails someone is waiting on, such as sign-in codes and report confirmation
+tokens, are sent immediately instead, as the outbox may not be sent for a
+minute or so.
+"""
+
+import datetime
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger("noiseworks")
+
+
+def enqueue(message, immediate=False):
+    """Store an EmailMessage to be sent, or send it now if it is wanted
+    immediately or the outbox is off."""
+    if immediate or not settings.EMAIL_OUTBOX:
+        return message.send()
+    OutboxEmail.objects.create(
+        from_email=message.from_email,
+        recipients=message.recipients(),
+        subject=message.subject,
+        message=message.message().as_bytes(linesep="\r\n"),
+    )
+    return 1
+
+
+class RawMessage:
+    def __init__(self, data):
+        self.data = bytes(data)
+
+    def as_bytes(self, linesep="\r\n"):
+        return self.data
+
+
+class StoredEmail(EmailMessage):
+    """An outbox email in the form mail backends send."""
+
+    def __init__(self, email):
+        super().__init__(
+            subject=email.subject, from_email=email.from_email, to=email.recipients
+        )
+        self.raw = bytes(email.message)
+
+    def message(self):
+        return RawMessage(self.raw)
+
+
+def retry_delay(attempts):
+    return datetime.timedelta(
+        seconds=min(
+            settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1),
+            settings.EMAIL_OUTBOX_MAX_RETRY_DELAY,
+        )
+    )
+
+
+def record_failure(email, error):
+    """Note a failed attempt at sending, to try again after a delay, or give
+    up after too many attempts."""
+    email.attempts += 1
+    email.last_error = f"{type(error).__name__}: {error}"
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.failed = True
+        logger.error("Giving up sending email %s: %s", email.id, error)
+    else:
+        email.send_after = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=["attempts", "last_error", "failed", "send_after"])
+
+
+def waiting(batch_size):
+    return list(
+        OutboxEmail.objects.filter(failed=False, send_after__lte=timezone.now())
+        .order_by("send_after", "id")
+        .select_for_update(skip_locked=True)[:batch_size]
+    )
+
+
+def send_batch(connection, batch_size=50):
+    """Send up to batch_size waiting emails over the given open connection.
+    Returns the number sent and the number that failed."""
+    sent = failed = 0
+    with transaction.atomic():
+        batch = waiting(batch_size)
+        done = []
+        for email in batch:
+            try:
+                connection.send_messages([StoredEmail(email)])
+            except Exception as e:
+                failed += 1
+                record_failure(email, e)
+                # The connection may not survive an error, so start afresh,
+                # leaving the rest of the batch for later if that fails
+                connection.close()
+                try:
+                    connection.open()
+                except Exception:
+                    break
+            else:
+                sent += 1
+                done.append(email.id)
+        OutboxEmail.objects.filter(id__in=done).delete()
+    return sent, failed
+
+
+def defer_batch(error, batch_size=50):
+    """Count a failure to reach the mail server as a failed attempt at each
+    of the next batch_size waiting emails, so they are tried again after a
+    delay like any other failure. Returns the number deferred."""
+    with transaction.atomic():
+        batch = waiting(batch_size)
+        for email in batch:
+            record_failure(email, error)
+    return len(batch)
+
+
+def send_waiting(batch_size=50):
+    """Send everything currently waiting, over one connection. Returns the
+    number sent and the number that failed."""
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning("Could not connect to the mail server: %s", e)
+        return 0, defer_batch(e, batch_size)
+
+    total_sent = total_failed = 0
+    try:
+        while True:
+            sent, failed = send_batch(connection, batch_size)
+            total_sent += sent
+            total_failed += failed
+            if sent + failed < batch_size:
+                break
+    finally:
+        connection.close()
+    return total_sent, total_failed
@@ -0,0 +1,162 @@
+"""Sending text messages through GOV.UK Notify.
+
+Messages are stored, like emails in core.outbox, and sent by the
+send_sms_outbox command, so that a slow Notify never holds up a request such
+as signing in. The command keeps within Notify's rate limit, retries
+failures that may be temporary with a growing delay, and afterwards asks
+Notify whether each message was delivered. The text of a message is
+cleared once it has been sent or given up on, as Notify keeps its own copy,
+and the delete_old_outbox command removes old rows altogether.
+"""
+
+import datetime
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from notifications_python_client.errors import HTTPError
+from notifications_python_client.notifications import NotificationsAPIClient
+
+from .models import OutboxSMS
+
+logger = logging.getLogger("noiseworks")
+
+# Notify rejects these outright, so trying again would not help
+PERMANENT_ERROR_CODES = (400, 403)
+
+_local = threading.local()
+
+
+def notify_client():
+    """A Notify client, kept for reuse (along with its HTTP connections) by
+    each thread, as the client is not thread-safe."""
+    key = (settings.NOTIFY_API_KEY, settings.NOTIFY_BASE_URL)
+    if getattr(_local, "key", None) != key:
+        _local.client = NotificationsAPIClient(
+            settings.NOTIFY_API_KEY,
+            base_url=settings.NOTIFY_BASE_URL,
+            timeout=settings.NOTIFY_TIMEOUT,
+        )
+        _local.key = key
+    return _local.client
+
+
+def send_now(to, text):
+    return notify_client().send_sms_notification(
+        phone_number=to,
+        template_id=settings.NOTIFY_TEMPLATE_ID,
+        personalisation={"text": text},
+    )
+
+
+def enqueue_sms(to, text):
+    """Store a text message to be sent, or send it now if the queue is off."""
+    if not settings.SMS_QUEUE:
+        return send_now(to, text)
+    return OutboxSMS.objects.create(to=to, text=text)
+
+
+class RateLimiter:
+    """Spaces out calls to wait() so there are at most limit every period
+    seconds."""
+
+    def __init__(self, limit, period=60, clock=time.monotonic, sleep=time.sleep):
+        self.interval = period / limit
+        self.clock = clock
+        self.sleep = sleep
+        self.next = None
+
+    def wait(self):
+        now = self.clock()
+        if self.next is not None and self.next > now:
+            self.sleep(self.next - now)
+            now = self.next
+        self.next = now + self.interval
+
+
+def retry_delay(attempts):
+    return datetime.timedelta(
+        seconds=min(
+            settings.SMS_QUEUE_RETRY_DELAY * 2 ** (attempts - 1),
+            settings.SMS_QUEUE_MAX_RETRY_DELAY,
+        )
+    )
+
+
+def send_batch(limiter, batch_size=50):
+    """Send up to batch_size waiting messages, as fast as the limiter allows.
+    Returns the number sent and the number that failed."""
+    sent = failed = 0
+    with transaction.atomic():
+        batch = list(
+            OutboxSMS.objects.filter(
+                sent__isnull=True, failed=False, send_after__lte=timezone.now()
+            )
+            .order_by("send_after", "id")
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        for sms in batch:
+            limiter.wait()
+            try:
+                response = send_now(sms.to, sms.text)
+            except Exception as e:
+                failed += 1
+                sms.attempts += 1
+                sms.last_error = f"{type(e).__name__}: {e}"
+                permanent = (
+                    isinstance(e, HTTPError) and e.status_code in PERMANENT_ERROR_CODES
+                )
+                if permanent or sms.attempts >= settings.SMS_QUEUE_MAX_ATTEMPTS:
+                    sms.failed = True
+                    sms.text = ""
+                    logger.error("Giving up sending SMS %s: %s", sms.id, e)
+                else:
+                    sms.send_after = timezone.now() + retry_delay(sms.attempts)
+            else:
+                sent += 1
+                sms.sent = timezone.now()
+                sms.notify_id = response["id"]
+                sms.status = "created"
+                sms.text = ""
+            sms.save()
+    return sent, failed
+
+
+def send_waiting(batch_size=50, limiter=None):
+    """Send every message currently waiting. Returns the number sent and the
+    number that failed."""
+    limiter = limiter or RateLimiter(settings.NOTIFY_RATE_LIMIT)
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = send_batch(limiter, batch_size)
+        total_sent += sent
+        total_failed += failed
+        if sent + failed < batch_size:
+            break
+    return total_sent, total_failed
+
+
+def update_statuses(limiter=None, max_age=datetime.timedelta(days=3)):
+    """Ask Notify for the delivery status of recently sent messages not yet
+    known to be delivered or to have failed. Returns how many changed."""
+    limiter = limiter or RateLimiter(settings.NOTIFY_RATE_LIMIT)
+    changed = 0
+    pending = OutboxSMS.objects.filter(
+        status__in=OutboxSMS.PENDING_STATUSES,
+        sent__gte=timezone.now() - max_age,
+    ).order_by("sent")
+    for sms in pending:
+        limiter.wait()
+        try:
+            status = notify_client().get_notification_by_id(sms.notify_id)["status"]
+        except Exception as e:
+            logger.warning("Could not get status of SMS %s: %s", sms.id, e)
+            continue
+        if status != sms.status:
+            sms.status = status
+            sms.save(update_fields=["status"])
+            changed += 1
+    return changed
@@ -0,0 +1,97 @@
+import datetime
+from email import message_from_bytes
+from unittest.mock import patch
+
+import pytest
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import OutboxEmail
+from ..outbox import enqueue, send_waiting
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def outbox_on(settings):
+    settings.EMAIL_OUTBOX = True
+    settings.EMAIL_OUTBOX_MAX_ATTEMPTS = 2
+    settings.EMAIL_OUTBOX_RETRY_DELAY = 60
+
+
+def message(n=1):
+    return EmailMessage(f"Subject {n}", "Body", "from@example.org", ["to@example.org"])
+
+
+def test_enqueue_stores_rather_than_sends():
+    enqueue(message())
+    assert len(mail.outbox) == 0
+    email = OutboxEmail.objects.get()
+    assert email.recipients == ["to@example.org"]
+    assert str(email) == "Subject 1 to to@example.org"
+
+
+def test_enqueue_immediate_sends_now():
+    enqueue(message(), immediate=True)
+    assert len(mail.outbox) == 1
+    assert not OutboxEmail.objects.exists()
+
+
+def test_enqueue_is_part_of_the_transaction():
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            enqueue(message())
+            raise ValueError
+    assert not OutboxEmail.objects.exists()
+
+
+def test_send_outbox(capsys):
+    for n in range(3):
+        enqueue(message(n))
+    with patch.object(EmailBackend, "open") as opened:
+        call_command("send_outbox", batch_size=2, verbosity=2)
+    assert opened.call_count == 1
+    assert "Sent 3 emails, 0 failed" in capsys.readouterr().out
+    assert not OutboxEmail.objects.exists()
+    assert len(mail.outbox) == 3
+    sent = message_from_bytes(mail.outbox[0].message().as_bytes())
+    assert sent["Subject"] == "Subject 0"
+    assert sent["To"] == "to@example.org"
+
+
+def test_send_outbox_retries_then_gives_up():
+    enqueue(message())
+    with patch.object(EmailBackend, "send_messages", side_effect=OSError("down")):
+        assert send_waiting() == (0, 1)
+    email = OutboxEmail.objects.get()
+    assert email.attempts == 1
+    assert email.last_error == "OSError: down"
+    assert email.send_after > timezone.now() + datetime.timedelta(seconds=50)
+
+    # Not tried again until the delay has passed
+    assert send_waiting() == (0, 0)
+    email.send_after = timezone.now()
+    email.save()
+    with patch.object(EmailBackend, "send_messages", side_effect=OSError("down")):
+        assert send_waiting() == (0, 1)
+    email.refresh_from_db()
+    assert email.failed
+    assert send_waiting() == (0, 0)
+
+
+def test_send_outbox_cannot_connect():
+    for n in range(3):
+        enqueue(message(n))
+    with patch.object(EmailBackend, "open", side_effect=OSError("refused")):
+        assert send_waiting(batch_size=2) == (0, 2)
+    assert len(mail.outbox) == 0
+    deferred = OutboxEmail.objects.filter(attempts=1)
+    assert deferred.count() == 2
+    for email in deferred:
+        assert email.last_error == "OSError: refused"
+        assert email.send_after > timezone.now()
+    assert OutboxEmail.objects.get(attempts=0).subject == "Subject 2"
@@ -0,0 +1,122 @@
+import datetime
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+
+from noiseworks.message import send_sms
+
+from ..models import OutboxEmail, OutboxSMS
+from ..sms import RateLimiter, notify_client, send_waiting, update_statuses
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def queue_on(settings, fake_notify):
+    settings.SMS_QUEUE = True
+    settings.SMS_QUEUE_MAX_ATTEMPTS = 2
+    settings.NOTIFY_TEMPLATE_ID = "template"
+
+
+def test_send_sms_queues(fake_notify):
+    send_sms("+447700900000", "Hello")
+    assert fake_notify.sent == []
+    sms = OutboxSMS.objects.get()
+    assert (sms.to, sms.text, sms.sent) == ("+447700900000", "Hello", None)
+
+
+def test_send_sms_outbox(fake_notify, capsys):
+    send_sms("+447700900000", "One")
+    send_sms("+447700900001", "Two")
+    call_command("send_sms_outbox", verbosity=2)
+    output = capsys.readouterr().out
+    assert "Sent 2 text messages, 0 failed" in output
+    assert "Updated the status of 2" in output
+    assert [s["personalisation"]["text"] for s in fake_notify.sent] == ["One", "Two"]
+    sms = OutboxSMS.objects.get(to="+447700900000")
+    assert sms.notify_id == fake_notify.sent[0]["id"]
+    assert sms.status == "delivered"
+    assert sms.text == ""
+
+
+def test_sms_retried_then_given_up(fake_notify):
+    send_sms("+447700900000", "Hello")
+    fake_notify.failures = [500, 500]
+    assert send_waiting() == (0, 1)
+    sms = OutboxSMS.objects.get()
+    assert sms.attempts == 1
+    assert sms.send_after > timezone.now() + datetime.timedelta(seconds=20)
+    assert send_waiting() == (0, 0)
+
+    sms.send_after = timezone.now()
+    sms.save()
+    assert send_waiting() == (0, 1)
+    sms.refresh_from_db()
+    assert sms.failed
+    assert "500" in sms.last_error
+    assert sms.text == ""
+
+
+def test_sms_rejected_not_retried(fake_notify):
+    send_sms("+447700900000", "Hello")
+    fake_notify.failures = [400]
+    assert send_waiting() == (0, 1)
+    assert OutboxSMS.objects.get().failed
+
+
+def test_sms_status_tracking(fake_notify):
+    send_sms("+447700900000", "Hello")
+    send_waiting()
+    sms = OutboxSMS.objects.get()
+    fake_notify.statuses[sms.notify_id] = "sending"
+    assert update_statuses() == 1
+    fake_notify.statuses[sms.notify_id] = "permanent-failure"
+    assert update_statuses() == 1
+    sms.refresh_from_db()
+    assert sms.status == "permanent-failure"
+    assert update_statuses() == 0
+
+
+def test_delete_old_outbox(capsys):
+    old = timezone.now() - datetime.timedelta(days=40)
+    recent = timezone.now() - datetime.timedelta(days=1)
+    kept = [
+        OutboxSMS.objects.create(to="1", created=old),
+        OutboxSMS.objects.create(to="2", sent=recent),
+        OutboxSMS.objects.create(to="3", failed=True, created=recent),
+        OutboxEmail.objects.create(recipients=["a"], created=old),
+    ]
+    OutboxSMS.objects.create(to="4", sent=old)
+    OutboxSMS.objects.create(to="5", failed=True, created=old)
+    OutboxEmail.objects.create(recipients=["b"], failed=True, created=old)
+
+    with pytest.raises(CommandError):
+        call_command("delete_old_outbox")
+    call_command("delete_old_outbox", days=30, batch_size=1, sleep=0, verbosity=2)
+    output = capsys.readouterr().out
+    assert "Deleted 2 text messages" in output
+    assert "Deleted 1 emails" in output
+    remaining = [*OutboxSMS.objects.order_by("id"), *OutboxEmail.objects.all()]
+    assert remaining == kept
+
+
+def test_notify_client_reused(settings):
+    assert notify_client() is notify_client()
+    client = notify_client()
+    settings.NOTIFY_BASE_URL = "http://localhost:1"
+    assert notify_client() is not client
+
+
+def test_rate_limiter():
+    now = [0.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    limiter = RateLimiter(120, clock=lambda: now[0], sleep=sleep)
+    for _ in range(3):
+        limiter.wait()
+    assert slept == [0.5, 0.5]
@@ -3,6 +3,17 @@ ASGI config for noiseworks project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The staff notification stream (``/cases/notifications/stream``) is only
+pushed to browsers when served from this application, by an ASGI server
+running one event loop per process, e.g.
+
+    uvicorn noiseworks.asgi:application --workers 4
+
+Each process then keeps a single LISTEN connection on that loop for all of
+its open streams; see cases/realtime.py. Served from the WSGI application
+instead (as by runserver), the bell polls every NOTIFICATIONS_POLL_INTERVAL
+seconds, so no worker is held open.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
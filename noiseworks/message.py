@@ -1,41 +1,67 @@
 from email.mime.image import MIMEImage
+from functools import lru_cache
+from types import MappingProxyType
 
-from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from notifications_python_client.notifications import NotificationsAPIClient
+from django.template.loader import get_template
 
+from core.outbox import enqueue
+from core.sms import enqueue_sms
 from noiseworks import cobrand
 
 
 def send_sms(to, text):
-    notifications_client = NotificationsAPIClient(settings.NOTIFY_API_KEY)
-    notifications_client.send_sms_notification(
-        phone_number=to,
-        template_id=settings.NOTIFY_TEMPLATE_ID,
-        personalisation={"text": text},
-    )
-
-
-def send_email(to, subject, template, data):
-    if not isinstance(to, list):
-        to = [to]
-    body_text = render_to_string(f"{template}.txt", data)
-    settings = email_colours()
-    settings.update(cobrand.email.override_colours())
-    email_settings(settings)
-    settings.update(cobrand.email.override_settings(settings))
-    data.update(settings)
-    body_html = render_to_string(f"{template}.html", data)
-
-    logo = MIMEImage(data["logo_inline"]["data"])
-    logo.add_header("Content-ID", f"<{data['logo_inline']['id']}>")
-
-    message = EmailMultiAlternatives(subject, body_text, None, to)
-    message.mixed_subtype = "related"
-    message.attach_alternative(body_html, "text/html")
-    message.attach(logo)
-    message.send()
+    enqueue_sms(to, text)
+
+
+@lru_cache(maxsize=None)
+def email_theme():
+    """The colours and styles the email templates use, with the cobrand's
+    overrides, worked out once per process."""
+    theme = email_colours()
+    theme.update(cobrand.email.override_colours())
+    email_settings(theme)
+    theme.update(cobrand.email.override_settings(theme))
+    return MappingProxyType(theme)
+
+
+@lru_cache(maxsize=None)
+def email_logo():
+    """The logo as a MIME part, shared by every email; it is never changed."""
+    logo_inline = email_theme()["logo_inline"]
+    logo = MIMEImage(logo_inline["data"])
+    logo.add_header("Content-ID", f"<{logo_inline['id']}>")
+    return logo
+
+
+def build_emails(subject, template, recipients, data=None):
+    """Yield an email for each of recipients, a list of (to, data) pairs,
+    rendering the template once per recipient with the theme, any shared
+    data, and then their own data."""
+    text_template = get_template(f"{template}.txt")
+    html_template = get_template(f"{template}.html")
+    theme = email_theme()
+    for to, own_data in recipients:
+        if not isinstance(to, list):
+            to = [to]
+        context = {**(data or {}), **own_data}
+        body_text = text_template.render(context)
+        body_html = html_template.render({**context, **theme})
+
+        message = EmailMultiAlternatives(subject, body_text, None, to)
+        message.mixed_subtype = "related"
+        message.attach_alternative(body_html, "text/html")
+        message.attach(email_logo())
+        yield message
+
+
+def send_emails(subject, template, recipients, data=None, immediate=False):
+    for message in build_emails(subject, template, recipients, data):
+        enqueue(message, immediate)
+
+
+def send_email(to, subject, template, data, immediate=False):
+    send_emails(subject, template, [(to, data)], immediate=immediate)
 
 
 def email_colours():
@@ -0,0 +1,234 @@
+"""Per-view performance metrics, exported for Prometheus.
+
+MetricsMiddleware times each request and, through a database execute
+wrapper, the response hook on the cobrand API's HTTP calls, and the
+DjangoTemplates backend below, how much of that went on SQL queries,
+external HTTP calls and template rendering. Each is added to a histogram
+labelled with the view name, and /metrics returns them all in Prometheus's
+text format.
+
+The histograms are kept in memory, so each server process reports only its
+own requests, and its counts go back to zero when it restarts (which
+Prometheus copes with). Under a server running several worker processes,
+such as gunicorn or uvicorn with --workers, each scrape of /metrics is
+answered by whichever worker gets it, so successive scrapes see different
+workers' numbers. The figures are then only a sample of one worker's
+requests, and rates computed from them are unreliable. For exact figures,
+run one worker per process Prometheus can scrape separately, e.g. one
+worker per container.
+"""
+
+import hmac
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.template.backends import django as django_backend
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_stats = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.counts = {}
+        self.sums = {}
+        self.lock = threading.Lock()
+
+    def observe(self, view, value):
+        # Counts are per bucket here, and made cumulative when rendered
+        bucket = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.counts.get(view)
+            if counts is None:
+                counts = self.counts[view] = [0] * (len(self.buckets) + 1)
+                self.sums[view] = 0
+            counts[bucket] += 1
+            self.sums[view] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self.lock:
+            counts = {view: list(c) for view, c in self.counts.items()}
+            sums = dict(self.sums)
+        for view in sorted(counts):
+            label = f'view="{escape(view)}"'
+            total = 0
+            for le, count in zip((*self.buckets, "+Inf"), counts[view]):
+                total += count
+                yield f'{self.name}_bucket{{{label},le="{le}"}} {total}'
+            yield f"{self.name}_sum{{{label}}} {sums[view]}"
+            yield f"{self.name}_count{{{label}}} {total}"
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+            self.sums.clear()
+
+
+def escape(value):
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+REQUEST_SECONDS = Histogram(
+    "noiseworks_request_duration_seconds",
+    "Time taken to respond to a request.",
+    SECONDS_BUCKETS,
+)
+QUERIES = Histogram(
+    "noiseworks_request_queries",
+    "Number of SQL queries made by a request.",
+    COUNT_BUCKETS,
+)
+QUERY_SECONDS = Histogram(
+    "noiseworks_request_query_duration_seconds",
+    "Time a request spent on SQL queries.",
+    SECONDS_BUCKETS,
+)
+HTTP_CALLS = Histogram(
+    "noiseworks_request_http_calls",
+    "Number of external HTTP calls made by a request.",
+    COUNT_BUCKETS,
+)
+HTTP_SECONDS = Histogram(
+    "noiseworks_request_http_duration_seconds",
+    "Time a request spent waiting on external HTTP calls.",
+    SECONDS_BUCKETS,
+)
+TEMPLATE_SECONDS = Histogram(
+    "noiseworks_request_template_duration_seconds",
+    "Time a request spent rendering templates.",
+    SECONDS_BUCKETS,
+)
+HISTOGRAMS = (
+    REQUEST_SECONDS,
+    QUERIES,
+    QUERY_SECONDS,
+    HTTP_CALLS,
+    HTTP_SECONDS,
+    TEMPLATE_SECONDS,
+)
+
+
+class RequestStats:
+    __slots__ = (
+        "queries",
+        "query_time",
+        "http_calls",
+        "http_time",
+        "template_time",
+        "rendering",
+    )
+
+    def __init__(self):
+        self.queries = self.http_calls = 0
+        self.query_time = self.http_time = self.template_time = 0
+        self.rendering = False
+
+    def observe(self, view, duration):
+        REQUEST_SECONDS.observe(view, duration)
+        QUERIES.observe(view, self.queries)
+        QUERY_SECONDS.observe(view, self.query_time)
+        HTTP_CALLS.observe(view, self.http_calls)
+        HTTP_SECONDS.observe(view, self.http_time)
+        TEMPLATE_SECONDS.observe(view, self.template_time)
+
+
+def time_query(execute, sql, params, many, context):
+    stats = _stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_time += perf_counter() - start
+
+
+def record_http_response(response, *args, **kwargs):
+    """A requests response hook, counting the call towards the current
+    request's external HTTP calls unless it was answered from a cache."""
+    stats = _stats.get()
+    if stats is None or getattr(response, "from_cache", False):
+        return
+    stats.http_calls += 1
+    stats.http_time += response.elapsed.total_seconds()
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The usual template backend, timing each template it renders."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        stats = _stats.get()
+        # Only time the outermost render, not templates rendered within it
+        if stats is None or stats.rendering:
+            return self.template.render(context, request)
+        stats.rendering = True
+        start = perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            stats.template_time += perf_counter() - start
+            stats.rendering = False
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "unresolved"
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        stats = RequestStats()
+        token = _stats.set(stats)
+        start = perf_counter()
+        try:
+            with connection.execute_wrapper(time_query):
+                response = self.get_response(request)
+        finally:
+            _stats.reset(token)
+        stats.observe(view_name(request), perf_counter() - start)
+        return response
+
+
+def metrics(request):
+    """The histograms, for Prometheus to scrape with METRICS_TOKEN as its
+    bearer token. Without a token set, there is nothing here."""
+    token = settings.METRICS_TOKEN
+    given = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not token or not hmac.compare_digest(given.encode(), token.encode()):
+        raise Http404
+    lines = [line for histogram in HISTOGRAMS for line in histogram.render()]
+    return HttpResponse(
+        "\n".join(lines) + "\n", content_type="text/plain; version=0.0.4"
+    )
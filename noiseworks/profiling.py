@@ -0,0 +1,144 @@
+"""Timing options shared by our management commands.
+
+Mix ProfilingMixin into a command to give it:
+
+--profile FILE  run it under cProfile, writing the stats to FILE (for
+                python -m pstats, or snakeviz)
+--stats         report, when it finishes, how long it took, the rows it
+                handled per second, its peak memory use, and the queries it
+                made, overall and for each phase
+--progress      report rows handled every few seconds while it runs
+
+A command marks its phases with `with self.phase(name):` and counts the
+rows it has handled with self.advance(). Reports go to stderr, leaving
+stdout to the command's own output, and to the noiseworks logger.
+"""
+
+import cProfile
+import logging
+import resource
+import sys
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connection
+
+logger = logging.getLogger("noiseworks")
+
+PROGRESS_INTERVAL = 5
+
+
+class PhaseStats:
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.queries = 0
+        self.query_time = 0
+        self.time = 0
+
+    def __str__(self):
+        rate = f" ({self.rows / self.time:.0f}/s)" if self.time else ""
+        return (
+            f"{self.name}: {self.time:.2f}s, {self.rows} rows{rate},"
+            f" {self.queries} queries ({self.query_time:.2f}s)"
+        )
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux gives kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class ProfilingMixin:
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument(
+            "--profile",
+            metavar="FILE",
+            help="Run under cProfile, writing the stats to this file",
+        )
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="Report timings, rows per second, peak memory and queries",
+        )
+        parser.add_argument(
+            "--progress",
+            action="store_true",
+            help=f"Report rows handled every {PROGRESS_INTERVAL} seconds",
+        )
+        return parser
+
+    def execute(self, *args, **options):
+        self.total = PhaseStats(self.__module__.rsplit(".", 1)[-1])
+        self.phases = []
+        self.current_phase = None
+        self.show_progress = options.get("progress", False)
+        self.last_progress = time.monotonic()
+
+        start = time.perf_counter()
+        profile = cProfile.Profile() if options.get("profile") else None
+        try:
+            with ExitStack() as stack:
+                if options.get("stats"):
+                    stack.enter_context(connection.execute_wrapper(self.count_query))
+                if profile:
+                    profile.enable()
+                    stack.callback(profile.disable)
+                return super().execute(*args, **options)
+        finally:
+            self.total.time = time.perf_counter() - start
+            if profile:
+                profile.dump_stats(options["profile"])
+                self.report(f"Profile written to {options['profile']}")
+            if options.get("stats"):
+                self.report_stats()
+
+    @contextmanager
+    def phase(self, name):
+        """Attribute what happens within to the named phase; a phase entered
+        more than once, e.g. in a loop, adds up."""
+        stats = next((p for p in self.phases if p.name == name), None)
+        if stats is None:
+            stats = PhaseStats(name)
+            self.phases.append(stats)
+        previous, self.current_phase = self.current_phase, stats
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.time += time.perf_counter() - start
+            self.current_phase = previous
+
+    def advance(self, rows=1):
+        """Count rows as handled, in the current phase and overall."""
+        self.total.rows += rows
+        if self.current_phase:
+            self.current_phase.rows += rows
+        if self.show_progress:
+            now = time.monotonic()
+            if now - self.last_progress >= PROGRESS_INTERVAL:
+                self.last_progress = now
+                stats = self.current_phase or self.total
+                self.report(f"{stats.name}: {stats.rows} rows so far")
+
+    def count_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            for stats in (self.total, self.current_phase):
+                if stats:
+                    stats.queries += 1
+                    stats.query_time += duration
+
+    def report_stats(self):
+        self.report(f"{self.total}, peak RSS {peak_rss_mb():.1f} MB")
+        for stats in self.phases:
+            self.report(f"  {stats}")
+
+    def report(self, message):
+        self.stderr.write(message)
+        logger.info(message)
@@ -0,0 +1,186 @@
+"""Spotting slow queries, and the same query repeated within one request.
+
+A QueryWatcher is a database execute wrapper. It sorts queries by shape,
+i.e. their SQL with any literals and IN lists collapsed, so the query a
+loop makes for each row (an N+1) shows as one shape made many times.
+QueryWatchMiddleware watches a sampled fraction of requests, logging each
+shape repeated at least QUERY_WATCH_REPEAT_THRESHOLD times, and each query
+slower than QUERY_WATCH_SLOW_QUERY seconds, with where in our code it came
+from. Every QUERY_WATCH_REPORT_INTERVAL seconds, it also logs a report of
+the worst repeats seen since the last one.
+
+To check some code by hand, e.g. in the shell:
+
+    watcher = QueryWatcher()
+    with connection.execute_wrapper(watcher):
+        ...
+    watcher.repeats()
+"""
+
+import logging
+import random
+import re
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+
+from .metrics import view_name
+
+logger = logging.getLogger("noiseworks")
+
+BASE_DIR = str(Path(__file__).resolve().parent.parent)
+THIS_FILE = str(Path(__file__).resolve())
+
+SHAPE_PATTERNS = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)"), "(...)"),
+)
+
+
+def query_shape(sql):
+    for pattern, replacement in SHAPE_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def caller():
+    """Where in our own code (rather than Django's or a library's) the
+    current query was made, as "file:line in function"."""
+    for frame in reversed(traceback.extract_stack()):
+        filename = frame.filename
+        if (
+            filename.startswith(BASE_DIR)
+            and filename != THIS_FILE
+            and "site-packages" not in filename
+        ):
+            path = filename[len(BASE_DIR) + 1 :]
+            return f"{path}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+
+class QueryWatcher:
+    def __init__(self, repeat_threshold=None, slow_query=None):
+        self.repeat_threshold = (
+            repeat_threshold or settings.QUERY_WATCH_REPEAT_THRESHOLD
+        )
+        self.slow_query = slow_query or settings.QUERY_WATCH_SLOW_QUERY
+        self.counts = {}
+        self.locations = {}
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            shape = query_shape(sql)
+            count = self.counts[shape] = self.counts.get(shape, 0) + 1
+            # Only look up the stack when it's needed
+            if count == self.repeat_threshold:
+                self.locations[shape] = caller()
+            if duration >= self.slow_query:
+                self.slow.append((duration, shape, caller()))
+
+    def repeats(self):
+        """(count, shape, location) of each shape repeated too often, most
+        repeated first."""
+        return sorted(
+            (
+                (count, shape, self.locations[shape])
+                for shape, count in self.counts.items()
+                if count >= self.repeat_threshold
+            ),
+            reverse=True,
+        )
+
+
+class Report:
+    """The repeated queries seen across requests since it was last logged."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset(time.monotonic())
+
+    def reset(self, now):
+        self.started = now
+        self.requests = 0
+        self.shapes = {}
+
+    def add(self, view, watcher):
+        repeats = watcher.repeats()
+        with self.lock:
+            self.requests += 1
+            for count, shape, location in repeats:
+                entry = self.shapes.setdefault(
+                    (shape, location),
+                    {"requests": 0, "queries": 0, "worst": 0, "views": set()},
+                )
+                entry["requests"] += 1
+                entry["queries"] += count
+                entry["worst"] = max(entry["worst"], count)
+                entry["views"].add(view)
+
+    def log_if_due(self, interval, limit=10):
+        now = time.monotonic()
+        with self.lock:
+            if now - self.started < interval:
+                return
+            requests, shapes = self.requests, self.shapes
+            self.reset(now)
+        if not shapes:
+            return
+        worst = sorted(shapes.items(), key=lambda s: s[1]["queries"], reverse=True)
+        lines = [
+            f"Repeated queries in {requests} sampled requests"
+            f" over the last {interval:.0f}s:"
+        ]
+        for (shape, location), entry in worst[:limit]:
+            lines.append(
+                f"  {entry['queries']} queries in {entry['requests']} requests"
+                f" (at most {entry['worst']} in one), {location},"
+                f" views {', '.join(sorted(entry['views']))}: {shape}"
+            )
+        logger.warning("\n".join(lines))
+
+
+report = Report()
+
+
+class QueryWatchMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.QUERY_WATCH_SAMPLE_RATE:
+            return self.get_response(request)
+
+        watcher = QueryWatcher()
+        with connection.execute_wrapper(watcher):
+            response = self.get_response(request)
+
+        view = view_name(request)
+        for count, shape, location in watcher.repeats():
+            logger.warning(
+                "%s made the same query %d times, at %s: %s",
+                view,
+                count,
+                location,
+                shape,
+            )
+        for duration, shape, location in watcher.slow:
+            logger.warning(
+                "%s made a query taking %.3fs, at %s: %s",
+                view,
+                duration,
+                location,
+                shape,
+            )
+        report.add(view, watcher)
+        report.log_if_due(settings.QUERY_WATCH_REPORT_INTERVAL)
+        return response
@@ -64,6 +64,7 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "django.contrib.humanize",
     "django.contrib.gis",
+    "django.contrib.postgres",
     "compressor",
     "core",
     "debug_toolbar",
@@ -94,6 +95,8 @@ CRISPY_CLASS_CONVERTERS = {
 AUTH_USER_MODEL = "accounts.User"
 
 MIDDLEWARE = [
+    "noiseworks.metrics.MetricsMiddleware",
+    "noiseworks.querywatch.QueryWatchMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -111,7 +114,8 @@ APPEND_SLASH = False
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Django's own, timing renders for noiseworks.metrics
+        "BACKEND": "noiseworks.metrics.DjangoTemplates",
         "DIRS": [BASE_DIR / "noiseworks" / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -251,12 +255,115 @@ EMAIL_HOST = env.str("EMAIL_HOST", "localhost")
 EMAIL_PORT = env.str("EMAIL_PORT", 1025)
 DEFAULT_FROM_EMAIL = env.str("DEFAULT_FROM_EMAIL", "")
 
+# Store emails to be sent by the send_outbox command, rather than sending them
+# during the request; failures are retried after a delay doubling each time
+EMAIL_OUTBOX = env.bool("EMAIL_OUTBOX", True)
+EMAIL_OUTBOX_MAX_ATTEMPTS = env.int("EMAIL_OUTBOX_MAX_ATTEMPTS", 8)
+EMAIL_OUTBOX_RETRY_DELAY = env.int("EMAIL_OUTBOX_RETRY_DELAY", 60)
+EMAIL_OUTBOX_MAX_RETRY_DELAY = env.int("EMAIL_OUTBOX_MAX_RETRY_DELAY", 60 * 60)
+
 CONTACT_EMAIL = env.str("CONTACT_EMAIL", "")
 
 MAPIT_API_KEY = env.str("MAPIT_API_KEY", None)
 
 NOTIFY_API_KEY = env.str("NOTIFY_API_KEY", None)
 NOTIFY_TEMPLATE_ID = env.str("NOTIFY_TEMPLATE_ID", None)
+NOTIFY_BASE_URL = env.str("NOTIFY_BASE_URL", "https://api.notifications.service.gov.uk")
+NOTIFY_TIMEOUT = env.int("NOTIFY_TIMEOUT", 10)
+# Notify allows 3,000 messages a minute for each API key
+NOTIFY_RATE_LIMIT = env.int("NOTIFY_RATE_LIMIT", 3000)
+
+# Store text messages to be sent by the send_sms_outbox command, rather than
+# sending them during the request, retrying failures as for email
+SMS_QUEUE = env.bool("SMS_QUEUE", True)
+SMS_QUEUE_MAX_ATTEMPTS = env.int("SMS_QUEUE_MAX_ATTEMPTS", 5)
+SMS_QUEUE_RETRY_DELAY = env.int("SMS_QUEUE_RETRY_DELAY", 30)
+SMS_QUEUE_MAX_RETRY_DELAY = env.int("SMS_QUEUE_MAX_RETRY_DELAY", 30 * 60)
+
+# Notifications
+
+# Served under WSGI, the notification bell cannot be kept open to push changes,
+# so instead asks for them this many seconds apart (see cases/realtime.py)
+NOTIFICATIONS_POLL_INTERVAL = env.int("NOTIFICATIONS_POLL_INTERVAL", 30)
+
+# Metrics
+
+# Time requests, and the queries, external calls and rendering within them,
+# for Prometheus to scrape from /metrics using METRICS_TOKEN as a bearer token.
+# Each server process keeps and reports only its own figures, from when it
+# started; with several workers, a scrape sees just the one that answers it.
+# See noiseworks/metrics.py.
+METRICS_ENABLED = env.bool("METRICS_ENABLED", True)
+METRICS_TOKEN = env.str("METRICS_TOKEN", "")
+
+# Log queries repeated within a request, or slow, for this fraction of requests
+QUERY_WATCH_SAMPLE_RATE = env.float("QUERY_WATCH_SAMPLE_RATE", 0.01)
+QUERY_WATCH_REPEAT_THRESHOLD = env.int("QUERY_WATCH_REPEAT_THRESHOLD", 10)
+QUERY_WATCH_SLOW_QUERY = env.float("QUERY_WATCH_SLOW_QUERY", 1.0)
+QUERY_WATCH_REPORT_INTERVAL = env.int("QUERY_WATCH_REPORT_INTERVAL", 5 * 60)
+
+# Caching
+
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+}
+
+# What is cached is cleared when it changes, but only in the cache of the
+# process making the change if each process has its own. So unless CACHE_URL
+# names a cache shared by every process, e.g. redis:// or dbcache://, nothing
+# is cached for longer than LOCAL_CACHE_TIMEOUT seconds.
+CACHE_SHARED = CACHES["default"]["BACKEND"] not in (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+LOCAL_CACHE_TIMEOUT = env.int("LOCAL_CACHE_TIMEOUT", 30)
+
+
+def cache_timeout(name, default):
+    timeout = env.int(name, default)
+    if CACHE_SHARED:
+        return timeout
+    if timeout is None:
+        return LOCAL_CACHE_TIMEOUT
+    return min(timeout, LOCAL_CACHE_TIMEOUT)
+
+
+# How long a case's staff timeline may be cached; changes to the case clear it
+CASE_TIMELINE_CACHE_TIMEOUT = cache_timeout("CASE_TIMELINE_CACHE_TIMEOUT", 24 * 60 * 60)
+
+# How long the case filter's assignee choices may be cached (by default, until
+# someone new is assigned or an assignee is edited, which clears them)
+ASSIGNEE_CHOICES_CACHE_TIMEOUT = cache_timeout("ASSIGNEE_CHOICES_CACHE_TIMEOUT", None)
+
+# Number of events shown at a time on a case's staff timeline
+CASE_TIMELINE_PAGE_SIZE = env.int("CASE_TIMELINE_PAGE_SIZE", 50)
+
+# How long the ward to staff routing map may be cached; editing staff clears it
+WARD_ROUTING_CACHE_TIMEOUT = cache_timeout("WARD_ROUTING_CACHE_TIMEOUT", 24 * 60 * 60)
+
+# How long the lists of assignable and followable staff may be cached; editing
+# users, groups or permissions clears them
+STAFF_DIRECTORY_CACHE_TIMEOUT = cache_timeout(
+    "STAFF_DIRECTORY_CACHE_TIMEOUT", 24 * 60 * 60
+)
+
+# Most people listed when searching for someone to report on behalf of
+PERSON_SEARCH_LIMIT = env.int("PERSON_SEARCH_LIMIT", 20)
+
+# Auto-assignment of new cases: principal, round_robin, least_open or
+# weighted_priority (see cases.assignment)
+AUTO_ASSIGN_STRATEGY = env.str("AUTO_ASSIGN_STRATEGY", "principal")
+
+# How many ordinary open cases an open priority case counts as, for the
+# weighted_priority strategy
+AUTO_ASSIGN_PRIORITY_WEIGHT = env.int("AUTO_ASSIGN_PRIORITY_WEIGHT", 3)
+
+# Case history
+
+# Fields left out of the change lists stored with each historical case record
+CASE_HISTORY_DIFF_EXCLUDED_FIELDS = env.list(
+    "CASE_HISTORY_DIFF_EXCLUDED_FIELDS", default=["last_update_type"]
+)
 
 # File storage
 
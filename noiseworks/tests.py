@@ -1,10 +1,24 @@
+from unittest.mock import patch
+
 import pytest
+import requests
 from django.conf import settings
+from django.core import mail
+from django.db import connection
 from django.http import HttpRequest
 from django.utils.module_loading import import_string
 from pytest_django.asserts import assertContains
 
 from accounts.models import User
+from noiseworks import metrics, querywatch
+from noiseworks.message import (
+    email_colours,
+    email_logo,
+    email_theme,
+    send_email,
+    send_emails,
+)
+from noiseworks.querywatch import QueryWatcher, query_shape
 
 
 @pytest.fixture
@@ -53,3 +67,122 @@ def test_admin_access(staff_user, admin_user, client):
     client.force_login(admin_user)
     resp = client.get("/admin/")
     assertContains(resp, "Django site admin")
+
+
+def test_email_theme_built_once(db):
+    email_theme.cache_clear()
+    email_logo.cache_clear()
+    with patch("noiseworks.message.email_colours", wraps=email_colours) as colours:
+        send_emails(
+            "Access your noise cases",
+            "accounts/email_signin",
+            [
+                ("one@example.org", {"signature": "ONE"}),
+                ("two@example.org", {"signature": "TWO"}),
+            ],
+            {"url": "https://example.org/"},
+        )
+        send_email(
+            "three@example.org",
+            "Access your noise cases",
+            "accounts/email_signin",
+            {"url": "https://example.org/", "signature": "THREE"},
+        )
+    assert colours.call_count == 1
+    assert [m.to for m in mail.outbox] == [
+        ["one@example.org"],
+        ["two@example.org"],
+        ["three@example.org"],
+    ]
+    assert "TWO" in mail.outbox[1].body
+    assert "https://example.org/" in mail.outbox[1].body
+    html = mail.outbox[0].alternatives[0][0]
+    assert f"cid:{email_theme()['logo_inline']['id']}" in html
+
+
+@pytest.fixture
+def metrics_token(settings):
+    settings.METRICS_TOKEN = "secret"
+    for histogram in metrics.HISTOGRAMS:
+        histogram.clear()
+    return "secret"
+
+
+def test_metrics_need_token(client, metrics_token):
+    assert client.get("/metrics").status_code == 404
+    response = client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong")
+    assert response.status_code == 404
+
+
+def test_metrics_recorded_per_view(admin_client, metrics_token):
+    admin_client.get("/cases")
+    response = admin_client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+    assert response.status_code == 200
+    body = response.content.decode()
+    assert "# TYPE noiseworks_request_duration_seconds histogram" in body
+    assert 'noiseworks_request_duration_seconds_count{view="cases"} 1' in body
+    assert 'noiseworks_request_queries_bucket{view="cases",le="0"} 0' in body
+    assert 'noiseworks_request_http_calls_bucket{view="cases",le="0"} 1' in body
+    assert 'noiseworks_request_template_duration_seconds_count{view="cases"} 1' in body
+
+
+def test_metrics_count_http_calls(requests_mock):
+    requests_mock.get("https://example.org/", text="")
+    stats = metrics.RequestStats()
+    token = metrics._stats.set(stats)
+    try:
+        requests.get(
+            "https://example.org/",
+            hooks={"response": metrics.record_http_response},
+        )
+    finally:
+        metrics._stats.reset(token)
+    assert stats.http_calls == 1
+
+
+def test_histogram_render():
+    histogram = metrics.Histogram("x", "An example.", (1, 5))
+    for value in (0.5, 3, 3, 10):
+        histogram.observe('a "view"', value)
+    assert list(histogram.render()) == [
+        "# HELP x An example.",
+        "# TYPE x histogram",
+        'x_bucket{view="a \\"view\\"",le="1"} 1',
+        'x_bucket{view="a \\"view\\"",le="5"} 3',
+        'x_bucket{view="a \\"view\\"",le="+Inf"} 4',
+        'x_sum{view="a \\"view\\""} 16.5',
+        'x_count{view="a \\"view\\""} 4',
+    ]
+
+
+def test_query_shape():
+    assert (
+        query_shape(
+            "SELECT * FROM a WHERE b = 12 AND c = 'it''s' AND d IN (%s, %s, %s)"
+        )
+        == "SELECT * FROM a WHERE b = ? AND c = ? AND d IN (...)"
+    )
+
+
+def test_query_watcher_finds_repeats(db):
+    watcher = QueryWatcher(repeat_threshold=3, slow_query=60)
+    with connection.execute_wrapper(watcher):
+        for id in range(4):
+            User.objects.filter(id=id).first()
+        User.objects.count()
+    [(count, shape, location)] = watcher.repeats()
+    assert count == 4
+    assert 'FROM "accounts_user"' in shape
+    assert location.startswith("noiseworks/tests.py:")
+    assert location.endswith("in test_query_watcher_finds_repeats")
+
+
+def test_query_watch_middleware(admin_client, settings):
+    settings.QUERY_WATCH_SAMPLE_RATE = 1
+    settings.QUERY_WATCH_REPEAT_THRESHOLD = 1
+    settings.QUERY_WATCH_REPORT_INTERVAL = 0
+    with patch.object(querywatch.logger, "warning") as warning:
+        admin_client.get("/cases")
+    messages = [call.args[0] for call in warning.call_args_list]
+    assert "%s made the same query %d times, at %s: %s" in messages
+    assert messages[-1].startswith("Repeated queries in 1 sampled requests")
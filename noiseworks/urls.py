@@ -3,6 +3,7 @@ from django.contrib import admin
 from django.urls import include, path
 
 from cases.views import home
+from noiseworks.metrics import metrics
 
 urlpatterns = [
     path("", home),
@@ -10,5 +11,6 @@ urlpatterns = [
     path("oauth/", include("oauth.urls")),
     path("a", include("accounts.urls")),
     path("admin/", admin.site.urls),
+    path("metrics", metrics, name="metrics"),
     path("__debug__/", include(debug_toolbar.urls)),
 ]